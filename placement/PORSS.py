@@ -6,12 +6,18 @@ Created on Thu Oct  5 10:22:07 2023
 @author: mengjia
 """
 import numpy as np
+from placement.instrumentation import null_metrics
+from placement.robustness import failure_losses, robust_value
+from placement.scoring import check_sharded_weights, is_sharded
 class PORSS:
     def __init__(self, matrix, k, min_detected_sensor,
                  recombination = 'onepoint', 
                  n_iters = None, patience = 100, check_steps = 1000,
-                 seed = None, verbose = True):
-        self.matrix = matrix
+                 seed = None, verbose = True, weights = None, metrics = None,
+                 n_failures = 0, failure_mode = 'worst'):
+        # scenarios held by shard workers, see placement.sharding
+        self.sharded = is_sharded(matrix)
+        self.matrix = matrix if self.sharded else np.asarray(matrix)
         self.n_rows = matrix.shape[0] # rows are sensor locations
         self.n_cols = matrix.shape[1] # columns are emission scenarios
         self.k = k
@@ -22,7 +28,22 @@ class PORSS:
             self.n_iters = n_iters
         self.mut_prob = 1 / self.n_rows # mutation probability
         self.recombination = recombination
-        self.opt_val_ub = np.sum(np.sum(matrix, axis=0) >= min_detected_sensor) # upper bound of the optimal value
+        # scenario weights, e.g. from scenario reduction
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)
+        # optimize the coverage when this many sensors fail, see placement.robustness
+        self.n_failures = n_failures
+        self.failure_mode = failure_mode # 'worst' or 'expected' coverage over the failed sensors
+        if self.sharded:
+            check_sharded_weights(weights)
+            if n_failures:
+                raise ValueError('Sensor failures are not supported for a sharded matrix.')
+            self.weighted = matrix.weighted
+            # upper bound of the optimal value
+            self.opt_val_ub = matrix.upper_bound(min_detected_sensor)
+        else:
+            self.weighted = weights is not None or bool(n_failures and failure_mode == 'expected')
+            # upper bound of the optimal value
+            self.opt_val_ub = self.coverage(np.sum(self.matrix, axis=0))
         
         # initialize placeholders
         
@@ -43,11 +64,31 @@ class PORSS:
         self.patience = patience
         self.check_steps = check_steps
         self.verbose = verbose # suppress output or not
+        # counters, timers and progress events
+        self.metrics = null_metrics if metrics is None else metrics
         
     
+    def coverage(self, detected_counts):
+        '''
+        Return the number (or total weight) of scenarios detected by enough sensors.
+        '''
+        covered = detected_counts >= self.min_detected_sensor
+        if self.weights is None:
+            return np.sum(covered)
+        return np.sum(self.weights[covered])
+    
     def objectives(self, solution):
+        if self.sharded:
+            obj_val1 = self.matrix.coverage([np.flatnonzero(solution)], self.min_detected_sensor)[0]
+            return [obj_val1, np.sum(solution)]
         submatrix = self.matrix[np.array(solution, dtype=bool)]
-        obj_val1 = np.sum(np.sum(submatrix, axis=0) >= self.min_detected_sensor) # detection coverage
+        if self.n_failures:
+            coverage, losses, _ = failure_losses(submatrix, self.min_detected_sensor, self.weights,
+                                                 self.n_failures)
+            # coverage under sensor failures
+            obj_val1 = robust_value(coverage, losses, self.failure_mode)
+            return [obj_val1, np.sum(solution)]
+        obj_val1 = self.coverage(np.sum(submatrix, axis=0)) # detection coverage
         obj_val2 = np.sum(solution) # solution size
         return [obj_val1, obj_val2]
     
@@ -83,12 +124,50 @@ class PORSS:
         best_row_id = np.argmax(val_comb_matrix_sorted[:, 0])
         
         best_row = val_comb_matrix_sorted[best_row_id]
-        best_val = int(best_row[0])
+        best_val = best_row[0] if self.weighted else int(best_row[0])
         best_solution = best_row[2:]
         selected_row_ids = np.where(best_solution == 1)[0]
         return selected_row_ids, best_val
+
+    def pareto_front(self):
+        '''
+        Return the archived non-dominated solutions as (n_sensors, coverage, row ids) tuples,
+        sorted by size.
+        '''
+        front = []
+        for fitness, solution in zip(self.fitness_log, self.population):
+            if fitness[1] > 0: # skip the placeholder fitness of the initial solution
+                front.append((int(fitness[1]), fitness[0], np.where(solution == 1)[0]))
+        return sorted(front, key=lambda item: item[0])
+
+
+    def update_archive(self, solution, fitness):
+        '''
+        Add a solution to the archive unless it is dominated, and delete the solutions it dominates.
+        Return True if the solution was added.
+        '''
+        if not 0 < fitness[1] < 2 * self.k:
+            return False
         
-    
+        # compute dominance condition
+        condition = (self.fitness_log[:, 0] > fitness[0]) & (self.fitness_log[:, 1] <= fitness[1])
+        condition |= (self.fitness_log[:, 0] >= fitness[0]) & (self.fitness_log[:, 1] < fitness[1])
+        if np.any(condition):
+            return False
+        
+        # delete solutions worse than the new one
+        del_indx = (self.fitness_log[:, 0] <= fitness[0]) & (self.fitness_log[:, 1] >= fitness[1])
+        
+        # update population
+        self.population = np.vstack((self.population[~del_indx], solution))
+        self.population_size = self.population.shape[0]
+        
+        # update fitness log
+        self.fitness_log = np.vstack((self.fitness_log[~del_indx], fitness))
+        self.metrics.increment('porss.archive_insertions')
+        self.metrics.gauge('porss.archive_size', self.population_size)
+        return True
+
     def early_stop(self, items):
         '''
         Return True if all items are the same, return False otherwise.
@@ -111,37 +190,27 @@ class PORSS:
             s2 = self.population[np.random.randint(self.population_size), :] # randomly select an existing solution 2
             
             # recombination
-            if self.recombination == 'onepoint':
-                s1, s2 = self.recombination_onepoint(s1, s2)
-            elif self.recombination == 'uniform':
-                s1, s2 = self.recombination_uniform(s1, s2)
-            else:
-                raise ValueError("The input recombination approach is not implemented. Choose from 'onepoint' and 'uniform'. ")
+            with self.metrics.timer('porss.recombination'):
+                if self.recombination == 'onepoint':
+                    s1, s2 = self.recombination_onepoint(s1, s2)
+                elif self.recombination == 'uniform':
+                    s1, s2 = self.recombination_uniform(s1, s2)
+                else:
+                    raise ValueError("The input recombination approach is not implemented. "
+                                     "Choose from 'onepoint' and 'uniform'. ")
                 
             
             # bit-wise mutation
-            s1, s2 = self.mutation(s1, s2)
+            with self.metrics.timer('porss.mutation'):
+                s1, s2 = self.mutation(s1, s2)
             
             
             # check dominance
             for q in [s1, s2]:
-                fitness = self.objectives(q)
-                if 0 < fitness[1] < 2 * self.k:
-                    
-                    # compute dominance condition
-                    condition = (self.fitness_log[:, 0] > fitness[0]) & (self.fitness_log[:, 1] <= fitness[1])
-                    condition |= (self.fitness_log[:, 0] >= fitness[0]) & (self.fitness_log[:, 1] < fitness[1])
-                    
-                    if not np.any(condition):
-                        # delete solutions worse than q
-                        del_indx = (self.fitness_log[:, 0] <= fitness[0]) & (self.fitness_log[:, 1] >= fitness[1])
-                        
-                        # update population
-                        self.population = np.vstack((self.population[~del_indx], q))
-                        self.population_size = self.population.shape[0]
-                        
-                        # update fitness log
-                        self.fitness_log = np.vstack((self.fitness_log[~del_indx], fitness))
+                with self.metrics.timer('porss.evaluation'):
+                    fitness = self.objectives(q)
+                self.metrics.increment('porss.evaluations')
+                self.update_archive(q, fitness)
             
             counter += 1 
             
@@ -159,6 +228,9 @@ class PORSS:
                 # check early stop
                 early_stop = self.early_stop(fitness_monitor)
                 
+                self.metrics.emit('porss.progress', iteration=counter, best_value=current_best_val,
+                                  archive_size=self.population_size,
+                                  counters=self.metrics.summary()['counters'])
                 if self.verbose:
                     print('Iteration #{}: current best model: {} out of {} scenarios are detected'.format(counter, current_best_val, self.n_cols))
                 if current_best_val == self.opt_val_ub:
@@ -168,6 +240,8 @@ class PORSS:
         best_solution, best_val = self.find_best_solution()
         self.best_solution = best_solution
         self.best_opt_val = best_val
+        self.metrics.emit('porss.done', iteration=counter, best_value=best_val,
+                          archive_size=self.population_size, early_stop=early_stop)
         
         return best_solution, best_val
     
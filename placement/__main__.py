@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import time
+
+
+def main(argv=None):
+    """
+    Command line interface. 'simulate', 'detect' and 'optimize' run the steps of the demo workflow,
+    with the demo directories as default paths.
+    """
+    parser = argparse.ArgumentParser(prog='python -m placement',
+                                     description='Sensor placement optimization pipeline.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_run = subparsers.add_parser(
+        'run', help='Run the pipeline described by a JSON configuration file.')
+    parser_run.add_argument('config', help='Path to the pipeline configuration file.')
+    parser_run.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    parser_run.add_argument('--force', action='store_true',
+                            help='Rerun all stages, ignoring cached outputs.')
+    parser_run.add_argument('--metrics', default=None,
+                            help="Append metrics events to this JSON-lines file. Overrides the "
+                                 "configuration's 'metrics'.")
+
+    parser_bench = subparsers.add_parser('bench', help='Benchmark the PORSS and detection kernels.')
+    parser_bench.add_argument('--sizes', nargs='+', default=['small'],
+                              choices=['small', 'demo', 'large'], help='Problem size presets.')
+    parser_bench.add_argument('--densities', nargs='+', type=float, default=[.01, .1],
+                              help='Fractions of detections in the synthetic detection matrices.')
+    parser_bench.add_argument('--output', default=None, help='Save the results to this JSON file.')
+    parser_bench.add_argument('--baseline', default=None,
+                              help='JSON results of an earlier run to compare with.')
+
+    parser_simulate = subparsers.add_parser(
+        'simulate', help='Simulate concentrations on the grid for every emission scenario.')
+    parser_simulate.add_argument('--input-dir', default='./demo/input_data/',
+                                 help="Directory with 'domain.csv'.")
+    parser_simulate.add_argument('--data-dir', default='./demo/output_data/',
+                                 help="Directory with 'emission_scenarios.csv'; "
+                                      'the concentrations are saved here.')
+    parser_simulate.add_argument('--dt', nargs=3, type=int, default=[60, 1, 4],
+                                 metavar=('OBS', 'SIM', 'PUFF'),
+                                 help='Gaussian puff observation, simulation and puff time steps '
+                                      '[s].')
+    parser_simulate.add_argument('--store-encoding', default=None,
+                                 choices=['float64', 'float32', 'float16', 'uint8', 'uint16'],
+                                 help='Save the concentrations as a chunked, compressed store '
+                                      'with this encoding.')
+    parser_simulate.add_argument('--metrics', default=None,
+                                 help='Append metrics events to this JSON-lines file.')
+
+    parser_detect = subparsers.add_parser(
+        'detect', help='Evaluate detection on the simulated concentrations.')
+    parser_detect.add_argument('--data-dir', default='./demo/output_data/',
+                               help="Directory with the concentrations "
+                                    "('ch4_sim_grid_locations.npy' or the chunked store) and the "
+                                    "sensor location CSVs; "
+                                    'the detection matrices are saved here.')
+    parser_detect.add_argument('--method', default='overall',
+                               choices=['overall', 'consecutive', 'movingWindow'])
+    parser_detect.add_argument('--amp-thresh', type=float, default=1.,
+                               help='Concentration threshold [ppm].')
+    parser_detect.add_argument('--persistence-thresh', type=float, default=.2,
+                               help='Number (or fraction, if < 1) of time steps above the '
+                                    'threshold.')
+    parser_detect.add_argument('--window-len', type=int, default=None,
+                               help="Window length for 'movingWindow'.")
+    parser_detect.add_argument('--stride', type=int, default=None,
+                               help="Window stride for 'movingWindow'.")
+    parser_detect.add_argument('--append', action='store_true',
+                               help='Only evaluate the scenarios added since the saved detection '
+                                    'matrix.')
+    parser_detect.add_argument('--metrics', default=None,
+                               help='Append metrics events to this JSON-lines file.')
+
+    parser_optimize = subparsers.add_parser(
+        'optimize', help='Run PORSS on the valid and fenceline sensor locations.')
+    parser_optimize.add_argument('--data-dir', default='./demo/output_data/',
+                                 help="Directory with 'detection_valid_locations.npy' and "
+                                      "'detection_fenceline_locations.npy'.")
+    parser_optimize.add_argument('--results-dir', default='./demo/',
+                                 help="The runs are added to 'results.sqlite' in this directory, "
+                                      "labeled 'valid' and 'fenceline'.")
+    parser_optimize.add_argument('--pickles', action='store_true',
+                                 help="Save one pickle file per trial in "
+                                      "'results_valid_locations/' and "
+                                      "'results_fenceline_locations/' instead.")
+    parser_optimize.add_argument('--budget', type=int, default=4, help='Number of sensors.')
+    parser_optimize.add_argument('--min-detected-sensor', type=int, default=1,
+                                 help='Minimum number of sensors needed to detect a scenario.')
+    parser_optimize.add_argument('--trials', type=int, default=10, help='Number of PORSS trials.')
+    parser_optimize.add_argument('--metrics', default=None,
+                                 help='Append metrics events to this JSON-lines file.')
+
+    parser_shard = subparsers.add_parser('shard',
+                                         help='Serve coverage requests on a shard of scenarios.')
+    parser_shard.add_argument('matrix',
+                              help='Detection matrix (.npy), shape = (n_locations, n_scenarios).')
+    parser_shard.add_argument('--columns', nargs=2, type=int, default=None,
+                              metavar=('START', 'STOP'),
+                              help='Scenario columns of this shard. Defaults to all columns.')
+    parser_shard.add_argument('--weights', default=None,
+                              help='Scenario weights (.npy) of all scenarios.')
+    parser_shard.add_argument('--host', default='localhost', help='Interface to listen on.')
+    parser_shard.add_argument('--port', type=int, default=6000, help='Port to listen on.')
+    parser_shard.add_argument('--authkey', default=None,
+                              help='Shared key of the shards and the client. Required unless '
+                                   '--host is a loopback address; then a random key is '
+                                   'generated and printed.')
+
+    args = parser.parse_args(argv)
+    metrics = None
+    if args.command in ['simulate', 'detect', 'optimize'] and args.metrics is not None:
+        from placement.instrumentation import Metrics
+        metrics = Metrics(sink=args.metrics)
+
+    if args.command == 'run':
+        from placement.pipeline import run_config
+        run_config(args.config, max_workers=args.workers, force=args.force,
+                   metrics_path=args.metrics)
+
+    elif args.command == 'simulate':
+        import pandas as pd
+        from placement.sensor_locations import domain_grid
+        from placement.simulate_concentrations import run_gp
+        df_emission_scenarios = pd.read_csv(os.path.join(args.data_dir, 'emission_scenarios.csv'))
+        df_domain = pd.read_csv(os.path.join(args.input_dir, 'domain.csv'))
+        grid_ranges, grid_nums = domain_grid(df_domain)
+        runtime_start = time.time()
+        store_params = None if args.store_encoding is None else {'encoding': args.store_encoding}
+        run_gp(df_emission_scenarios, grid_ranges, grid_nums, *args.dt,
+               save_dir=os.path.join(args.data_dir, ''), store_params=store_params,
+               metrics=metrics, verbose=True)
+        print('############################################')
+        print(f'Entire simulation is done in {time.time() - runtime_start} seconds.')
+
+    elif args.command == 'detect':
+        import numpy as np
+        import pandas as pd
+        from placement.concentration_store import load_concentrations
+        from placement.evaluate_detection import run_detection
+        ch4_sim = load_concentrations(args.data_dir)
+        detection = run_detection(ch4_sim, args.method, args.amp_thresh, args.persistence_thresh,
+                                  window_len=args.window_len, stride=args.stride,
+                                  save_dir=os.path.join(args.data_dir, ''), metrics=metrics,
+                                  append=args.append) # shape = (n_grids, n_scenarios)
+        # detection matrices of the valid and fenceline sensor locations
+        for candidates in ['valid', 'fenceline']:
+            path = os.path.join(args.data_dir, f'{candidates}_sensor_locations.csv')
+            rows = pd.read_csv(path)['loc_index'].to_numpy()
+            np.save(os.path.join(args.data_dir, f'detection_{candidates}_locations.npy'),
+                    detection[rows])
+
+    elif args.command == 'optimize':
+        import numpy as np
+        from placement.optimization import run_porss
+        from placement.results_store import ResultsStore
+        os.makedirs(args.results_dir, exist_ok=True)
+        with ResultsStore(os.path.join(args.results_dir, 'results.sqlite')) as store:
+            for candidates in ['valid', 'fenceline']:
+                path = os.path.join(args.data_dir, f'detection_{candidates}_locations.npy')
+                detection = np.load(path)
+                print(f'Run PORSS on {candidates} sensor locations.')
+                if args.pickles:
+                    results_dir = os.path.join(args.results_dir,
+                                               f'results_{candidates}_locations', '')
+                    os.makedirs(results_dir, exist_ok=True)
+                    run_porss(detection, args.budget, args.min_detected_sensor, args.trials,
+                              save_dir=results_dir, metrics=metrics)
+                else:
+                    run_porss(detection, args.budget, args.min_detected_sensor, args.trials,
+                              store=store, label=candidates, metrics=metrics)
+
+    elif args.command == 'shard':
+        import numpy as np
+        from placement.sharding import is_loopback, new_authkey, serve_shard
+        if args.authkey is None:
+            if not is_loopback(args.host):
+                parser.error(f'--authkey is required to listen on {args.host}. '
+                             'Only expose shards on trusted networks.')
+            args.authkey = new_authkey().decode()
+            print(f'Shard authkey: {args.authkey}')
+        matrix = np.load(args.matrix, mmap_mode='r')
+        start, stop = args.columns if args.columns is not None else (0, matrix.shape[1])
+        weights = None if args.weights is None else np.load(args.weights)[start:stop]
+        print(f'Serving scenarios {start}-{stop} on {args.host}:{args.port}.')
+        serve_shard(np.ascontiguousarray(matrix[:, start:stop]), args.authkey.encode(),
+                    address=(args.host, args.port), weights=weights)
+
+    elif args.command == 'bench':
+        from placement.benchmark import benchmark_cases, run_benchmarks, compare_reports
+        report = run_benchmarks(benchmark_cases(args.sizes, args.densities), save_path=args.output)
+        if args.baseline is not None:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            print('Ratios to baseline (current / baseline):')
+            for comparison in compare_reports(baseline, report):
+                print(comparison)
+
+    if metrics is not None:
+        metrics.emit('summary', command=args.command, **metrics.summary())
+        metrics.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from placement.PORSS import PORSS
+from placement.evaluate_detection import run_detection
+from placement.instrumentation import Metrics
+
+# Benchmarks for the PORSS and detection kernels on synthetic data of controlled size.
+# Every case runs in a fresh process so that its peak RSS can be reported, and the results are
+# saved as JSON to compare runs across commits.
+
+# (n_locations, n_scenarios) of the detection matrix
+matrix_sizes = {'small': (1_000, 100),
+                'demo': (100_000, 1_000),
+                'large': (1_000_000, 5_000)}
+
+# (n_scenarios, n_t, n_grids) of the concentration tensor
+tensor_sizes = {'small': (20, 60, 1_000),
+                'demo': (100, 60, 10_000),
+                'large': (1_000, 60, 10_000)}
+
+
+class TargetReached(Exception):
+    pass
+
+
+def synthetic_detection(n_locations, n_scenarios, density, seed=None):
+    """
+    Random 0/1 detection matrix with the given fraction of detections.
+    """
+    rng = np.random.default_rng(seed)
+    matrix = np.empty((n_locations, n_scenarios), dtype=np.int8)
+    for start in range(0, n_locations, 10_000): # in blocks of rows to bound the temporary memory
+        block = matrix[start:start + 10_000]
+        block[:] = rng.random(block.shape, dtype=np.float32) < density
+    return matrix
+
+
+def synthetic_concentrations(n_scenarios, n_t, n_grids, seed=None):
+    """
+    Random concentration tensor [ppm] with mostly background values and sparse plume hits.
+    """
+    rng = np.random.default_rng(seed)
+    return rng.exponential(.3, size=(n_scenarios, n_t, n_grids)).astype(np.float32)
+
+
+def greedy_coverage(matrix, k, min_detected_sensor):
+    """
+    Coverage of the greedy placement, used as the target for PORSS.
+    """
+    counts = np.zeros(matrix.shape[1], dtype=int)
+    for _ in range(k):
+        gains = matrix[:, counts == min_detected_sensor - 1].sum(axis=1)
+        counts += matrix[np.argmax(gains)]
+    return int(np.sum(counts >= min_detected_sensor))
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of the current process [MB].
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def bench_porss(n_locations, n_scenarios, density, k=4, min_detected_sensor=1,
+                n_evals=200, target_fraction=.95, max_seconds=60., seed=0):
+    """
+    Objective evaluations per second and time to reach `target_fraction` of the greedy coverage.
+    PORSS runs until it reaches the target, stops early or `max_seconds` have passed.
+    """
+    matrix = synthetic_detection(n_locations, n_scenarios, density, seed=seed)
+    rng = np.random.default_rng(seed)
+    porss = PORSS(matrix, k, min_detected_sensor, n_iters=np.iinfo(np.int64).max, seed=seed,
+                  verbose=False)
+
+    solutions = np.zeros((n_evals, n_locations), dtype=np.int8)
+    for solution in solutions:
+        solution[rng.choice(n_locations, size=k, replace=False)] = 1
+    start_time = time.perf_counter()
+    for solution in solutions:
+        porss.objectives(solution)
+    evals_per_sec = n_evals / (time.perf_counter() - start_time)
+
+    # stop PORSS as soon as a progress event reports the target
+    target = target_fraction * greedy_coverage(matrix, k, min_detected_sensor)
+    start_time = time.perf_counter()
+
+    def stop_at_target(record):
+        if record['event'] == 'porss.progress' and (record['best_value'] >= target or
+                                                    time.perf_counter() - start_time > max_seconds):
+            raise TargetReached(record['best_value'])
+
+    porss.metrics = Metrics(callbacks=[stop_at_target])
+    state = np.random.get_state()
+    np.random.seed(seed) # PORSS draws from the global generator; seed its main loop too
+    try:
+        _, coverage = porss.main()
+    except TargetReached as reached:
+        coverage = reached.args[0]
+    finally:
+        np.random.set_state(state)
+    elapsed = time.perf_counter() - start_time
+
+    return {'porss_evals_per_sec': evals_per_sec,
+            'target_coverage': target,
+            'reached_coverage': int(coverage),
+            'time_to_target_sec': elapsed if coverage >= target else None}
+
+
+def bench_detection(n_scenarios, n_t, n_grids, method, seed=0):
+    """
+    Time series reduced per second by `run_detection` with the given strategy.
+    """
+    ch4_sim = synthetic_concentrations(n_scenarios, n_t, n_grids, seed=seed)
+    kwargs = {'window_len': 10, 'stride': 1} if method == 'movingWindow' else {}
+    with tempfile.TemporaryDirectory() as save_dir:
+        start_time = time.perf_counter()
+        run_detection(ch4_sim, method, 1., .2, save_dir=save_dir + '/', **kwargs)
+        elapsed = time.perf_counter() - start_time
+    return {'detection_series_per_sec': n_scenarios * n_grids / elapsed,
+            'detection_sec': elapsed}
+
+
+def _run_case(case):
+    kind, params = case
+    if kind == 'porss':
+        result = bench_porss(**params)
+    else:
+        result = bench_detection(**params)
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def benchmark_cases(sizes=('small',), densities=(.01, .1),
+                    methods=('overall', 'consecutive', 'movingWindow')):
+    """
+    The benchmark cases for the given size presets.
+    """
+    cases = []
+    for size in sizes:
+        n_locations, n_scenarios = matrix_sizes[size]
+        for density in densities:
+            cases.append(('porss', {'n_locations': n_locations, 'n_scenarios': n_scenarios,
+                                    'density': density}))
+        n_scenarios, n_t, n_grids = tensor_sizes[size]
+        for method in methods:
+            cases.append(('detection', {'n_scenarios': n_scenarios, 'n_t': n_t, 'n_grids': n_grids,
+                                        'method': method}))
+    return cases
+
+
+def run_benchmarks(cases, save_path=None, verbose=True):
+    """
+    Runs every case in a fresh process and optionally saves the results as JSON.
+
+    Returns:
+        report (dict): 'meta' with the environment and commit, 'results' with one entry per case.
+    """
+    try:
+        output = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        commit = output.stdout.strip() or None
+    except OSError:
+        commit = None
+    report = {'meta': {'commit': commit,
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': platform.python_version(),
+                       'numpy': np.__version__,
+                       'platform': platform.platform()},
+              'results': []}
+
+    context = multiprocessing.get_context('spawn')
+    for kind, params in cases:
+        with context.Pool(1) as pool:
+            result = pool.apply(_run_case, ((kind, params),))
+        report['results'].append({'benchmark': kind, 'params': params, **result})
+        if verbose:
+            print(kind, params, {k: v for k, v in result.items()})
+
+    if save_path is not None:
+        with open(save_path, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def compare_reports(baseline, current, metrics=('porss_evals_per_sec', 'time_to_target_sec',
+                                                  'detection_series_per_sec', 'peak_rss_mb')):
+    """
+    Ratios current / baseline of every metric for the cases that appear in both reports.
+
+    Returns:
+        comparison (list): One dict per case with 'benchmark', 'params' and the metric ratios.
+    """
+    def case_id(result):
+        return result['benchmark'], json.dumps(result['params'], sort_keys=True)
+
+    baseline_results = {case_id(r): r for r in baseline['results']}
+    comparison = []
+    for result in current['results']:
+        old = baseline_results.get(case_id(result))
+        if old is None:
+            continue
+        ratios = {m: result[m] / old[m] for m in metrics
+                  if result.get(m) is not None and old.get(m)}
+        comparison.append({'benchmark': result['benchmark'], 'params': result['params'], **ratios})
+    return comparison
@@ -0,0 +1,269 @@
+import json
+import os
+import zlib
+import numpy as np
+from placement.multiresolution import block_ids
+
+# Chunked, compressed on-disk store for simulated concentrations (n_scenarios, n_t, n_grids).
+# Chunks hold a block of grid locations (spatial blocks of the (nx, ny, nz) grid, or runs of
+# consecutive grid indices) for a block of scenarios, so reading a subset of locations, e.g. the
+# fenceline or one region, only decodes the chunks that contain them. Values can be stored as
+# float64/32/16 or quantized per chunk to uint8/uint16, and every chunk is byte-shuffled and
+# zlib-compressed.
+#
+# A store is a directory with 'meta.json', the grid-to-chunk assignment and chunk index in
+# 'index.npz', and the encoded chunks one after another in 'chunks.bin'.
+
+encodings = ['float64', 'float32', 'float16', 'uint8', 'uint16']
+
+
+def _shuffle(data, itemsize):
+    # group the i-th bytes of all values, which compresses much better for smooth data
+    return data.reshape(-1, itemsize).T.tobytes() if itemsize > 1 else data.tobytes()
+
+
+def _unshuffle(data, itemsize):
+    if itemsize == 1:
+        return data
+    return np.frombuffer(data, dtype=np.uint8).reshape(itemsize, -1).T.tobytes()
+
+
+def grid_chunks(n_grids, grid_nums=None, block=(8, 8, 1), grids_per_chunk=1024):
+    """
+    Chunk of every grid location.
+
+    Parameters:
+        n_grids (int): Number of grid locations.
+        grid_nums (tuple, optional): (nx, ny, nz) number of grids; if given, chunks are spatial
+            blocks of `block` grid cells (C-order flat indices as in `run_gp`).
+        block (int or tuple): Block size in grid cells per direction.
+        grids_per_chunk (int): Number of consecutive grid indices per chunk without `grid_nums`.
+
+    Returns:
+        chunk (np.ndarray, shape = (n_grids,)): Chunk index of each grid location, numbered
+            consecutively from 0.
+    """
+    grids = np.arange(n_grids)
+    if grid_nums is None:
+        return grids // grids_per_chunk
+    if np.prod(grid_nums) != n_grids:
+        raise ValueError(f'grid_nums {tuple(grid_nums)} do not match the number of grids '
+                         f'({n_grids}).')
+    blocks, _ = block_ids(grids, grid_nums, block)
+    return np.unique(blocks, return_inverse=True)[1]
+
+
+class ConcentrationWriter:
+    def __init__(self, path, n_t, n_grids, grid_nums=None, block=(8, 8, 1), grids_per_chunk=1024,
+                 scenarios_per_chunk=16, encoding='float32', compression=6):
+        """
+        Writes a concentration store one scenario at a time.
+
+        Parameters:
+            path (str): Directory of the store; created if needed.
+            n_t (int): Number of time steps per scenario.
+            n_grids (int): Number of grid locations.
+            grid_nums, block, grids_per_chunk: Grid chunking, see `grid_chunks`.
+            scenarios_per_chunk (int): Number of scenarios per chunk; this many scenarios are
+                buffered.
+            encoding (str): One of `encodings`. 'uint8'/'uint16' quantize each chunk linearly
+                between its minimum and maximum.
+            compression (int, optional): zlib level (0-9), or None to store the chunks uncompressed.
+        """
+        if encoding not in encodings:
+            raise ValueError(f"Unsupported encoding '{encoding}'. Please choose from {encodings}.")
+        self.path = path
+        self.n_t, self.n_grids = n_t, n_grids
+        self.scenarios_per_chunk = scenarios_per_chunk
+        self.encoding = encoding
+        self.compression = compression
+        self.grid_chunk = grid_chunks(n_grids, grid_nums, block, grids_per_chunk)
+        self.n_grid_chunks = int(self.grid_chunk.max()) + 1 if n_grids else 0
+        self.chunk_grids = [np.where(self.grid_chunk == c)[0] for c in range(self.n_grid_chunks)]
+
+        os.makedirs(path, exist_ok=True)
+        self._file = open(os.path.join(path, 'chunks.bin'), 'wb')
+        self._buffer = []
+        # one row of (offset, nbytes, minimum, maximum) per grid chunk and scenario chunk
+        self._index = []
+        self.n_scenarios = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, ch4_sim):
+        """
+        Appends one scenario, shape = (n_t, n_grids).
+        """
+        ch4_sim = np.asarray(ch4_sim)
+        if ch4_sim.shape != (self.n_t, self.n_grids):
+            raise ValueError(f'Expected a scenario of shape {(self.n_t, self.n_grids)}, '
+                             f'got {ch4_sim.shape}.')
+        self._buffer.append(ch4_sim)
+        self.n_scenarios += 1
+        if len(self._buffer) == self.scenarios_per_chunk:
+            self._flush()
+
+    def _flush(self):
+        scenarios = np.stack(self._buffer) # shape = (n_chunk_scenarios, n_t, n_grids)
+        self._buffer = []
+        row = []
+        for grids in self.chunk_grids:
+            chunk = scenarios[:, :, grids]
+            minimum, maximum = float(chunk.min()), float(chunk.max())
+            if self.encoding.startswith('uint'):
+                q_max = np.iinfo(self.encoding).max
+                scale = (maximum - minimum) / q_max if maximum > minimum else 1.
+                chunk = np.rint((chunk - minimum) / scale)
+            chunk = np.ascontiguousarray(chunk, dtype=self.encoding)
+            data = _shuffle(chunk.view(np.uint8), chunk.itemsize)
+            if self.compression is not None:
+                data = zlib.compress(data, self.compression)
+            row.append((self._file.tell(), len(data), minimum, maximum))
+            self._file.write(data)
+        self._index.append(row)
+
+    def close(self):
+        if self._file is None:
+            return
+        if self._buffer:
+            self._flush()
+        self._file.close()
+        self._file = None
+        index = np.array(self._index, dtype=float).reshape(-1, self.n_grid_chunks, 4)
+        np.savez(os.path.join(self.path, 'index.npz'), grid_chunk=self.grid_chunk,
+                 offsets=index[..., 0].astype(np.int64), nbytes=index[..., 1].astype(np.int64),
+                 minimum=index[..., 2], maximum=index[..., 3])
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump({'shape': [self.n_scenarios, self.n_t, self.n_grids],
+                       'scenarios_per_chunk': self.scenarios_per_chunk,
+                       'encoding': self.encoding, 'compression': self.compression}, f, indent=2)
+
+
+def write_concentrations(path, ch4_sim, **kwargs):
+    """
+    Converts a concentration array (n_scenarios, n_t, n_grids), e.g. a memory-mapped
+    'ch4_sim_grid_locations.npy', to a chunked store. Keyword arguments go to `ConcentrationWriter`.
+    """
+    with ConcentrationWriter(path, ch4_sim.shape[1], ch4_sim.shape[2], **kwargs) as writer:
+        for ch4_scenario in ch4_sim:
+            writer.write(ch4_scenario)
+    return ConcentrationStore(path)
+
+
+class ConcentrationStore:
+    def __init__(self, path, dtype=None):
+        """
+        Reads a concentration store written by `ConcentrationWriter`.
+
+        Parameters:
+            path (str): Directory of the store.
+            dtype (optional): Data type of the decoded concentrations. Defaults to float64 for
+                'float64' stores and float32 otherwise.
+        """
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.shape = tuple(meta['shape'])
+        self.scenarios_per_chunk = meta['scenarios_per_chunk']
+        self.encoding = meta['encoding']
+        self.compression = meta['compression']
+        if dtype is None:
+            dtype = np.float64 if self.encoding == 'float64' else np.float32
+        self.dtype = dtype
+        with np.load(os.path.join(path, 'index.npz')) as index:
+            self.grid_chunk = index['grid_chunk']
+            self.offsets, self.nbytes = index['offsets'], index['nbytes']
+            self.minimum, self.maximum = index['minimum'], index['maximum']
+        # position of every grid location within its chunk
+        order = np.lexsort((np.arange(len(self.grid_chunk)), self.grid_chunk))
+        counts = np.bincount(self.grid_chunk)
+        self.chunk_sizes = counts
+        self.grid_position = np.empty(len(self.grid_chunk), dtype=np.int64)
+        starts = np.cumsum(counts) - counts
+        self.grid_position[order] = np.arange(len(order)) - np.repeat(starts, counts)
+        self.chunks_read = 0 # number of decoded chunks, e.g. to check partial reads
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __iter__(self):
+        # one scenario at a time, decoding every chunk once
+        for start in range(0, self.shape[0], self.scenarios_per_chunk):
+            stop = min(start + self.scenarios_per_chunk, self.shape[0])
+            block = self.read(scenarios=np.arange(start, stop))
+            yield from block
+
+    def __getitem__(self, scenario):
+        return self.read(scenarios=[scenario])[0]
+
+    def _read_chunk(self, scenario_chunk, grid_chunk):
+        n_scenarios = min(self.scenarios_per_chunk,
+                          self.shape[0] - scenario_chunk * self.scenarios_per_chunk)
+        shape = (n_scenarios, self.shape[1], self.chunk_sizes[grid_chunk])
+        with open(os.path.join(self.path, 'chunks.bin'), 'rb') as f:
+            f.seek(self.offsets[scenario_chunk, grid_chunk])
+            data = f.read(self.nbytes[scenario_chunk, grid_chunk])
+        if self.compression is not None:
+            data = zlib.decompress(data)
+        itemsize = np.dtype(self.encoding).itemsize
+        chunk = np.frombuffer(_unshuffle(data, itemsize), dtype=self.encoding).reshape(shape)
+        self.chunks_read += 1
+        if self.encoding.startswith('uint'):
+            minimum = self.minimum[scenario_chunk, grid_chunk]
+            maximum = self.maximum[scenario_chunk, grid_chunk]
+            scale = (maximum - minimum) / np.iinfo(self.encoding).max if maximum > minimum else 1.
+            return (minimum + chunk * scale).astype(self.dtype)
+        return chunk.astype(self.dtype)
+
+    def read(self, grids=None, scenarios=None):
+        """
+        Concentrations of a subset of grid locations and scenarios. Only the chunks that contain
+        them are read and decoded.
+
+        Parameters:
+            grids (array-like, optional): Flat grid indices, e.g. fenceline locations. Defaults to
+                all.
+            scenarios (array-like, optional): Scenario indices. Defaults to all.
+
+        Returns:
+            ch4_sim (np.ndarray, shape = (n_selected_scenarios, n_t, n_selected_grids)) [ppm]
+        """
+        n_scenarios, n_t, n_grids = self.shape
+        grids = np.arange(n_grids) if grids is None else np.asarray(grids, dtype=np.int64)
+        scenarios = (np.arange(n_scenarios) if scenarios is None
+                     else np.asarray(scenarios, dtype=np.int64))
+        if len(grids) and (grids.min() < 0 or grids.max() >= n_grids):
+            raise ValueError(f'Grid indices must be between 0 and {n_grids - 1}.')
+        if len(scenarios) and (scenarios.min() < 0 or scenarios.max() >= n_scenarios):
+            raise ValueError(f'Scenario indices must be between 0 and {n_scenarios - 1}.')
+
+        ch4_sim = np.empty((len(scenarios), n_t, len(grids)), dtype=self.dtype)
+        scenario_chunks = scenarios // self.scenarios_per_chunk
+        for grid_chunk in np.unique(self.grid_chunk[grids]):
+            columns = np.where(self.grid_chunk[grids] == grid_chunk)[0]
+            positions = self.grid_position[grids[columns]]
+            for scenario_chunk in np.unique(scenario_chunks):
+                rows = np.where(scenario_chunks == scenario_chunk)[0]
+                chunk = self._read_chunk(scenario_chunk, grid_chunk)
+                local = scenarios[rows] - scenario_chunk * self.scenarios_per_chunk
+                ch4_sim[rows[:, None], :, columns[None, :]] = \
+                    chunk[local[:, None], :, positions[None, :]]
+        return ch4_sim
+
+    def nbytes_on_disk(self):
+        return os.path.getsize(os.path.join(self.path, 'chunks.bin'))
+
+
+def load_concentrations(data_dir):
+    """
+    The concentrations saved by `run_gp` in `data_dir`: the chunked store 'ch4_sim_grid_locations/'
+    if it exists, otherwise 'ch4_sim_grid_locations.npy', memory-mapped.
+    """
+    path = os.path.join(data_dir, 'ch4_sim_grid_locations')
+    if os.path.isdir(path):
+        return ConcentrationStore(path)
+    return np.load(path + '.npy', mmap_mode='r')
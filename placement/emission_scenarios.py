@@ -0,0 +1,173 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Step 1: sample hour-long wind chunks from the site's wind record and combine them with the
+# emission source and rate distribution into the emission scenario table used by step 2.
+
+
+def source_rate_distribution(source_locs, prob_sources, prob_rate_per_source):
+    """
+    Joint distribution of (source location, emission rate).
+
+    Parameters:
+        source_locs (array-like, shape = (n_sources, 3)) [m]: Potential source locations [x, y, z].
+        prob_sources (list): Emission probability of each source.
+        prob_rate_per_source (list): For each source, a list of [emission rate [kg/h], probability]
+            pairs.
+
+    Returns:
+        source_rate_dist (list): Tuples of (source_loc, emission rate, probability).
+    """
+    source_rate_dist = []
+    for source_loc, prob_source, prob_rates in zip(source_locs, prob_sources, prob_rate_per_source):
+        for rate, prob_rate in prob_rates:
+            source_rate_dist.append((source_loc, rate, prob_source * prob_rate))
+    return source_rate_dist
+
+
+def parse_timestamps(values, time_format='%Y-%m-%d %H:%M:%S'):
+    """
+    Parses timestamps like '2024-01-01 00:00:00-07:00' to (timezone-naive) UTC datetime64 values.
+
+    The local time is parsed with a fixed format and the UTC offset only once per distinct
+    offset, which avoids parsing every row with its own offset. Falls back to pandas for
+    inputs that do not follow this layout.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.to_datetime(values, utc=True).dt.tz_localize(None).to_numpy()
+
+    try:
+        strings = values.to_numpy().astype('S')
+        n_local = len(datetime(2000, 1, 1).strftime(time_format))
+        chars = strings.view(np.uint8).reshape(len(strings), strings.dtype.itemsize)
+        local = chars[:, :n_local].copy().view(f'S{n_local}').ravel().astype(str)
+        local = pd.to_datetime(local, format=time_format).to_numpy()
+
+        suffixes = chars[:, n_local:].copy().view(f'S{chars.shape[1] - n_local}').ravel()
+        offsets, inverse = np.unique(suffixes, return_inverse=True)
+        offsets = np.array([datetime.strptime(o.decode(), '%z').utcoffset() for o in offsets],
+                           dtype='timedelta64[s]')
+        return local - offsets[inverse.ravel()]
+    except ValueError:
+        times = pd.to_datetime(values, format=time_format + '%z', utc=True)
+        return times.dt.tz_localize(None).to_numpy()
+
+
+def valid_chunk_starts(df_wind, sample_len=60, missing_data_tol=5,
+                       colname_time='TimeStamp.Mountain',
+                       colname_ws='WindSpeed.m/s',
+                       colname_wd='WindDirection.degree'):
+    """
+    Row positions of `df_wind` at which a valid chunk of `sample_len` rows starts, i.e., the
+    chunk spans exactly `sample_len` consecutive minutes and has at most `missing_data_tol` NaN
+    values in wind speed and in wind direction. All windows are checked at once with rolling sums.
+    """
+    n_rows = len(df_wind)
+    if n_rows < sample_len:
+        return np.array([], dtype=int)
+
+    times = parse_timestamps(df_wind[colname_time])
+    time_span = times[sample_len - 1:] - times[:n_rows - sample_len + 1]
+    valid = time_span == np.timedelta64(sample_len - 1, 'm')
+
+    for colname in [colname_wd, colname_ws]:
+        nan_count = np.concatenate(([0], np.cumsum(df_wind[colname].isna().to_numpy())))
+        valid &= nan_count[sample_len:] - nan_count[:n_rows - sample_len + 1] <= missing_data_tol
+
+    # keep the start range of the original rejection sampler
+    return np.flatnonzero(valid[:n_rows - sample_len])
+
+
+def sample_wind_chunks(df_wind, n_samples, sample_len=60, missing_data_tol=5,
+                       colname_time='TimeStamp.Mountain',
+                       colname_ws='WindSpeed.m/s',
+                       colname_wd='WindDirection.degree',
+                       ws_valid_lb=.5, ws_valid_ub=20.,
+                       seed=None):
+    """
+    Samples valid chunks of wind data from the given DataFrame.
+
+    Parameters:
+        df_wind (pd.DataFrame): DataFrame containing wind data, including timestamp, wind direction,
+            and wind speed columns.
+        n_samples (int): Desired number of valid chunks to sample.
+        sample_len (int): Number of consecutive rows to include in each chunk.
+        missing_data_tol (int): Maximum allowable number of NaN values in wind direction or wind
+            speed columns for a chunk to be considered valid.
+        colname_time (str): Name of the timestamp column in the DataFrame.
+        colname_ws (str): Name of the wind speed column in the DataFrame.
+        colname_wd (str): Name of the wind direction column in the DataFrame.
+        ws_valid_lb (float, optional): Lower bound of valid wind speed value, i.e., all wind speed
+            below this value are filtered out. Default is 0.5 m/s.
+        ws_valid_ub (float, optional): Upper bound of valid wind speed value, i.e., all wind speed
+            above this value are filtered out. Default is 20.0 m/s.
+        seed (int, optional): Seed value for reproducibility of the random sampling. Default is
+            None.
+
+    Raises:
+        ValueError: If the wind data has fewer than `n_samples` valid chunks.
+
+    Returns:
+        pd.DataFrame: A concatenated DataFrame containing all sampled valid chunks of wind data.
+    """
+    rng = np.random.default_rng(seed)
+
+    # Filter invalid wind speeds
+    df_wind = df_wind[(df_wind[colname_ws] > ws_valid_lb) & (df_wind[colname_ws] < ws_valid_ub)]
+
+    # Sample distinct start positions among all valid chunks
+    starts = valid_chunk_starts(df_wind, sample_len, missing_data_tol, colname_time=colname_time,
+                                colname_ws=colname_ws, colname_wd=colname_wd)
+    if len(starts) < n_samples:
+        raise ValueError(f"Only {len(starts)} valid chunks of length {sample_len} found, "
+                         f"but {n_samples} were requested.")
+    starts = rng.choice(starts, size=n_samples, replace=False)
+
+    # Gather all chunks in one take and add a ChunkIndex column for easy identification
+    rows = (starts[:, None] + np.arange(sample_len)).ravel()
+    df_wind_samples = df_wind.iloc[rows].reset_index(drop=True)
+    df_wind_samples['ChunkIndex'] = np.repeat(np.arange(n_samples), sample_len)
+
+    # Fill NaN values with forward fill within each chunk
+    chunks = df_wind_samples.groupby('ChunkIndex')
+    df_wind_samples[colname_wd] = chunks[colname_wd].ffill()
+    df_wind_samples[colname_ws] = chunks[colname_ws].ffill()
+
+    return df_wind_samples
+
+
+def generate_emission_scenarios(df_wind_samples, source_rate_dist):
+    """
+    Adds source location and emission rate columns to the sampled wind chunks. Each
+    (source location, emission rate) combination gets a number of chunks proportional to its
+    probability.
+
+    Parameters:
+        df_wind_samples (pd.DataFrame): Sampled wind chunks from `sample_wind_chunks`.
+        source_rate_dist (list): Tuples of (source_loc, emission rate, probability).
+
+    Returns:
+        df_emission_scenarios (pd.DataFrame): The emission scenario table.
+    """
+    chunk_ids, chunk_lens = np.unique(df_wind_samples['ChunkIndex'].to_numpy(), return_counts=True)
+    n_samples_total = len(chunk_ids)
+
+    # num of samples for each (source_loc, emission rate) combination; the last case takes the rest
+    probs = np.array([prob for _, _, prob in source_rate_dist])
+    n_samples_per_comb = (probs[:-1] * n_samples_total).astype(int)
+    n_samples_per_comb = np.append(n_samples_per_comb, n_samples_total - n_samples_per_comb.sum())
+
+    source_locs = np.array([source_loc for source_loc, _, _ in source_rate_dist], dtype=float)
+    emission_rates = np.array([rate for _, rate, _ in source_rate_dist], dtype=float)
+    comb_per_chunk = np.repeat(np.arange(len(source_rate_dist)), n_samples_per_comb)
+    comb_per_row = np.repeat(comb_per_chunk, chunk_lens)
+
+    df_emission_scenarios = df_wind_samples.copy()
+    df_emission_scenarios['Source_x.m'] = source_locs[comb_per_row, 0]
+    df_emission_scenarios['Source_y.m'] = source_locs[comb_per_row, 1]
+    df_emission_scenarios['Source_z.m'] = source_locs[comb_per_row, 2]
+    df_emission_scenarios['EmissionRate.kg/h'] = emission_rates[comb_per_row]
+
+    return df_emission_scenarios
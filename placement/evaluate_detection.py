@@ -1,15 +1,8 @@
+import json
+import os
+import time
 import numpy as np
-import pandas as pd
-
-# specify dirs
-data_dir = './demo/output_data/'
-save_dir = './demo/output_data/'
-
-ch4_sim = np.load(data_dir + 'ch4_sim_grid_locations.npy') # shape = (n_scenarios, n_t, n_grids)
-n_scenarios, n_t, n_grids = ch4_sim.shape
-
-df_valid_sensor_locs = pd.read_csv(data_dir + 'valid_sensor_locations.csv')
-df_fenceline_sensor_locs = pd.read_csv(data_dir + 'fenceline_sensor_locations.csv')
+from placement.instrumentation import null_metrics
 
 # Different detection strategies 
 
@@ -76,76 +69,190 @@ def detection_movingWindow(data, window_len, amp_thresh, persistence_thresh, str
     else:
         return 0  # No detection
 
-# Main function to perform methane detection based on the specified method
-def run_detection(ch4_sim, method, amp_thresh, persistence_thresh, window_len=None, stride=None, save_dir='./'):
+# Vectorized detection for one emission scenario: applies the chosen strategy to every
+# grid location at once along the time axis. Gives the same result as applying the
+# per-time-series functions above to each column.
+def detect_scenario(ch4_scenario, method, amp_thresh, persistence_thresh, window_len=None,
+                    stride=None):
     """
-    Applies a specified methane detection strategy across simulation data.
+    Reduces the simulated concentrations of one emission scenario to one detection bit per location.
 
     Parameters:
-        ch4_sim (np.ndarray, shape = (n_scenarios, n_t, n_grids)) [ppm]: 2D array of methane simulation data where each row represents a scenario and each column represents a grid location.
-        method (str): Detection method to use. Options are 'overall', 'consecutive', or 'movingWindow'.
+        ch4_scenario (np.ndarray, shape = (n_t, n_grids)) [ppm]: Methane time series of one scenario
+            for each grid location.
+        method (str): Detection method to use. Options are 'overall', 'consecutive', or
+            'movingWindow'.
         amp_thresh (float) [ppm]: Amplitude threshold to use for detection.
-        persistence_thresh (int or float): Persistence threshold, as a count or fraction of data length.
-        window_len (int, optional): Length of the moving window for the 'movingWindow' method. Required if method is 'movingWindow'.
-        stride (int, optional): Stride length for the moving window in 'movingWindow' method. Default is None.
+        persistence_thresh (int or float): Persistence threshold, as a count or fraction of data
+            length. For 'consecutive', a run has to reach the count exactly, so a count of 1 or
+            more that is not a whole number never detects.
+        window_len (int, optional): Length of the moving window for the 'movingWindow' method.
+            Required if method is 'movingWindow'.
+        stride (int, optional): Stride length for the moving window in 'movingWindow' method.
+            Default is None.
 
     Raises:
-        ValueError: If an unsupported detection method is specified.
+        ValueError: If an unsupported detection method is specified, or the moving window is
+            invalid.
 
     Returns:
-        detection (np.ndarray, shape = (n_scenarios, n_grids)) : 2D array of detection reulsts. 1 for detection, 0 for non-detection. 
+        detection (np.ndarray, shape = (n_grids,)): 1 for detection, 0 for non-detection.
     """
+    ch4_scenario = np.asarray(ch4_scenario)
+    n_t = ch4_scenario.shape[0]
 
-    # Use the 'overall' detection method to check if total values above the threshold meet persistence
     if method == 'overall':
-        detection = np.apply_along_axis(detection_overall, axis=1, 
-                                        arr=ch4_sim,
-                                        amp_thresh=amp_thresh, 
-                                        persistence_thresh=persistence_thresh)  # shape = (n_scenarios, n_grids) 
-        
-    # Use the 'consecutive' detection method to find sequences of consecutive values meeting the threshold
+        if persistence_thresh < 1:
+            persistence_thresh = int(np.ceil(n_t * persistence_thresh))
+        detected = (ch4_scenario >= amp_thresh).sum(axis=0) >= persistence_thresh
+
     elif method == 'consecutive':
-        detection = np.apply_along_axis(detection_consecutive, axis=1, 
-                                        arr=ch4_sim,
-                                        amp_thresh=amp_thresh, 
-                                        persistence_thresh=persistence_thresh)  # shape = (n_scenarios, n_grids) 
+        if persistence_thresh < 1:
+            persistence_thresh = int(np.ceil(n_t * persistence_thresh))
+        above = np.concatenate((np.zeros((1,) + ch4_scenario.shape[1:], dtype=bool),
+                                ch4_scenario >= amp_thresh), axis=0)
+        # length of the current run of values above threshold at each time step
+        counts = np.cumsum(above, axis=0)
+        run_starts = np.maximum.accumulate(np.where(above, 0, counts), axis=0)
+        max_run = (counts - run_starts).max(axis=0)
+        # a run has to reach the count exactly, so a non-integer count never detects, as in
+        # detection_consecutive
+        detected = ((max_run >= persistence_thresh) & (persistence_thresh > 0)
+                    & float(persistence_thresh).is_integer())
 
-    # Use the 'movingWindow' detection method to apply a sliding window with stride for detection
     elif method == 'movingWindow':
-        detection = np.apply_along_axis(detection_movingWindow, axis=1, 
-                                        arr=ch4_sim,
-                                        window_len=window_len,  # Specify the window length
-                                        amp_thresh=amp_thresh, 
-                                        persistence_thresh=persistence_thresh,
-                                        stride=stride)  # shape = (n_scenarios, n_grids) 
-
-    # Raise an error if an unsupported method is provided
+        if window_len is None or not 0 < window_len <= n_t:
+            raise ValueError(f"window_len must be between 1 and the series length ({n_t}), "
+                             f"got {window_len}.")
+        if persistence_thresh < 1:
+            required_count = int(np.ceil(window_len * persistence_thresh))
+        else:
+            required_count = persistence_thresh
+        above = np.cumsum(ch4_scenario > amp_thresh, axis=0)
+        above = np.concatenate((np.zeros((1,) + above.shape[1:], dtype=above.dtype), above), axis=0)
+        window_counts = above[window_len:] - above[:-window_len] # shape = (n_windows, n_grids)
+        detected = np.any(window_counts[::stride] >= required_count, axis=0)
+
     else:
         raise ValueError(f"Unsupported detection method '{method}'. "
                          "Please choose from 'overall', 'consecutive', or 'movingWindow'.")
 
-    # Transpose detection matrix so that rows are locations and columns are emission scenarios
-    detection = np.transpose(detection) # new shape = (n_grids, n_scenarios)
-    
-    # Save the detection results to a file for further analysis or visualization
-    np.save(save_dir + 'detection_grid_locations.npy', detection)
+    return detected.astype(int)
+
+
+def _new_scenarios(ch4_sim, start):
+    # the scenarios from `start` on; a chunked store is read once per scenario chunk
+    n_scenarios = len(ch4_sim)
+    if not hasattr(ch4_sim, 'read'):
+        yield from ch4_sim[start:]
+        return
+    step = ch4_sim.scenarios_per_chunk
+    bounds = [start] + list(range((start // step + 1) * step, n_scenarios, step)) + [n_scenarios]
+    for block_start, block_stop in zip(bounds[:-1], bounds[1:]):
+        if block_stop > block_start:
+            yield from ch4_sim.read(scenarios=np.arange(block_start, block_stop))
+
+
+def _fingerprint(ch4_scenario):
+    # total concentration of a scenario, to recognize the scenarios of a saved detection matrix
+    return float(np.sum(ch4_scenario, dtype=np.float64))
+
+
+def _check_saved_detection(ch4_sim, previous, saved, params):
+    # the saved matrix must come from the same detection rule and the same leading scenarios
+    n_scenarios, n_grids = len(ch4_sim), ch4_sim.shape[2]
+    if previous.shape[0] != n_grids or previous.shape[1] > n_scenarios:
+        raise ValueError(f'The saved detection matrix {previous.shape} does not match the '
+                         f'{n_scenarios} scenarios and {n_grids} grids to append to.')
+    if saved is None:
+        raise ValueError('The saved detection matrix has no parameter file to check it against; '
+                         'run the detection without append.')
+    if saved['params'] != params:
+        raise ValueError(f"The saved detection matrix was computed with {saved['params']}, "
+                         f'not {params}; run the detection without append.')
+    for i, fingerprint in saved['fingerprints'].items():
+        if not np.isclose(_fingerprint(ch4_sim[int(i)]), fingerprint, rtol=1e-5):
+            raise ValueError(f'Scenario {i} differs from the one of the saved detection matrix; '
+                             'run the detection without append.')
 
-    return detection
 
+# Main function to perform methane detection based on the specified method
+def run_detection(ch4_sim, method, amp_thresh, persistence_thresh, window_len=None, stride=None,
+                  save_dir='./', metrics=None, append=False):
+    """
+    Applies a specified methane detection strategy across simulation data.
+
+    Parameters:
+        ch4_sim (np.ndarray, shape = (n_scenarios, n_t, n_grids)) [ppm]: 2D array of methane simulation data where each row represents a scenario and each column represents a grid location.
+        method (str): Detection method to use. Options are 'overall', 'consecutive', or 'movingWindow'.
+        amp_thresh (float) [ppm]: Amplitude threshold to use for detection.
+        persistence_thresh (int or float): Persistence threshold, as a count or fraction of data length.
+        window_len (int, optional): Length of the moving window for the 'movingWindow' method. Required if method is 'movingWindow'.
+        stride (int, optional): Stride length for the moving window in 'movingWindow' method. Default is None.
+        metrics (Metrics, optional): Records the detection time and throughput.
+        append (bool): Reuse the detection matrix saved in `save_dir` for the first scenarios of
+            `ch4_sim` and only evaluate the scenarios added since, e.g. for new wind data. The
+            detection parameters and the first and last scenario of the saved matrix must match;
+            they are recorded in 'detection_grid_locations.json' by the runs with `append`, so
+            the first run of a series that is appended to later also needs `append`.
 
+    Raises:
+        ValueError: If an unsupported detection method is specified, or if the saved detection
+            matrix does not match `ch4_sim` or the detection parameters when appending.
 
+    Returns:
+        detection (np.ndarray, shape = (n_grids, n_scenarios)) : 2D array of detection reulsts.
+            1 for detection, 0 for non-detection.
+    """
 
-# Run detection
-method = 'overall'
-amp_thresh, persistence_thresh = 1, .2
-detection = run_detection(ch4_sim, method, amp_thresh, persistence_thresh, save_dir=save_dir)  # shape = (n_grids, n_scenarios)
+    metrics = null_metrics if metrics is None else metrics
+    n_scenarios, n_grids = len(ch4_sim), ch4_sim.shape[2]
+    params = {'method': method, 'amp_thresh': amp_thresh, 'persistence_thresh': persistence_thresh,
+              'window_len': window_len, 'stride': stride}
+    params = json.loads(json.dumps(params, default=float)) # as read back from the parameter file
+    previous = np.zeros((n_grids, 0), dtype=int)
+    path = save_dir + 'detection_grid_locations.npy'
+    params_path = save_dir + 'detection_grid_locations.json'
+    if append and os.path.exists(path):
+        previous = np.load(path)
+        saved = None
+        if os.path.exists(params_path):
+            with open(params_path) as f:
+                saved = json.load(f)
+        _check_saved_detection(ch4_sim, previous, saved, params)
+    start_time = time.perf_counter()
+
+    # Reduce each new scenario's time series to one detection bit per location
+    start = previous.shape[1]
+    detection = np.array([detect_scenario(ch4_scenario, method, amp_thresh, persistence_thresh,
+                                          window_len=window_len, stride=stride)
+                          for ch4_scenario in _new_scenarios(ch4_sim, start)], dtype=int)
+    detection = detection.reshape(-1, n_grids) # shape = (n_new_scenarios, n_grids)
+
+    runtime = time.perf_counter() - start_time
+    metrics.add_time('detection', runtime)
+    metrics.increment('detection.series', detection.size)
+    metrics.emit('detection.done', method=method, n_series=detection.size, seconds=runtime,
+                 series_per_sec=detection.size / runtime if runtime > 0 else None)
+
+    # Transpose detection matrix so that rows are locations and columns are emission scenarios
+    detection = np.hstack((previous, np.transpose(detection))) # new shape = (n_grids, n_scenarios)
+    
+    # Save the detection results to a file for further analysis or visualization
+    np.save(path, detection)
+    if append:
+        fingerprints = {str(i): _fingerprint(ch4_sim[i])
+                        for i in sorted({0, n_scenarios - 1}) if n_scenarios}
+        with open(params_path, 'w') as f:
+            json.dump({'params': params, 'n_scenarios': n_scenarios,
+                       'fingerprints': fingerprints}, f, indent=2)
+    elif os.path.exists(params_path):
+        os.remove(params_path) # it describes the overwritten matrix
+
+    return detection
 
-# Detection matrix for valid sensor locations
-rows_valid_locs = df_valid_sensor_locs['loc_index'].tolist()
-detection_valid_sensors = detection[rows_valid_locs, :]
-np.save(save_dir + 'detection_valid_locations.npy', detection_valid_sensors)
 
-# Detection matrix for fenceline sensor locations
-rows_fenceline_locs = df_fenceline_sensor_locs['loc_index'].tolist()
-detection_fenceline_sensors = detection[rows_fenceline_locs, :]
-np.save(save_dir + 'detection_fenceline_locations.npy', detection_fenceline_sensors)
+if __name__ == '__main__':
+    import sys
+    from placement.__main__ import main
+    main(['detect'] + sys.argv[1:])
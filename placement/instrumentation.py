@@ -0,0 +1,103 @@
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+# Counters, gauges and timers for the pipeline stages. Events such as PORSS progress or a
+# finished simulation scenario are passed to user callbacks and optionally appended to a
+# JSON-lines file, so long runs can be monitored (e.g. for stalled jobs) without a profiler.
+
+
+class Metrics:
+    def __init__(self, sink=None, callbacks=None):
+        """
+        Parameters:
+            sink (str, optional): Path of a JSON-lines file; every event is appended as one line.
+            callbacks (list, optional): Functions called with every event record (a dict).
+        """
+        self.sink = sink
+        self.callbacks = list(callbacks or [])
+        self.counters = {}
+        self.gauges = {}
+        self.timers = {} # name -> [total seconds, count]
+        self.start_time = time.time()
+        self._sink_file = None
+
+    def increment(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    @contextmanager
+    def timer(self, name):
+        '''
+        Context manager that adds the time spent in its block to the timer `name`.
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        total = self.timers.setdefault(name, [0., 0])
+        total[0] += seconds
+        total[1] += 1
+
+    def emit(self, event, **fields):
+        '''
+        Passes an event record to the callbacks and the sink.
+        '''
+        now = time.time()
+        record = {'event': event, 'time': now, 'elapsed': now - self.start_time, **fields}
+        for callback in self.callbacks:
+            callback(record)
+        if self.sink is not None:
+            if self._sink_file is None:
+                self._sink_file = open(self.sink, 'a')
+            self._sink_file.write(json.dumps(record, default=float) + '\n')
+            self._sink_file.flush()
+        return record
+
+    def summary(self):
+        '''
+        Current counters, gauges and timers.
+        '''
+        return {'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'timers': {name: {'total_sec': total, 'count': count}
+                           for name, (total, count) in self.timers.items()}}
+
+    def close(self):
+        if self._sink_file is not None:
+            self._sink_file.close()
+            self._sink_file = None
+
+
+class NullMetrics:
+    '''
+    Drop-in for Metrics that records nothing; used when no instrumentation is requested.
+    '''
+    def increment(self, name, value=1):
+        pass
+
+    def gauge(self, name, value):
+        pass
+
+    def timer(self, name):
+        return nullcontext()
+
+    def add_time(self, name, seconds):
+        pass
+
+    def emit(self, event, **fields):
+        pass
+
+    def summary(self):
+        return {'counters': {}, 'gauges': {}, 'timers': {}}
+
+    def close(self):
+        pass
+
+
+null_metrics = NullMetrics()
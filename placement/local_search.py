@@ -0,0 +1,157 @@
+import itertools
+import numpy as np
+from placement.instrumentation import null_metrics
+
+# Swap-based local search that polishes a placement, e.g. the solution of `PORSS.main`. Moves
+# replace one (1-swap) or two (2-swap) selected locations by unselected ones, and the best
+# improving move is applied until no move improves the coverage.
+#
+# The number of selected sensors detecting each scenario is kept up to date after every move.
+# For every selected sensor s, the gain of each location when it replaces s is cached: the
+# weight of the scenarios that are one detection short once s is removed and that the location
+# detects. Replacing s by j leaves the counts without s unchanged, so the cache of that position
+# stays valid, and the caches of the other positions only change on the scenarios detected by
+# exactly one of s and j.
+
+
+def _gains(matrix, cols, weights):
+    # total weight of the scenarios `cols` detected by every location
+    if weights is None:
+        return matrix[:, cols].sum(axis=1, dtype=np.int64)
+    return matrix[:, cols] @ weights[cols]
+
+
+def _covered_value(counts, min_detected_sensor, weights):
+    covered = counts >= min_detected_sensor
+    return np.sum(covered) if weights is None else np.sum(weights[covered])
+
+
+def swap_local_search(matrix, solution, min_detected_sensor, weights=None, budget=None,
+                      two_swap=True, pool_size=50, max_moves=None, verbose=False, metrics=None):
+    """
+    Best-improvement 1-swap and 2-swap local search.
+
+    Parameters:
+        matrix (np.ndarray, shape = (n_locations, n_scenarios)): 0/1 detection matrix.
+        solution (array-like): Row indices of the initial placement, e.g. from `PORSS.main` or
+            `PORSS.find_best_solution`.
+        min_detected_sensor (int): Minimum number of sensors needed to detect a scenario.
+        weights (np.ndarray, shape = (n_scenarios,), optional): Scenario weights.
+        budget (int, optional): Number of sensors. If the initial placement has fewer, it is first
+            filled up greedily. Defaults to the size of the initial placement.
+        two_swap (bool): Try 2-swaps when no 1-swap improves the coverage.
+        pool_size (int): 2-swaps only insert locations among the `pool_size` best candidates for
+            the removed pair, to keep the number of pairs small.
+        max_moves (int, optional): Maximum number of applied moves.
+        verbose (bool): Print every applied move.
+        metrics (placement.instrumentation.Metrics, optional): Receives a 'local_search.moves'
+            counter.
+
+    Returns:
+        solution (np.ndarray): Row indices of the locally optimal placement.
+        coverage: Number (or total weight) of covered scenarios, as returned by `PORSS.main`.
+    """
+    metrics = null_metrics if metrics is None else metrics
+    weights = None if weights is None else np.asarray(weights, dtype=float)
+    m = min_detected_sensor
+    solution = [int(s) for s in np.unique(solution)]
+    budget = len(solution) if budget is None else budget
+    if len(solution) > budget:
+        raise ValueError(f'The initial placement has {len(solution)} sensors, more than the budget '
+                         f'of {budget}.')
+    counts = matrix[solution].sum(axis=0, dtype=np.int64)
+
+    # greedy fill-up to the budget
+    while len(solution) < budget:
+        gains = _gains(matrix, np.where(counts == m - 1)[0], weights).astype(float)
+        gains[solution] = -np.inf
+        best = int(np.argmax(gains))
+        solution.append(best)
+        counts += matrix[best]
+
+    def cache(position):
+        base = counts - matrix[solution[position]]
+        return _gains(matrix, np.where(base == m - 1)[0], weights).astype(float)
+
+    caches = [cache(p) for p in range(len(solution))]
+    # round-off of the updated weighted caches
+    tol = 0 if weights is None else 1e-9 * np.sum(weights)
+    n_moves = 0
+    while max_moves is None or n_moves < max_moves:
+        # 1-swaps: coverage change = gain of the new location - loss of removing the old one
+        best_delta, best_move = tol, None
+        for position, s in enumerate(solution):
+            lost = np.where((counts == m) & (matrix[s] > 0))[0]
+            loss = len(lost) if weights is None else np.sum(weights[lost])
+            gains = caches[position].copy()
+            gains[solution] = -np.inf
+            j = int(np.argmax(gains))
+            if gains[j] - loss > best_delta:
+                best_delta, best_move = gains[j] - loss, (position, j)
+
+        if best_move is not None:
+            position, j = best_move
+            s = solution[position]
+            new_counts = counts - matrix[s] + matrix[j]
+            changed = np.where(matrix[s] != matrix[j])[0]
+            for q in range(len(solution)):
+                if q == position: # the counts without this position are unchanged
+                    continue
+                row = matrix[solution[q]][changed]
+                was_near = (counts[changed] - row) == m - 1
+                is_near = (new_counts[changed] - row) == m - 1
+                diff = is_near.astype(float) - was_near
+                if weights is not None:
+                    diff *= weights[changed]
+                caches[q] += matrix[:, changed] @ diff
+            solution[position] = j
+            counts = new_counts
+        elif two_swap and len(solution) >= 2:
+            best_move = _best_two_swap(matrix, solution, counts, m, weights, pool_size, tol)
+            if best_move is None:
+                break
+            (p1, p2), (j1, j2), best_delta = best_move
+            counts = counts - matrix[solution[p1]] - matrix[solution[p2]] + matrix[j1] + matrix[j2]
+            solution[p1], solution[p2] = j1, j2
+            caches = [cache(p) for p in range(len(solution))]
+        else:
+            break
+
+        n_moves += 1
+        metrics.increment('local_search.moves')
+        if verbose:
+            print(f'Move #{n_moves}: coverage {_covered_value(counts, m, weights)} (+{best_delta})')
+
+    coverage = _covered_value(counts, m, weights)
+    return np.array(sorted(solution)), (int(coverage) if weights is None else coverage)
+
+
+def _best_two_swap(matrix, solution, counts, m, weights, pool_size, tol):
+    # best improving replacement of two selected sensors, or None
+    best_delta, best_move = tol, None
+    for p1, p2 in itertools.combinations(range(len(solution)), 2):
+        base = counts - matrix[solution[p1]] - matrix[solution[p2]]
+        cols = np.where((base < m) & (base >= m - 2))[0] # scenarios two new sensors can cover
+        if len(cols) == 0:
+            continue
+        # coverage change on `cols`, the only scenarios whose coverage can change
+        lost_value = _covered_value(counts[cols], m, None if weights is None else weights[cols])
+
+        scores = _gains(matrix, cols, weights).astype(float)
+        scores[solution] = -np.inf
+        pool = np.argsort(-scores)[:pool_size]
+        pool = pool[np.isfinite(scores[pool])]
+        if len(pool) < 2:
+            continue
+        first, second = np.triu_indices(len(pool), k=1)
+        sub = matrix[pool][:, cols].astype(np.int64)
+        pair_counts = base[cols] + sub[first] + sub[second] # shape = (n_pairs, n_cols)
+        covered = pair_counts >= m
+        values = covered.sum(axis=1) if weights is None else covered @ weights[cols]
+        best_pair = int(np.argmax(values))
+        delta = values[best_pair] - lost_value
+        if delta > best_delta:
+            best_delta = delta
+            added = (int(pool[first[best_pair]]), int(pool[second[best_pair]]))
+            best_move = ((p1, p2), added, delta)
+    return best_move
@@ -0,0 +1,181 @@
+import numpy as np
+from placement.PORSS import PORSS
+
+# Coarse-to-fine placement search. The candidate grid is divided into blocks of
+# factor = (fx, fy, fz) grid cells. PORSS first runs on one row per block, the detection of the
+# block's cells aggregated, then again at full resolution on the cells of the selected blocks
+# and their neighbouring blocks only. The fine detection matrix is requested one block at a
+# time, so it is never held in memory as a whole.
+#
+# Grid cells are identified by their flat index in the (nx, ny, nz) grid, in C order as
+# produced by `run_gp` (index = (ix * ny + iy) * nz + iz).
+
+
+def block_ids(cells, grid_nums, factor):
+    """
+    Coarse block of every grid cell.
+
+    Parameters:
+        cells (np.ndarray): Flat indices of grid cells.
+        grid_nums (tuple): (nx, ny, nz) number of grids in x, y, z directions.
+        factor (int or tuple): Block size in grid cells, per direction or for all directions.
+
+    Returns:
+        blocks (np.ndarray): Flat index of the block of each cell in the coarse grid.
+        coarse_nums (tuple): Number of blocks in x, y, z directions.
+    """
+    factor = np.broadcast_to(factor, 3)
+    coarse_nums = tuple(int(n) for n in -(-np.asarray(grid_nums) // factor))
+    ijk = np.unravel_index(cells, grid_nums)
+    blocks = np.ravel_multi_index(tuple(i // f for i, f in zip(ijk, factor)), coarse_nums)
+    return blocks, coarse_nums
+
+
+def block_representatives(cells, blocks):
+    """
+    A central cell of each block: the median of the block's cells in flat index order, which
+    is the centre cell for full blocks.
+
+    Returns:
+        unique_blocks (np.ndarray): Sorted blocks that contain at least one cell.
+        representatives (np.ndarray): Representative cell of each block.
+    """
+    cells = np.asarray(cells)
+    unique_blocks, inverse = np.unique(blocks, return_inverse=True)
+    order = np.lexsort((cells, inverse))
+    starts = np.searchsorted(inverse[order], np.arange(len(unique_blocks)))
+    ends = np.append(starts[1:], len(order))
+    representatives = cells[order[(starts + ends - 1) // 2]]
+    return unique_blocks, representatives
+
+
+def aggregate_detection(detection, blocks, how='any'):
+    """
+    Aggregates fine detection rows to one row per block.
+
+    Parameters:
+        detection (np.ndarray, shape = (n_cells, n_scenarios)): 0/1 detection of the fine cells.
+        blocks (np.ndarray, shape = (n_cells,)): Block of each fine cell.
+        how (str): 'any' counts a scenario as detected in a block if any cell detects it,
+            'majority' if at least half of the cells do.
+
+    Returns:
+        unique_blocks (np.ndarray): Sorted blocks.
+        coarse_detection (np.ndarray, shape = (n_blocks, n_scenarios)): 0/1 detection of the blocks.
+    """
+    unique_blocks, inverse = np.unique(blocks, return_inverse=True)
+    counts = np.zeros((len(unique_blocks), detection.shape[1]))
+    np.add.at(counts, inverse, detection)
+    if how == 'any':
+        coarse_detection = counts > 0
+    elif how == 'majority':
+        coarse_detection = counts >= np.bincount(inverse)[:, None] / 2
+    else:
+        raise ValueError(f"Unsupported aggregation '{how}'. "
+                         "Please choose from 'any' or 'majority'.")
+    return unique_blocks, coarse_detection.astype(int)
+
+
+def block_detection(detection_fn, cells, blocks, how='any'):
+    """
+    Aggregated detection of every block, requesting the fine detection rows one block at a time.
+
+    Parameters:
+        detection_fn (callable): Takes flat indices of fine grid cells and returns their detection
+            rows, shape = (n_cells, n_scenarios).
+        cells (np.ndarray, shape = (n_cells,)): Flat indices of the fine grid cells.
+        blocks (np.ndarray, shape = (n_cells,)): Block of each fine cell.
+        how (str): Aggregation of the cells of a block, see `aggregate_detection`.
+
+    Returns:
+        unique_blocks (np.ndarray): Sorted blocks.
+        coarse_detection (np.ndarray, shape = (n_blocks, n_scenarios)): 0/1 detection of the blocks.
+    """
+    cells = np.asarray(cells)
+    unique_blocks, inverse = np.unique(blocks, return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    block_cells = np.split(cells[order], np.cumsum(np.bincount(inverse))[:-1])
+    coarse_detection = [aggregate_detection(np.asarray(detection_fn(c)), np.zeros(len(c)),
+                                            how)[1][0]
+                        for c in block_cells]
+    return unique_blocks, np.array(coarse_detection)
+
+
+def neighbour_blocks(blocks, coarse_nums, halo=1):
+    """
+    The given blocks and all blocks within `halo` blocks of them in every direction.
+    """
+    ijk = np.array(np.unravel_index(blocks, coarse_nums)).T # shape = (n_blocks, 3)
+    offsets = np.stack(np.meshgrid(*[np.arange(-halo, halo + 1)] * 3, indexing='ij'), axis=-1)
+    offsets = offsets.reshape(-1, 3)
+    neighbours = (ijk[:, None, :] + offsets[None, :, :]).reshape(-1, 3)
+    inside = np.all((neighbours >= 0) & (neighbours < np.asarray(coarse_nums)), axis=1)
+    return np.unique(np.ravel_multi_index(tuple(neighbours[inside].T), coarse_nums))
+
+
+def run_multiresolution(detection_fn, grid_nums, factor, budget, min_detected_sensor,
+                        candidates=None, coarse='any', coarse_detection=None, halo=1,
+                        weights=None, seed=None, verbose=False, **porss_kwargs):
+    """
+    Coarse-to-fine PORSS placement search.
+
+    Parameters:
+        detection_fn (callable): Takes flat indices of fine grid cells and returns their detection
+            rows, shape = (n_cells, n_scenarios). Called with the cells of one block at a time
+            for the coarse stage and with the refined cells for the fine stage.
+        grid_nums (tuple): (nx, ny, nz) number of fine grids in x, y, z directions.
+        factor (int or tuple): Block size in fine grid cells.
+        budget (int): Number of sensors.
+        min_detected_sensor (int): Minimum number of sensors needed to detect a scenario.
+        candidates (np.ndarray, optional): Flat indices of the candidate cells, e.g. valid sensor
+            locations. Defaults to all grid cells.
+        coarse (str): Detection of a block in the coarse stage. 'any' or 'majority' aggregate the
+            detection of the block's cells (see `aggregate_detection`). 'representative' only
+            evaluates the central cell of each block, an approximation that needs the detection
+            of a small part of the fine grid when it is simulated on demand.
+        coarse_detection (np.ndarray, optional): Detection of the blocks in the order of
+            `block_representatives`, e.g. from a coarse simulation. Replaces `coarse`.
+        halo (int): Number of neighbouring blocks around each selected block that are refined as
+            well.
+        weights (np.ndarray, optional): Scenario weights passed on to PORSS.
+        seed (int, optional): Seed for the initial PORSS solutions.
+        **porss_kwargs: Further arguments for PORSS, e.g. n_iters or recombination.
+
+    Raises:
+        ValueError: If `coarse` is not supported.
+
+    Returns:
+        solution (np.ndarray): Flat indices of the selected fine grid cells.
+        coverage: Coverage of the solution at full resolution.
+    """
+    if coarse not in ('any', 'majority', 'representative'):
+        raise ValueError(f"Unsupported coarse detection '{coarse}'. "
+                         "Please choose from 'any', 'majority' or 'representative'.")
+    if candidates is None:
+        candidates = np.arange(np.prod(grid_nums))
+    candidates = np.asarray(candidates)
+    blocks, coarse_nums = block_ids(candidates, grid_nums, factor)
+    unique_blocks, representatives = block_representatives(candidates, blocks)
+
+    # coarse stage: one row per block
+    if coarse_detection is None and coarse == 'representative':
+        coarse_detection = detection_fn(representatives)
+    elif coarse_detection is None:
+        _, coarse_detection = block_detection(detection_fn, candidates, blocks, how=coarse)
+    porss = PORSS(coarse_detection, budget, min_detected_sensor, seed=seed, verbose=verbose,
+                  weights=weights, **porss_kwargs)
+    coarse_solution, coarse_coverage = porss.main()
+    if verbose:
+        print(f'Coarse stage: {coarse_coverage} covered with {len(unique_blocks)} blocks.')
+
+    # fine stage: cells of the selected blocks and their neighbours
+    refined_blocks = neighbour_blocks(unique_blocks[coarse_solution], coarse_nums, halo)
+    refined_cells = candidates[np.isin(blocks, refined_blocks)]
+    porss = PORSS(detection_fn(refined_cells), budget, min_detected_sensor, seed=seed,
+                  verbose=verbose, weights=weights, **porss_kwargs)
+    fine_solution, coverage = porss.main()
+    if verbose:
+        print(f'Fine stage: {coverage} covered with {len(refined_cells)} of {len(candidates)} '
+              'cells.')
+
+    return refined_cells[fine_solution], coverage
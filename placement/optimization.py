@@ -1,35 +1,65 @@
 import numpy as np
 import time
-import os
 import pickle
 from placement.PORSS import PORSS
-
-# specify dirs
-data_dir = './demo/output_data/'
-valid_locations_result_dir = './demo/results_valid_locations/'
-os.makedirs(valid_locations_result_dir, exist_ok=True)
-fenceline_locations_result_dir = './demo/results_fenceline_locations/'
-os.makedirs(fenceline_locations_result_dir, exist_ok=True)
-
-# load data
-detection_valid = np.load(data_dir + 'detection_valid_locations.npy')
-detection_fenceline = np.load(data_dir + 'detection_fenceline_locations.npy')
-
+from placement.instrumentation import null_metrics
+from placement.local_search import swap_local_search
+from placement.scoring import is_sharded
 
 # define main function 
-def run_porss(matrix, budget, min_detected_sensor, n_trials, verbose=False, save_dir='./'):
+def run_porss(matrix, budget, min_detected_sensor, n_trials, verbose=False, save_dir='./',
+              weights=None, metrics=None, store=None, label=None, seed=None, polish=False,
+              n_failures=0, failure_mode='worst'):
+    """
+    Runs PORSS `n_trials` times. Each trial is saved as a pickle file in `save_dir`, or added to
+    `store` (a `placement.results_store.ResultsStore`) together with its seed and Pareto front.
+    With `seed`, trial i is seeded with seed + i. With `polish`, every PORSS solution is refined
+    by `placement.local_search.swap_local_search`. With `n_failures`, PORSS maximizes the coverage
+    when that many sensors fail (see `placement.robustness`).
+    """
+    matrix = matrix if is_sharded(matrix) else np.asarray(matrix)
     n_locations, n_scenarios = matrix.shape
+    metrics = null_metrics if metrics is None else metrics
+    if polish and n_failures:
+        raise ValueError('The swap local search maximizes the coverage without failures; '
+                         'polish cannot be used with n_failures.')
+    if polish and is_sharded(matrix):
+        raise ValueError('The swap local search needs the full detection matrix; '
+                         'polish cannot be used with a sharded matrix.')
+    # weighted coverage for reduced scenarios; a ShardedMatrix holds its own weights
+    total_weight = n_scenarios if weights is None else np.sum(weights)
+    total_weight = getattr(matrix, 'total_weight', total_weight)
     for i in range(n_trials):
-        porss = PORSS(matrix, sensor_budget, min_detected_sensor, recombination='onepoint',  verbose = False)
+        trial_seed = None if seed is None else seed + i
+        porss = PORSS(matrix, budget, min_detected_sensor, recombination='onepoint',
+                      verbose = False, seed = trial_seed, weights = weights, metrics = metrics,
+                      n_failures = n_failures, failure_mode = failure_mode)
         start_time = time.time()
         porss_solution, coverage = porss.main()
+        if polish:
+            porss_solution, coverage = swap_local_search(matrix, porss_solution,
+                                                         min_detected_sensor, weights=weights,
+                                                         budget=budget, metrics=metrics)
         runtime = time.time() - start_time
     
         print(f'########## Run #{i} ##########')
-        print(f'Best coverage by PORSS solution: {coverage/n_scenarios}')
+        print(f'Best coverage by PORSS solution: {coverage/total_weight}')
         print(f'Runtime: {runtime} seconds')
+        metrics.emit('porss.trial', trial=i, budget=budget, coverage=coverage, runtime=runtime)
         
         # save result
+        if store is not None:
+            store.add_run(porss_solution, coverage, budget, min_detected_sensor, runtime=runtime,
+                          seed=trial_seed,
+                          params={'recombination': porss.recombination, 'n_iters': porss.n_iters,
+                                  'patience': porss.patience, 'weighted': weights is not None,
+                                  'polish': polish, 'n_failures': n_failures,
+                                  'failure_mode': failure_mode},
+                          pareto_front=porss.pareto_front(), label=label, trial=i,
+                          n_locations=n_locations, n_scenarios=n_scenarios,
+                          total_weight=float(total_weight))
+            continue
+
         result_dict = {'PORSS solution' : porss_solution,
                        'PORSS solution coverage' : coverage,
                        'PROSS runtime' : runtime}
@@ -40,16 +70,7 @@ def run_porss(matrix, budget, min_detected_sensor, n_trials, verbose=False, save
             pickle.dump(result_dict, pickle_file)
     
 
-# run optimization 
-n_trials = 10
-sensor_budget = 4
-min_detected_sensor = 1
-
-## valid sensor locations
-
-print('Run PORSS on valid sensor locations.')
-run_porss(detection_valid, sensor_budget, min_detected_sensor, n_trials, save_dir=valid_locations_result_dir)
-
-## fenceline sensor locations
-print('Run PORSS on fenceline sensor locations.')
-run_porss(detection_valid, sensor_budget, min_detected_sensor, n_trials, save_dir=fenceline_locations_result_dir)
+if __name__ == '__main__':
+    import sys
+    from placement.__main__ import main
+    main(['optimize'] + sys.argv[1:])
@@ -0,0 +1,365 @@
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# End-to-end pipeline: scenarios -> concentrations -> detection -> optimization, run as a DAG.
+# Each stage writes its outputs to `<work_dir>/<stage>/<key>/`, where the key hashes the stage's
+# parameters, the contents of its input files and the keys of the stages it depends on. Stages
+# whose key already has complete outputs are skipped, and stages whose dependencies are done run
+# concurrently in worker processes.
+
+manifest_name = '_stage.json'
+
+
+class Stage:
+    def __init__(self, name, func, deps=(), params=None, inputs=None):
+        self.name = name
+        self.func = func # module-level function(params, inputs, dep_dirs, out_dir[, metrics])
+        self.deps = list(deps) # names of upstream stages
+        self.params = params or {} # JSON-serializable parameters
+        self.inputs = inputs or {} # external input files, name -> path
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    SHA-256 of a file's contents.
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def stage_key(stage, dep_keys):
+    """
+    Cache key of a stage from its function, parameters, input file contents and upstream keys.
+    """
+    spec = {'name': stage.name,
+            'func': f'{stage.func.__module__}.{stage.func.__name__}',
+            'params': stage.params,
+            'inputs': {name: file_hash(path) for name, path in stage.inputs.items()},
+            'deps': {dep: dep_keys[dep] for dep in stage.deps}}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def topological_order(stages):
+    """
+    Stages ordered so that every stage comes after its dependencies.
+
+    Raises:
+        ValueError: If a dependency is unknown or the stages contain a cycle.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    order, state = [], {}
+
+    def visit(name, path):
+        if name not in by_name:
+            raise ValueError(f"Unknown stage '{name}' required by '{path[-1]}'.")
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Cycle in pipeline stages: {' -> '.join(path + [name])}.")
+        state[name] = 'visiting'
+        for dep in by_name[name].deps:
+            visit(dep, path + [name])
+        state[name] = 'done'
+        order.append(by_name[name])
+
+    for stage in stages:
+        visit(stage.name, [])
+    return order
+
+
+def _run_stage(name, func, params, inputs, dep_dirs, out_dir, metrics_path=None):
+    # write into a temporary directory first so that interrupted stages are never cached
+    tmp_dir = out_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    if metrics_path is None:
+        func(params, inputs, dep_dirs, tmp_dir + '/')
+    else:
+        from placement.instrumentation import Metrics
+        metrics = Metrics(sink=metrics_path)
+        metrics.emit('pipeline.stage', stage=name, status='start')
+        try:
+            func(params, inputs, dep_dirs, tmp_dir + '/', metrics=metrics)
+            metrics.emit('pipeline.stage', stage=name, status='done', **metrics.summary())
+        finally:
+            metrics.close()
+    with open(os.path.join(tmp_dir, manifest_name), 'w') as f:
+        json.dump({'params': params, 'inputs': inputs, 'deps': dep_dirs}, f, indent=2, default=str)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.rename(tmp_dir, out_dir)
+
+
+def run_pipeline(stages, work_dir, max_workers=None, force=False, verbose=True,
+                 metrics_path=None):
+    """
+    Runs the stages in dependency order, skipping stages with up-to-date outputs.
+
+    Parameters:
+        stages (list): Stage objects.
+        work_dir (str): Directory for the stage outputs.
+        max_workers (int, optional): Number of worker processes. Default is the number of CPUs.
+        force (bool): Rerun all stages even if their outputs are cached.
+        verbose (bool): Print which stages run or are skipped.
+        metrics_path (str, optional): JSON-lines file that every stage appends its metrics events
+            to (see `placement.instrumentation.Metrics`), with a start and a done event per stage.
+            The stage functions are then called with a `metrics` keyword argument.
+
+    Returns:
+        results (dict): Stage name -> {'dir': output directory, 'key': cache key, 'cached': bool}.
+    """
+    order = topological_order(stages)
+    keys, results = {}, {}
+    for stage in order:
+        keys[stage.name] = stage_key(stage, keys)
+        out_dir = os.path.join(work_dir, stage.name, keys[stage.name])
+        cached = not force and os.path.exists(os.path.join(out_dir, manifest_name))
+        results[stage.name] = {'dir': out_dir, 'key': keys[stage.name], 'cached': cached}
+
+    done = {name for name, result in results.items() if result['cached']}
+    if verbose:
+        for name in sorted(done):
+            print(f"Stage '{name}' is up to date, skipped.")
+
+    pending = [stage for stage in order if stage.name not in done]
+    running = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # submit every stage whose dependencies are done
+            for stage in [s for s in pending if all(dep in done for dep in s.deps)]:
+                if verbose:
+                    print(f"Running stage '{stage.name}'.")
+                dep_dirs = {dep: results[dep]['dir'] + '/' for dep in stage.deps}
+                future = executor.submit(_run_stage, stage.name, stage.func, stage.params,
+                                         stage.inputs, dep_dirs, results[stage.name]['dir'],
+                                         metrics_path)
+                running[future] = stage.name
+                pending.remove(stage)
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                future.result() # re-raise errors of the stage
+                done.add(name)
+                if verbose:
+                    print(f"Stage '{name}' is done.")
+
+    return results
+
+
+################################# pipeline stages #################################
+def stage_scenarios(params, inputs, dep_dirs, out_dir, metrics=None):
+    import pandas as pd
+    from placement.emission_scenarios import (source_rate_distribution, sample_wind_chunks,
+                                              generate_emission_scenarios)
+    from placement.scenario_reduction import pilot_chunks, reduce_scenarios
+
+    if 'emission_scenarios' in inputs:
+        df_emission_scenarios = pd.read_csv(inputs['emission_scenarios'])
+    else:
+        df_source_locs = pd.read_csv(inputs['source_locations'])
+        source_rate_dist = source_rate_distribution(df_source_locs[['x.m', 'y.m', 'z.m']].values,
+                                                    params['prob_sources'],
+                                                    params['prob_rate_per_source'])
+        df_wind_samples = sample_wind_chunks(pd.read_csv(inputs['wind']), params['n_samples'],
+                                             params.get('sample_len', 60), seed=params.get('seed'))
+        df_emission_scenarios = generate_emission_scenarios(df_wind_samples, source_rate_dist)
+
+    if params.get('reduction'):
+        reduction = dict(params['reduction'])
+        n_pilot = reduction.pop('n_pilot', None)
+        df_full = df_emission_scenarios
+        df_emission_scenarios, assignment = reduce_scenarios(df_full, **reduction)
+        # representative of every chunk, to estimate the error of the reduction later
+        assignment.rename('Representative').to_csv(out_dir + 'scenario_assignment.csv')
+        if n_pilot:
+            pilot = pilot_chunks(assignment, n_pilot, seed=reduction.get('seed'))
+            df_full[df_full['ChunkIndex'].isin(pilot)].to_csv(
+                out_dir + 'pilot_emission_scenarios.csv', index=False)
+
+    df_emission_scenarios.to_csv(out_dir + 'emission_scenarios.csv', index=False)
+
+
+def stage_locations(params, inputs, dep_dirs, out_dir, metrics=None):
+    import pandas as pd
+    from placement.sensor_locations import specify_sensor_locations
+
+    specify_sensor_locations(pd.read_csv(inputs['domain']),
+                             pd.read_csv(inputs['equipment_vertices']), save_dir=out_dir, **params)
+
+
+def _simulate(params, inputs, dep_dirs, out_dir, detection_params=None,
+              scenarios_file='emission_scenarios.csv', metrics=None):
+    import pandas as pd
+    from placement.sensor_locations import domain_grid
+    from placement.simulate_concentrations import run_gp
+
+    grid_ranges, grid_nums = domain_grid(pd.read_csv(inputs['domain']))
+    df_emission_scenarios = pd.read_csv(dep_dirs['scenarios'] + scenarios_file)
+    return run_gp(df_emission_scenarios, grid_ranges, grid_nums,
+                  params['obs_dt'], params['sim_dt'], params['puff_dt'],
+                  save_dir=out_dir, detection_params=detection_params,
+                  store_params=params.get('store'), metrics=metrics)
+
+
+def stage_concentrations(params, inputs, dep_dirs, out_dir, metrics=None):
+    _simulate(params, inputs, dep_dirs, out_dir, metrics=metrics)
+
+
+def _detection_params(params):
+    return {k: v for k, v in params.items() if k in
+            ['method', 'amp_thresh', 'persistence_thresh', 'window_len', 'stride']}
+
+
+def stage_detection(params, inputs, dep_dirs, out_dir, metrics=None):
+    import numpy as np
+    from placement.concentration_store import load_concentrations
+    from placement.evaluate_detection import run_detection
+
+    detection_params = _detection_params(params)
+    if params.get('fused'):
+        # simulate and reduce every scenario right away, without the concentration file
+        _simulate(params['simulation'], inputs, dep_dirs, out_dir,
+                  detection_params=detection_params, metrics=metrics)
+    else:
+        if 'concentrations' in inputs:
+            ch4_sim = np.load(inputs['concentrations'], mmap_mode='r')
+        else:
+            ch4_sim = load_concentrations(dep_dirs['concentrations'])
+        run_detection(ch4_sim, save_dir=out_dir, metrics=metrics, **detection_params)
+
+
+def stage_pilot_detection(params, inputs, dep_dirs, out_dir, metrics=None):
+    # the full (unreduced) scenarios of the pilot chunks, simulated and reduced right away
+    _simulate(params['simulation'], inputs, dep_dirs, out_dir,
+              detection_params=_detection_params(params),
+              scenarios_file='pilot_emission_scenarios.csv', metrics=metrics)
+
+
+def _save_reduction_error(store, label, detection, rows, min_detected_sensor, dep_dirs, out_dir):
+    # estimated coverage error of the scenario reduction for the solution of every trial
+    import numpy as np
+    import pandas as pd
+    from placement.scenario_reduction import reduction_error
+
+    assignment = pd.read_csv(dep_dirs['scenarios'] + 'scenario_assignment.csv',
+                             index_col='ChunkIndex')['Representative']
+    df_pilot = pd.read_csv(dep_dirs['scenarios'] + 'pilot_emission_scenarios.csv')
+    pilot_detection = np.load(dep_dirs['pilot_detection'] + 'detection_grid_locations.npy')
+    df_runs = store.runs(label=label)
+    solutions = [store.solution(run_id) for run_id in df_runs['run_id']]
+    errors = reduction_error(pilot_detection[rows], assignment, solutions, min_detected_sensor,
+                             chunks=np.unique(df_pilot['ChunkIndex']), rep_detection=detection)
+    df_errors = df_runs[['run_id', 'trial', 'coverage_fraction']].assign(reduction_error=errors)
+    df_errors.to_csv(out_dir + 'reduction_error.csv', index=False)
+
+
+def stage_optimization(params, inputs, dep_dirs, out_dir, metrics=None):
+    import numpy as np
+    import pandas as pd
+    from placement.optimization import run_porss
+    from placement.results_store import ResultsStore
+    from placement.scenario_reduction import scenario_weights
+
+    if 'detection' in inputs:
+        detection = np.load(inputs['detection'])
+    else:
+        detection = np.load(dep_dirs['detection'] + 'detection_grid_locations.npy')
+    rows = np.load(dep_dirs['locations'] + f"{params['candidates']}_location_indices.npy")
+
+    weights = None
+    if 'scenarios' in dep_dirs:
+        df_emission_scenarios = pd.read_csv(dep_dirs['scenarios'] + 'emission_scenarios.csv')
+        if 'ScenarioWeight' in df_emission_scenarios:
+            weights = scenario_weights(df_emission_scenarios)
+
+    with ResultsStore(out_dir + 'results.sqlite') as store:
+        run_porss(detection[rows], params['budget'], params['min_detected_sensor'],
+                  params['n_trials'], weights=weights, store=store, label=params['candidates'],
+                  seed=params.get('seed'), polish=params.get('polish', False),
+                  n_failures=params.get('n_failures', 0),
+                  failure_mode=params.get('failure_mode', 'worst'), metrics=metrics)
+        if 'pilot_detection' in dep_dirs:
+            _save_reduction_error(store, params['candidates'], detection[rows], rows,
+                                  params['min_detected_sensor'], dep_dirs, out_dir)
+
+
+def build_stages(config, base_dir='.'):
+    """
+    Pipeline stages from a configuration dictionary (see `demo/pipeline_config.json`).
+
+    Input files in config['inputs'] are relative to `base_dir`. If 'detection' or 'concentrations'
+    is given as an input, the upstream stages are not part of the pipeline.
+    """
+    inputs = {name: os.path.join(base_dir, path) for name, path in config['inputs'].items()}
+    site = {name: inputs[name] for name in ['domain', 'equipment_vertices']}
+    stages = [Stage('locations', stage_locations, params=config.get('locations', {}), inputs=site)]
+
+    needs_scenarios = 'detection' not in inputs
+    if needs_scenarios:
+        scenario_inputs = {name: inputs[name]
+                           for name in ['emission_scenarios', 'wind', 'source_locations']
+                           if name in inputs}
+        stages.append(Stage('scenarios', stage_scenarios, params=config.get('scenarios', {}),
+                            inputs=scenario_inputs))
+
+    if needs_scenarios:
+        detection_params = dict(config['detection'])
+        detection_inputs = {'domain': inputs['domain']}
+        if detection_params.get('fused'):
+            detection_params['simulation'] = config['simulation']
+            detection_deps = ['scenarios']
+        elif 'concentrations' in inputs:
+            detection_inputs = {'concentrations': inputs['concentrations']}
+            detection_deps = []
+        else:
+            stages.append(Stage('concentrations', stage_concentrations, deps=['scenarios'],
+                                params=config['simulation'], inputs={'domain': inputs['domain']}))
+            detection_deps = ['concentrations']
+        stages.append(Stage('detection', stage_detection, deps=detection_deps,
+                            params=detection_params, inputs=detection_inputs))
+
+    # optional pilot of the scenario reduction: full scenarios of a few chunks, to report the error
+    pilot = needs_scenarios and config.get('scenarios', {}).get('reduction', {}).get('n_pilot')
+    if pilot:
+        pilot_params = dict(_detection_params(config['detection']),
+                            simulation=config['simulation'])
+        stages.append(Stage('pilot_detection', stage_pilot_detection, deps=['scenarios'],
+                            params=pilot_params, inputs={'domain': inputs['domain']}))
+
+    # one independent optimization branch per candidate location set
+    optimization = dict(config['optimization'])
+    for candidates in optimization.pop('candidates', ['valid', 'fenceline']):
+        if needs_scenarios:
+            stage = Stage(f'optimization_{candidates}', stage_optimization,
+                          deps=['detection', 'locations', 'scenarios'] +
+                               (['pilot_detection'] if pilot else []))
+        else:
+            stage = Stage(f'optimization_{candidates}', stage_optimization, deps=['locations'],
+                          inputs={'detection': inputs['detection']})
+        stage.params = dict(optimization, candidates=candidates)
+        stages.append(stage)
+
+    return stages
+
+
+def run_config(config_path, max_workers=None, force=False, metrics_path=None):
+    """
+    Runs the pipeline described by a JSON configuration file. Relative paths in the file are
+    relative to the file's directory. The metrics events are appended to `metrics_path`, or to
+    config['metrics'] if it is not given.
+    """
+    with open(config_path) as f:
+        config = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(config_path))
+    stages = build_stages(config, base_dir)
+    work_dir = os.path.join(base_dir, config.get('work_dir', 'pipeline'))
+    if metrics_path is None and config.get('metrics'):
+        metrics_path = os.path.join(base_dir, config['metrics'])
+    return run_pipeline(stages, work_dir, max_workers=max_workers, force=force,
+                        metrics_path=metrics_path)
@@ -0,0 +1,178 @@
+import json
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+
+# Results of many PORSS runs in one SQLite database instead of one pickle file per trial.
+# Every run stores its best solution, coverage, runtime, seed and parameters; the final Pareto
+# front (best coverage per number of sensors) of each run is kept in a second table. Location
+# indices are stored as int64 blobs, so reading thousands of solutions needs no unpickling.
+
+schema = '''
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    label TEXT,
+    trial INTEGER,
+    budget INTEGER NOT NULL,
+    min_detected_sensor INTEGER NOT NULL,
+    coverage REAL NOT NULL,
+    coverage_fraction REAL,
+    runtime REAL,
+    seed INTEGER,
+    n_locations INTEGER,
+    n_scenarios INTEGER,
+    params TEXT,
+    solution BLOB NOT NULL,
+    created REAL
+);
+CREATE INDEX IF NOT EXISTS runs_label_budget ON runs (label, budget);
+CREATE TABLE IF NOT EXISTS pareto_front (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    n_sensors INTEGER NOT NULL,
+    coverage REAL NOT NULL,
+    solution BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pareto_front_run ON pareto_front (run_id);
+'''
+
+run_columns = ['run_id', 'label', 'trial', 'budget', 'min_detected_sensor', 'coverage',
+               'coverage_fraction', 'runtime', 'seed', 'n_locations', 'n_scenarios', 'params',
+               'created']
+
+
+def _to_blob(indices):
+    return np.asarray(indices, dtype=np.int64).tobytes()
+
+
+def _from_blob(blob):
+    return np.frombuffer(blob, dtype=np.int64)
+
+
+class ResultsStore:
+    def __init__(self, path):
+        """
+        Parameters:
+            path (str): SQLite database file; created if it does not exist.
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def add_run(self, solution, coverage, budget, min_detected_sensor, runtime=None, seed=None,
+                params=None, pareto_front=None, label=None, trial=None, n_locations=None,
+                n_scenarios=None, total_weight=None):
+        """
+        Stores one optimization run.
+
+        Parameters:
+            solution (np.ndarray): Row indices of the selected sensor locations.
+            coverage (float): Number (or total weight) of covered scenarios.
+            budget (int): Number of sensors.
+            min_detected_sensor (int): Minimum number of sensors needed to detect a scenario.
+            runtime (float, optional) [s]: Runtime of the run.
+            seed (int, optional): Seed of the run.
+            params (dict, optional): Further JSON-serializable parameters of the run.
+            pareto_front (list, optional): (n_sensors, coverage, solution) tuples, e.g. from
+                `PORSS.pareto_front`.
+            label (str, optional): Name of the experiment, e.g. the candidate location set.
+            trial (int, optional): Trial number within the experiment.
+            n_locations, n_scenarios (int, optional): Shape of the detection matrix.
+            total_weight (float, optional): Coverage of all scenarios, to store the covered
+                fraction. Defaults to `n_scenarios`.
+
+        Returns:
+            run_id (int): Identifier of the stored run.
+        """
+        total_weight = n_scenarios if total_weight is None else total_weight
+        fraction = None if not total_weight else float(coverage) / float(total_weight)
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (label, trial, budget, min_detected_sensor, coverage, '
+                'coverage_fraction, runtime, seed, n_locations, n_scenarios, params, solution, '
+                'created) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (label, trial, int(budget), int(min_detected_sensor), float(coverage), fraction,
+                 runtime, seed, n_locations, n_scenarios, json.dumps(params or {}, default=str),
+                 _to_blob(solution), time.time()))
+            run_id = cursor.lastrowid
+            if pareto_front is not None:
+                self.connection.executemany(
+                    'INSERT INTO pareto_front (run_id, n_sensors, coverage, solution) '
+                    'VALUES (?, ?, ?, ?)',
+                    [(run_id, int(n), float(c), _to_blob(s)) for n, c, s in pareto_front])
+        return run_id
+
+    def runs(self, label=None, budget=None):
+        """
+        Table of the stored runs without their solutions, optionally filtered by label and budget.
+        """
+        conditions, values = [], []
+        if label is not None:
+            conditions.append('label = ?')
+            values.append(label)
+        if budget is not None:
+            conditions.append('budget = ?')
+            values.append(int(budget))
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        rows = self.connection.execute(f"SELECT {', '.join(run_columns)} FROM runs{where} "
+                                       'ORDER BY run_id', values).fetchall()
+        return pd.DataFrame(rows, columns=run_columns)
+
+    def solution(self, run_id):
+        """
+        Row indices of the sensor locations selected in a run.
+        """
+        row = self.connection.execute('SELECT solution FROM runs WHERE run_id = ?',
+                                      (int(run_id),)).fetchone()
+        if row is None:
+            raise ValueError(f'Unknown run_id {run_id}.')
+        return _from_blob(row[0])
+
+    def pareto_front(self, run_id):
+        """
+        Pareto front of a run, one row per number of sensors with its coverage and solution.
+        """
+        rows = self.connection.execute('SELECT n_sensors, coverage, solution FROM pareto_front '
+                                       'WHERE run_id = ? ORDER BY n_sensors',
+                                       (int(run_id),)).fetchall()
+        return pd.DataFrame([(n, c, _from_blob(s)) for n, c, s in rows],
+                            columns=['n_sensors', 'coverage', 'solution'])
+
+    def best_by_budget(self, label=None):
+        """
+        The run with the highest covered fraction for every budget, so that runs on different
+        scenario sets compare fairly. Runs without a stored fraction rank last, by coverage; ties go
+        to the first stored run.
+
+        Returns:
+            df_best (pd.DataFrame): One row per budget with the run's columns and its 'solution'.
+        """
+        condition, values = ('label = ? AND ', (label,)) if label is not None else ('', ())
+        rows = self.connection.execute(
+            f"SELECT {', '.join(run_columns)}, solution FROM runs r WHERE run_id = "
+            f"(SELECT run_id FROM runs WHERE {condition}budget = r.budget "
+            f"ORDER BY coverage_fraction DESC, coverage DESC, run_id LIMIT 1) ORDER BY budget",
+            values).fetchall()
+        df_best = pd.DataFrame([row[:-1] for row in rows], columns=run_columns)
+        df_best['solution'] = [_from_blob(row[-1]) for row in rows]
+        return df_best
+
+    def coverage_distribution(self, label=None):
+        """
+        Distribution of the covered fraction across trials, per budget.
+
+        Returns:
+            df_distribution (pd.DataFrame): Count, mean, std, min, quartiles and max per budget.
+        """
+        df_runs = self.runs(label=label)
+        return df_runs.groupby('budget')['coverage_fraction'].describe()
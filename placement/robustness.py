@@ -0,0 +1,127 @@
+import itertools
+import numpy as np
+from placement.scoring import PlacementArrays, detected_counts, is_sharded, placement_arrays
+
+# Coverage of a placement when sensors fail. A scenario with c detecting sensors stays covered
+# as long as at most c - min_detected_sensor of them fail, so only scenarios with
+# min_detected_sensor <= c < min_detected_sensor + n_failures are at risk; with one failure these
+# are the critical scenarios detected by exactly min_detected_sensor sensors. The coverage lost
+# for every set of failed sensors is computed for all sets at once from the per-scenario counts.
+
+failure_modes = ['worst', 'expected']
+
+
+def failure_losses(rows, min_detected_sensor, weights=None, n_failures=1):
+    """
+    Coverage lost for every set of `n_failures` failed sensors of a placement.
+
+    Parameters:
+        rows (np.ndarray, shape = (k, n_scenarios)): Detection rows of the placement's sensors.
+        min_detected_sensor (int): Minimum number of sensors needed to detect a scenario.
+        weights (np.ndarray, shape = (n_scenarios,), optional): Scenario weights.
+        n_failures (int): Number of failed sensors.
+
+    Returns:
+        coverage: Number (or total weight) of covered scenarios without failures.
+        losses (np.ndarray, shape = (n_failure_sets,)): Coverage lost for each set of failed
+            sensors.
+        failure_sets (np.ndarray, shape = (n_failure_sets, n_failures)): Positions of the failed
+            sensors in `rows`.
+    """
+    k = rows.shape[0]
+    counts = rows.sum(axis=0, dtype=np.int64)
+    covered = counts >= min_detected_sensor
+    coverage = np.sum(covered) if weights is None else np.sum(weights[covered])
+    failure_sets = np.array(list(itertools.combinations(range(k), n_failures)), dtype=np.int64)
+    if len(failure_sets) == 0: # fewer sensors than failures: everything is lost
+        return coverage, np.array([coverage]), np.arange(k)[None, :]
+
+    at_risk = np.where(covered & (counts < min_detected_sensor + n_failures))[0]
+    if n_failures == 1:
+        failed_counts = rows[:, at_risk] # shape = (k, n_at_risk)
+    else:
+        incidence = np.zeros((len(failure_sets), k), dtype=np.int64)
+        np.put_along_axis(incidence, failure_sets, 1, axis=1)
+        failed_counts = incidence @ rows[:, at_risk] # failed detecting sensors per set and scenario
+    lost = failed_counts > counts[at_risk] - min_detected_sensor
+    losses = lost.sum(axis=1) if weights is None else lost @ weights[at_risk]
+    return coverage, losses, failure_sets
+
+
+def robust_value(coverage, losses, failure_mode='worst'):
+    """
+    Worst-case or expected coverage over the failure sets, from the output of `failure_losses`.
+    """
+    if failure_mode == 'worst':
+        return coverage - np.max(losses)
+    if failure_mode == 'expected':
+        return coverage - np.mean(losses)
+    raise ValueError(f"Unsupported failure mode '{failure_mode}'. "
+                     f'Please choose from {failure_modes}.')
+
+
+def robust_coverage(detection, solution, min_detected_sensor, weights=None, n_failures=1,
+                    failure_mode='worst'):
+    """
+    Worst-case or expected coverage of one placement when `n_failures` of its sensors fail, with
+    all sets of failed sensors equally likely. Returned as a number (or total weight) of scenarios
+    like `PORSS.coverage`.
+    """
+    rows = detection[np.asarray(solution, dtype=np.int64)]
+    weights = None if weights is None else np.asarray(weights, dtype=float)
+    coverage, losses, _ = failure_losses(rows, min_detected_sensor, weights, n_failures)
+    return robust_value(coverage, losses, failure_mode)
+
+
+def score_robust(detection, placements, min_detected_sensor=1, weights=None, n_failures=1,
+                 failure_mode='worst', chunk_size=1000):
+    """
+    Robust coverage of many placements, as a fraction like `score_placements`.
+
+    Single failures are evaluated for blocks of placements at once: the loss of every sensor is
+    the weight of the critical scenarios it detects. More failures are evaluated per placement.
+
+    Returns:
+        coverage (np.ndarray, shape = (n_placements,)): Weighted fraction of scenarios covered
+            under failures.
+
+    Raises:
+        ValueError: If the failure mode is unknown or `detection` is a sharded matrix.
+    """
+    if is_sharded(detection):
+        raise ValueError('The robust coverage needs the full detection matrix; '
+                         'a sharded matrix is not supported.')
+    if failure_mode not in failure_modes:
+        raise ValueError(f"Unsupported failure mode '{failure_mode}'. "
+                         f'Please choose from {failure_modes}.')
+    weights = np.ones(detection.shape[1]) if weights is None else np.asarray(weights, dtype=float)
+    indptr, indices = placement_arrays(placements)
+    lengths = np.diff(indptr)
+    if n_failures != 1:
+        values = [robust_coverage(detection, indices[indptr[i]:indptr[i + 1]], min_detected_sensor,
+                                  weights, n_failures, failure_mode) for i in range(len(lengths))]
+        return np.array(values, dtype=float) / np.sum(weights)
+
+    values = np.zeros(len(lengths))
+    for start in range(0, len(lengths), chunk_size):
+        stop = min(start + chunk_size, len(lengths))
+        block = PlacementArrays(indptr[start:stop + 1] - indptr[start],
+                                indices[indptr[start]:indptr[stop]])
+        counts = detected_counts(detection, block, chunk_size)
+        coverage = (counts >= min_detected_sensor) @ weights
+        critical = counts == min_detected_sensor # shape = (n_block, n_scenarios)
+        block_lengths = lengths[start:stop]
+        nonempty = block_lengths > 0
+        if len(block[1]):
+            # loss of every sensor = weight of the critical scenarios of its placement it detects
+            rows = detection[block[1]] * np.repeat(critical, block_lengths, axis=0)
+            sensor_losses = rows @ weights
+            offsets = block[0][:-1][nonempty]
+            if failure_mode == 'worst':
+                losses = np.maximum.reduceat(sensor_losses, offsets)
+            else:
+                losses = np.add.reduceat(sensor_losses, offsets) / block_lengths[nonempty]
+            values[start:stop][nonempty] = coverage[nonempty] - losses
+        # with a single sensor (or none) its failure loses everything
+        values[start:stop][block_lengths <= 1] = 0.
+    return values / np.sum(weights)
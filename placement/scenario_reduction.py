@@ -0,0 +1,220 @@
+import numpy as np
+import pandas as pd
+from placement.scoring import score_placements
+
+# Representative scenario reduction: hour-long wind chunks that share a source and an emission
+# rate are clustered on their wind vectors, and one representative chunk per cluster is kept
+# together with a weight equal to the number of chunks it stands for. Simulating, detecting
+# and optimizing on the representatives then gives a weighted estimate of the coverage of the
+# full scenario table.
+
+source_columns = ['Source_x.m', 'Source_y.m', 'Source_z.m', 'EmissionRate.kg/h']
+
+
+def chunk_features(df_emission_scenarios, n_segments=6,
+                   colname_ws='WindSpeed.m/s',
+                   colname_wd='WindDirection.degree'):
+    """
+    Summarizes the wind of each chunk as the mean wind vector over `n_segments` consecutive
+    segments.
+
+    Parameters:
+        df_emission_scenarios (pd.DataFrame): Emission scenarios from step 1, one 'ChunkIndex' per
+            scenario.
+        n_segments (int): Number of time segments each chunk is split into.
+        colname_ws (str): Name of the wind speed column in the DataFrame.
+        colname_wd (str): Name of the wind direction column in the DataFrame.
+
+    Returns:
+        chunk_ids (np.ndarray, shape = (n_chunks,)): Sorted chunk indices.
+        features (np.ndarray, shape = (n_chunks, 2 * n_segments)): (u, v) wind components [m/s] per
+            segment.
+    """
+    ws = df_emission_scenarios[colname_ws].to_numpy(dtype=float)
+    wd = np.deg2rad(df_emission_scenarios[colname_wd].to_numpy(dtype=float))
+    df = pd.DataFrame({'ChunkIndex': df_emission_scenarios['ChunkIndex'].to_numpy(),
+                       'u': ws * np.sin(wd),
+                       'v': ws * np.cos(wd)})
+
+    # position of every row inside its chunk, mapped onto `n_segments` equal segments
+    position = df.groupby('ChunkIndex').cumcount().to_numpy()
+    chunk_len = df.groupby('ChunkIndex')['u'].transform('size').to_numpy()
+    df['segment'] = position * n_segments // chunk_len
+
+    features = df.pivot_table(index='ChunkIndex', columns='segment', values=['u', 'v'],
+                              aggfunc='mean')
+    features = features.fillna(0.)
+    return features.index.to_numpy(), features.to_numpy()
+
+
+def kmeans(features, n_clusters, n_iters=100, seed=None):
+    """
+    Lloyd's k-means with k-means++ initialization.
+
+    Returns:
+        labels (np.ndarray, shape = (n_samples,)): Cluster of each sample.
+        centers (np.ndarray, shape = (n_clusters, n_features)): Cluster centers.
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = features.shape[0]
+    n_clusters = min(n_clusters, n_samples)
+
+    # k-means++ initialization
+    centers = [features[rng.integers(n_samples)]]
+    dist = np.sum((features - centers[0]) ** 2, axis=1)
+    for _ in range(1, n_clusters):
+        if dist.sum() == 0: # fewer distinct samples than clusters
+            break
+        centers.append(features[rng.choice(n_samples, p=dist / dist.sum())])
+        dist = np.minimum(dist, np.sum((features - centers[-1]) ** 2, axis=1))
+    centers = np.array(centers)
+
+    labels = np.zeros(n_samples, dtype=int)
+    for i in range(n_iters):
+        dists = np.sum((features[:, None, :] - centers[None, :, :]) ** 2, axis=2)
+        new_labels = np.argmin(dists, axis=1)
+        if i > 0 and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for c in range(centers.shape[0]):
+            if np.any(labels == c):
+                centers[c] = features[labels == c].mean(axis=0)
+
+    return labels, centers
+
+
+def reduce_scenarios(df_emission_scenarios, fraction=.1, n_segments=6, seed=None):
+    """
+    Replaces near-duplicate wind chunks by weighted representative scenarios.
+
+    Chunks are clustered separately for each (source location, emission rate) combination, so
+    every combination keeps its share of the total weight.
+
+    Parameters:
+        df_emission_scenarios (pd.DataFrame): Emission scenarios from step 1, one 'ChunkIndex' per
+            scenario.
+        fraction (float): Fraction of chunks kept per (source, rate) combination; at least one is
+            kept.
+        n_segments (int): Number of time segments used to describe the wind of a chunk.
+        seed (int, optional): Seed value for reproducibility of the clustering. Default is None.
+
+    Returns:
+        df_reduced (pd.DataFrame): Rows of the representative chunks with an added 'ScenarioWeight'
+            column.
+        assignment (pd.Series): Representative 'ChunkIndex' of every original chunk, indexed by
+            'ChunkIndex'.
+    """
+    chunk_ids, features = chunk_features(df_emission_scenarios, n_segments=n_segments)
+    chunk_sources = df_emission_scenarios.groupby('ChunkIndex')[source_columns].first()
+    chunk_sources = chunk_sources.loc[chunk_ids]
+
+    assignment = pd.Series(chunk_ids, index=pd.Index(chunk_ids, name='ChunkIndex'))
+    rng = np.random.default_rng(seed)
+    for _, group in chunk_sources.groupby(source_columns):
+        members = np.flatnonzero(np.isin(chunk_ids, group.index.to_numpy()))
+        n_clusters = max(1, int(round(fraction * len(members))))
+        labels, centers = kmeans(features[members], n_clusters, seed=rng.integers(2 ** 32))
+
+        # the chunk closest to each cluster center represents the cluster
+        for c in np.unique(labels):
+            cluster = members[labels == c]
+            dists = np.sum((features[cluster] - centers[c]) ** 2, axis=1)
+            assignment.iloc[cluster] = chunk_ids[cluster[np.argmin(dists)]]
+
+    weights = assignment.value_counts()
+    kept = df_emission_scenarios['ChunkIndex'].isin(weights.index)
+    df_reduced = df_emission_scenarios[kept].copy()
+    df_reduced['ScenarioWeight'] = df_reduced['ChunkIndex'].map(weights).astype(float)
+    df_reduced.reset_index(drop=True, inplace=True)
+
+    return df_reduced, assignment
+
+
+def scenario_weights(df_emission_scenarios):
+    """
+    Returns the scenario weights in the column order of the detection matrix, i.e., sorted by
+    'ChunkIndex'. Scenarios without a 'ScenarioWeight' column all have weight 1.
+    """
+    chunks = df_emission_scenarios.groupby('ChunkIndex')
+    if 'ScenarioWeight' not in df_emission_scenarios:
+        return np.ones(chunks.ngroups)
+    return chunks['ScenarioWeight'].first().to_numpy(dtype=float)
+
+
+def weighted_coverage(matrix, solution, min_detected_sensor, weights=None):
+    """
+    Weighted detection coverage of the locations `solution` (row indices of `matrix`), as a
+    fraction.
+    """
+    covered = np.sum(matrix[solution], axis=0) >= min_detected_sensor
+    if weights is None:
+        weights = np.ones(matrix.shape[1])
+    return np.sum(weights[covered]) / np.sum(weights)
+
+
+def pilot_chunks(assignment, n_pilot, seed=None):
+    """
+    Random chunks to simulate in a pilot run for `reduction_error`, sorted by 'ChunkIndex'.
+
+    Parameters:
+        assignment (pd.Series): Representative of every chunk, as returned by `reduce_scenarios`.
+        n_pilot (int): Number of pilot chunks; at most all chunks.
+        seed (int, optional): Seed value for reproducibility of the sampling. Default is None.
+    """
+    rng = np.random.default_rng(seed)
+    chunk_ids = assignment.index.to_numpy()
+    return np.sort(rng.choice(chunk_ids, size=min(n_pilot, len(chunk_ids)), replace=False))
+
+
+def reduction_error(detection, assignment, solutions, min_detected_sensor, chunks=None,
+                    rep_detection=None):
+    """
+    Estimates the coverage error of a reduction, the difference between the weighted coverage of
+    the representatives and the coverage of all chunks, without simulating all chunks.
+
+    The weighted coverage is the mean over all chunks of the coverage of their representatives, so
+    for a random pilot subset of the chunks (see `pilot_chunks`) the mean difference between the
+    coverage of each pilot chunk's representative and of the chunk itself estimates the error.
+    With all chunks, the error is exact.
+
+    Parameters:
+        detection (np.ndarray, shape = (n_locations, n_pilot)): Detection matrix of the pilot
+            chunks, in the order of `chunks`.
+        assignment (pd.Series): Representative of every chunk, as returned by `reduce_scenarios`.
+        solutions (list): Placements to check, each given as a list of row indices.
+        min_detected_sensor (int): Minimum number of sensors needed to detect a scenario.
+        chunks (array-like, optional): 'ChunkIndex' of every column of `detection`. Defaults to all
+            chunks, sorted by 'ChunkIndex'.
+        rep_detection (np.ndarray, shape = (n_locations, n_representatives), optional): Detection
+            matrix of the reduced scenario table (columns sorted by 'ChunkIndex'), e.g. from the
+            reduced run. Defaults to the representatives' columns of `detection`.
+
+    Raises:
+        ValueError: If the columns of `detection` do not match `chunks`, or if `rep_detection` is
+            needed but not given.
+
+    Returns:
+        errors (np.ndarray, shape = (n_solutions,)): Absolute (estimated) difference between the
+            full and the weighted coverage.
+    """
+    assignment = assignment.sort_index()
+    chunks = assignment.index.to_numpy() if chunks is None else np.asarray(chunks)
+    if detection.shape[1] != len(chunks):
+        raise ValueError(f'The detection matrix has {detection.shape[1]} columns '
+                         f'for {len(chunks)} chunks.')
+    representatives = np.unique(assignment.to_numpy()) # sorted, as the columns of the reduced run
+    if rep_detection is None:
+        rep_cols = pd.Index(chunks).get_indexer(representatives)
+        if np.any(rep_cols < 0):
+            raise ValueError('Not all representatives are among the pilot chunks; '
+                             'pass rep_detection.')
+        rep_detection = detection[:, rep_cols]
+    elif rep_detection.shape[1] != len(representatives):
+        raise ValueError(f'rep_detection has {rep_detection.shape[1]} columns for '
+                         f'{len(representatives)} representatives.')
+
+    # representative of every pilot chunk, as a column of rep_detection
+    pilot_reps = np.searchsorted(representatives, assignment.loc[chunks].to_numpy())
+    full = score_placements(detection, solutions, min_detected_sensor)
+    estimate = score_placements(rep_detection[:, pilot_reps], solutions, min_detected_sensor)
+    return np.abs(full - estimate)
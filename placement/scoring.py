@@ -0,0 +1,199 @@
+from collections import namedtuple
+import numpy as np
+
+# Batch scoring of sensor placements, e.g. existing installations, vendor proposals or PORSS
+# solutions of different trials. The placements are stored like the rows of a sparse 0/1 matrix
+# in CSR form (indptr, indices), so the number of detecting sensors per placement and scenario
+# is the sparse product placements @ detection, computed as a segmented sum of detection rows.
+
+# CSR form of placements: placement i uses indices[indptr[i]:indptr[i + 1]]
+PlacementArrays = namedtuple('PlacementArrays', ['indptr', 'indices'])
+
+
+def placement_arrays(placements):
+    """
+    CSR form of a list of placements.
+
+    Parameters:
+        placements (list, tuple, np.ndarray or PlacementArrays): Placements given as row indices of
+            the detection matrix, either a list or tuple of index lists of any length, an array of
+            shape (n_placements, k) or placements already in CSR form as `PlacementArrays`.
+
+    Returns:
+        placements (PlacementArrays): (indptr, indices) with
+            indptr (np.ndarray, shape = (n_placements + 1,)): Placement i uses
+                indices[indptr[i]:indptr[i + 1]].
+            indices (np.ndarray): Row indices of all placements, concatenated.
+
+    Raises:
+        ValueError: If the placements are neither a list or tuple of placements, a 2D array nor
+            `PlacementArrays`.
+    """
+    if isinstance(placements, PlacementArrays):
+        return placements # already in CSR form
+    if isinstance(placements, np.ndarray):
+        if placements.ndim != 2:
+            raise ValueError('An array of placements must have shape (n_placements, k), '
+                             f'got {placements.shape}.')
+        n_placements, k = placements.shape
+        return PlacementArrays(np.arange(0, n_placements * k + 1, k),
+                               placements.ravel().astype(np.int64))
+    if not isinstance(placements, (list, tuple)):
+        raise ValueError('Expected a list or tuple of placements, '
+                         f'got {type(placements).__name__}.')
+    lengths = np.array([len(p) for p in placements], dtype=np.int64)
+    indptr = np.concatenate(([0], np.cumsum(lengths)))
+    indices = np.zeros(0, dtype=np.int64)
+    if len(placements):
+        indices = np.concatenate([np.asarray(p, dtype=np.int64) for p in placements])
+    return PlacementArrays(indptr, indices)
+
+
+def detected_counts(detection, placements, chunk_size=1000):
+    """
+    Number of sensors of every placement that detect each scenario.
+
+    Parameters:
+        detection (np.ndarray, shape = (n_locations, n_scenarios)): 0/1 detection matrix.
+        placements (list, tuple or np.ndarray): Placements as row indices, see `placement_arrays`.
+        chunk_size (int): Number of placements per block, to bound the temporary memory.
+
+    Returns:
+        counts (np.ndarray, shape = (n_placements, n_scenarios)): Detecting sensors per placement
+            and scenario.
+    """
+    indptr, indices = placement_arrays(placements)
+    n_placements = len(indptr) - 1
+    if len(indices) and (indices.min() < 0 or indices.max() >= detection.shape[0]):
+        raise ValueError(f'Placement indices must be between 0 and {detection.shape[0] - 1}.')
+
+    counts = np.zeros((n_placements, detection.shape[1]), dtype=np.int32)
+    for start in range(0, n_placements, chunk_size):
+        stop = min(start + chunk_size, n_placements)
+        rows = detection[indices[indptr[start]:indptr[stop]]]
+        lengths = np.diff(indptr[start:stop + 1])
+        nonempty = lengths > 0 # reduceat needs non-empty segments
+        if np.any(nonempty) and len(rows):
+            offsets = indptr[start:stop][nonempty] - indptr[start]
+            counts[start:stop][nonempty] = np.add.reduceat(rows, offsets, axis=0, dtype=np.int32)
+    return counts
+
+
+def covered_totals(detection, placements, min_detected_sensor=1, weights=None, chunk_size=1000):
+    """
+    Number (or total weight) of the scenarios covered by each placement, like `PORSS.coverage`.
+    Parameters as in `score_placements`.
+    """
+    if is_sharded(detection):
+        check_sharded_weights(weights)
+        return detection.coverage(placements, min_detected_sensor)
+    blocks = _covered_blocks(detection, placements, min_detected_sensor, chunk_size)
+    if weights is None:
+        totals = [covered.sum(axis=1) for covered in blocks]
+    else:
+        totals = [covered @ np.asarray(weights, dtype=float) for covered in blocks]
+    return np.concatenate(totals) if totals else np.zeros(0)
+
+
+def score_placements(detection, placements, min_detected_sensor=1, weights=None, chunk_size=1000):
+    """
+    Detection coverage of many placements at once.
+
+    Parameters:
+        detection (np.ndarray, shape = (n_locations, n_scenarios)): 0/1 detection matrix, or a
+            `placement.sharding.ShardedMatrix` whose shards hold the scenarios (and their weights).
+        placements (list, tuple or np.ndarray): Placements as row indices, see `placement_arrays`.
+        min_detected_sensor (int): Minimum number of sensors needed to detect a scenario.
+        weights (np.ndarray, shape = (n_scenarios,), optional): Scenario weights, e.g. from scenario
+            reduction. Not allowed for a sharded matrix, whose shards hold the weights.
+        chunk_size (int): Number of placements per block.
+
+    Returns:
+        coverage (np.ndarray, shape = (n_placements,)): Weighted fraction of covered scenarios.
+
+    Raises:
+        ValueError: If weights are given for a sharded matrix.
+    """
+    if is_sharded(detection):
+        check_sharded_weights(weights)
+        return detection.coverage(placements, min_detected_sensor) / detection.total_weight
+    totals = covered_totals(detection, placements, min_detected_sensor, weights, chunk_size)
+    return totals / (detection.shape[1] if weights is None else np.sum(weights))
+
+
+def bootstrap_coverage(detection, placements, min_detected_sensor=1, weights=None, n_bootstrap=1000,
+                       confidence=.95, seed=None, chunk_size=1000):
+    """
+    Coverage of many placements with bootstrap confidence intervals over scenarios.
+
+    The scenarios are resampled with replacement `n_bootstrap` times; the same resamples are
+    used for all placements, so their intervals can be compared.
+
+    Parameters:
+        detection (np.ndarray, shape = (n_locations, n_scenarios)): 0/1 detection matrix.
+        placements (list, tuple or np.ndarray): Placements as row indices, see `placement_arrays`.
+        min_detected_sensor (int): Minimum number of sensors needed to detect a scenario.
+        weights (np.ndarray, shape = (n_scenarios,), optional): Scenario weights.
+        n_bootstrap (int): Number of bootstrap resamples.
+        confidence (float): Confidence level of the percentile intervals.
+        seed (int, optional): Seed of the resampling.
+        chunk_size (int): Number of placements per block.
+
+    Returns:
+        coverage (np.ndarray, shape = (n_placements,)): Weighted fraction of covered scenarios.
+        lower, upper (np.ndarray, shape = (n_placements,)): Bounds of the confidence intervals.
+
+    Raises:
+        ValueError: If `detection` is a sharded matrix.
+    """
+    if is_sharded(detection):
+        raise ValueError('Bootstrap intervals need the full detection matrix; '
+                         'a sharded matrix is not supported.')
+    n_scenarios = detection.shape[1]
+    weights = np.ones(n_scenarios) if weights is None else np.asarray(weights, dtype=float)
+    rng = np.random.default_rng(seed)
+    # resampling counts of every scenario, shape = (n_scenarios, n_bootstrap)
+    resample_weights = rng.multinomial(n_scenarios, np.full(n_scenarios, 1 / n_scenarios),
+                                       size=n_bootstrap).T
+    resample_weights = resample_weights * weights[:, None]
+    totals = resample_weights.sum(axis=0)
+
+    alpha = (1 - confidence) / 2
+    coverage, lower, upper = [], [], []
+    for covered in _covered_blocks(detection, placements, min_detected_sensor, chunk_size):
+        covered = covered.astype(float)
+        coverage.append(covered @ weights / np.sum(weights))
+        replicates = covered @ resample_weights / totals # shape = (n_block, n_bootstrap)
+        bounds = np.quantile(replicates, [alpha, 1 - alpha], axis=1)
+        lower.append(bounds[0])
+        upper.append(bounds[1])
+    if not coverage:
+        return np.zeros(0), np.zeros(0), np.zeros(0)
+    return np.concatenate(coverage), np.concatenate(lower), np.concatenate(upper)
+
+
+def _covered_blocks(detection, placements, min_detected_sensor, chunk_size):
+    # covered scenarios, shape = (n_block, n_scenarios), for consecutive blocks of placements
+    indptr, indices = placement_arrays(placements)
+    for start in range(0, len(indptr) - 1, chunk_size):
+        stop = min(start + chunk_size, len(indptr) - 1)
+        block = PlacementArrays(indptr[start:stop + 1] - indptr[start],
+                                indices[indptr[start]:indptr[stop]])
+        yield detected_counts(detection, block, chunk_size) >= min_detected_sensor
+
+
+def is_sharded(detection):
+    """
+    True if `detection` is a `placement.sharding.ShardedMatrix` (or another client that evaluates
+    the coverage on its workers instead of holding the matrix), False for local matrices such as
+    arrays and DataFrames.
+    """
+    return not isinstance(detection, np.ndarray) and callable(getattr(detection, 'coverage', None))
+
+
+def check_sharded_weights(weights):
+    """
+    Raises a ValueError if scenario weights are given for a sharded matrix, whose shards hold them.
+    """
+    if weights is not None:
+        raise ValueError('Scenario weights of a sharded matrix are held by its shards.')
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+# Step 2: candidate sensor locations. Builds the regular grid over the site, removes the
+# locations occupied by equipment groups and selects the locations along the fence line.
+# All steps work on whole coordinate arrays instead of looping over grid points.
+
+
+def domain_grid(df_domain):
+    """
+    Grid ranges and number of grids of the site domain.
+
+    Parameters:
+        df_domain (pd.DataFrame): Domain boundaries and grid spacing, as in 'domain.csv'.
+
+    Returns:
+        grid_ranges (tuple): (x_min, y_min, z_min, x_max, y_max, z_max) [m].
+        grid_nums (tuple): (nx, ny, nz) number of grids in x, y, z directions.
+    """
+    x_min, x_max, y_min, y_max, z_min, z_max, dx, dy, dz = df_domain.iloc[0]
+    nx = int((x_max - x_min) / dx) + 1
+    ny = int((y_max - y_min) / dy) + 1
+    nz = int((z_max - z_min) / dz) + 1
+    return (x_min, y_min, z_min, x_max, y_max, z_max), (nx, ny, nz)
+
+
+def generate_grid(df_domain):
+    """
+    Regular grid locations over the site domain, in the order of np.meshgrid(xs, ys, zs).ravel().
+
+    Returns:
+        df_grid_locs (pd.DataFrame): Columns 'loc_index', 'grid_id'
+            ('{x index}-{y index}-{z index}'), 'x', 'y', 'z'.
+    """
+    (x_min, y_min, z_min, x_max, y_max, z_max), (nx, ny, nz) = domain_grid(df_domain)
+    xs = np.linspace(x_min, x_max, nx)
+    ys = np.linspace(y_min, y_max, ny)
+    zs = np.linspace(z_min, z_max, nz)
+    iy, ix, iz = np.meshgrid(np.arange(ny), np.arange(nx), np.arange(nz), indexing='ij')
+    iy, ix, iz = iy.ravel(), ix.ravel(), iz.ravel()
+    grid_ids = (pd.Series(ix).astype(str) + '-' + pd.Series(iy).astype(str) + '-'
+                + pd.Series(iz).astype(str))
+    return pd.DataFrame({'loc_index': np.arange(len(ix)),
+                         'grid_id': grid_ids,
+                         'x': xs[ix],
+                         'y': ys[iy],
+                         'z': zs[iz]})
+
+
+def equipment_polygons(df_equip_vertices):
+    """
+    Vertices of every equipment group, as a list of arrays of shape (n_vertices, 2) [m].
+    """
+    return [group[['Vertex_x.m', 'Vertex_y.m']].to_numpy(dtype=float)
+            for _, group in df_equip_vertices.groupby('EquipName')]
+
+
+def points_in_polygon(points, polygon):
+    """
+    Even-odd crossing test of many points against one polygon. Uses the same crossing rule as
+    matplotlib's `Path.contains_points`, so points on the polygon edges are classified alike.
+
+    Parameters:
+        points (np.ndarray, shape = (n_points, 2)): Test points [x, y].
+        polygon (np.ndarray, shape = (n_vertices, 2)): Polygon vertices in order; the polygon is
+            closed automatically.
+
+    Returns:
+        inside (np.ndarray, shape = (n_points,)): True for points inside the polygon.
+    """
+    px, py = points[:, 0], points[:, 1]
+    inside = np.zeros(len(points), dtype=bool)
+    for (x0, y0), (x1, y1) in zip(np.roll(polygon, 1, axis=0), polygon):
+        above1 = y1 >= py
+        crosses = (y0 >= py) != above1
+        inside ^= crosses & (((y1 - py) * (x0 - x1) >= (x1 - px) * (y0 - y1)) == above1)
+    return inside
+
+
+def equipment_mask(points, polygons):
+    """
+    Marks the points that fall inside any equipment polygon. Each polygon is only tested
+    against the points inside its bounding box.
+
+    Parameters:
+        points (np.ndarray, shape = (n_points, 2)): Test points [x, y].
+        polygons (list): Polygon vertices, e.g. from `equipment_polygons`.
+
+    Returns:
+        occupied (np.ndarray, shape = (n_points,)): True for points occupied by equipment.
+    """
+    occupied = np.zeros(len(points), dtype=bool)
+    for polygon in polygons:
+        (x_lo, y_lo), (x_hi, y_hi) = polygon.min(axis=0), polygon.max(axis=0)
+        in_box = np.flatnonzero((points[:, 0] >= x_lo) & (points[:, 0] <= x_hi) &
+                                (points[:, 1] >= y_lo) & (points[:, 1] <= y_hi) & ~occupied)
+        occupied[in_box] = points_in_polygon(points[in_box], polygon)
+    return occupied
+
+
+def fenceline_mask(points, df_domain, x_buffer=2, y_buffer=2):
+    """
+    Marks the points within `x_buffer` / `y_buffer` [m] of the domain boundary.
+    """
+    x_min, x_max, y_min, y_max = df_domain.iloc[0][['x_min.m', 'x_max.m', 'y_min.m', 'y_max.m']]
+    x = np.trunc(points[:, 0])
+    y = np.trunc(points[:, 1])
+    interior = ((x_min + x_buffer < x) & (x < x_max - x_buffer) &
+                (y_min + y_buffer < y) & (y < y_max - y_buffer))
+    return ~interior
+
+
+def specify_sensor_locations(df_domain, df_equip_vertices, x_buffer=2, y_buffer=2, save_dir=None):
+    """
+    Builds the grid locations and selects the valid and the fenceline sensor locations.
+
+    Parameters:
+        df_domain (pd.DataFrame): Domain boundaries and grid spacing, as in 'domain.csv'.
+        df_equip_vertices (pd.DataFrame): Vertex locations for all equipment groups, as in
+            'equipment_vertices.csv'.
+        x_buffer, y_buffer (float) [m]: Buffers that define the fence line.
+        save_dir (str, optional): If given, writes 'grid_locations.csv',
+            'valid_sensor_locations.csv' and 'fenceline_sensor_locations.csv', plus the 'loc_index'
+            arrays as 'valid_location_indices.npy' and 'fenceline_location_indices.npy'.
+
+    Returns:
+        df_grid_locs (pd.DataFrame): All grid locations.
+        valid_indices (np.ndarray): 'loc_index' of the locations not occupied by equipment.
+        fenceline_indices (np.ndarray): 'loc_index' of the locations along the fence line.
+    """
+    df_grid_locs = generate_grid(df_domain)
+    points = df_grid_locs[['x', 'y']].to_numpy()
+
+    occupied = equipment_mask(points, equipment_polygons(df_equip_vertices))
+    valid_indices = np.flatnonzero(~occupied)
+    fenceline_indices = np.flatnonzero(fenceline_mask(points, df_domain, x_buffer, y_buffer))
+
+    if save_dir is not None:
+        df_grid_locs.to_csv(save_dir + 'grid_locations.csv', index=False)
+        df_grid_locs.iloc[valid_indices].to_csv(save_dir + 'valid_sensor_locations.csv',
+                                                index=False)
+        df_grid_locs.iloc[fenceline_indices].to_csv(save_dir + 'fenceline_sensor_locations.csv',
+                                                    index=False)
+        np.save(save_dir + 'valid_location_indices.npy', valid_indices)
+        np.save(save_dir + 'fenceline_location_indices.npy', fenceline_indices)
+
+    return df_grid_locs, valid_indices, fenceline_indices
@@ -0,0 +1,253 @@
+import ipaddress
+import multiprocessing
+import secrets
+from multiprocessing.connection import Client, Listener
+import numpy as np
+from placement.scoring import (PlacementArrays, check_sharded_weights, covered_totals,
+                               is_sharded, placement_arrays)
+
+# Scenario-sharded coverage evaluation for detection matrices that do not fit on one node.
+# The scenarios (columns) are split across shard workers; each worker holds its columns (and
+# their weights) and computes the partial coverage of the placements it is sent. The client,
+# `ShardedMatrix`, sends every request to all shards and adds up their answers, so PORSS,
+# `greedy_placement` and `score_placements` can use it in place of the matrix.
+#
+# Workers and client talk over sockets (`multiprocessing.connection`, authenticated with a shared
+# key), so shards can run on other hosts with `python -m placement shard ...`, or as local
+# processes with `start_local_shards`. The connections unpickle what they receive, so anyone
+# holding the key can run code on a worker: keys are never defaulted, and shards must only be
+# reachable from trusted networks.
+
+
+def is_loopback(host):
+    """
+    True if `host` is 'localhost' or a loopback address, i.e. not reachable from other hosts.
+    """
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError: # a host name
+        return False
+
+
+def new_authkey():
+    """
+    Random shared key for shards and clients.
+    """
+    return secrets.token_hex(16).encode()
+
+
+def _shard_gains(shard, solution, min_detected_sensor, weights):
+    # gain of adding each row: weight of the scenarios one detection short of coverage
+    counts = shard[np.asarray(solution, dtype=np.int64)].sum(axis=0, dtype=np.int64)
+    cols = np.where(counts == min_detected_sensor - 1)[0]
+    if weights is None:
+        return shard[:, cols].sum(axis=1, dtype=np.int64)
+    return shard[:, cols] @ weights[cols]
+
+
+def handle_request(shard, weights, request, args):
+    """
+    Answers one request of a `ShardedMatrix` client on a shard (n_locations, n_shard_scenarios).
+    """
+    if request == 'info':
+        total_weight = shard.shape[1] if weights is None else float(np.sum(weights))
+        return {'shape': shard.shape, 'total_weight': total_weight, 'weighted': weights is not None}
+    if request == 'coverage':
+        (indptr, indices), min_detected_sensor = args
+        return covered_totals(shard, PlacementArrays(indptr, indices), min_detected_sensor, weights)
+    if request == 'upper_bound':
+        min_detected_sensor, = args
+        covered = shard.sum(axis=0, dtype=np.int64) >= min_detected_sensor
+        return np.sum(covered) if weights is None else np.sum(weights[covered])
+    if request == 'gains':
+        solution, min_detected_sensor = args
+        return _shard_gains(shard, solution, min_detected_sensor, weights)
+    raise ValueError(f"Unknown request '{request}'.")
+
+
+def serve_shard(shard, authkey, address=('localhost', 0), weights=None, ready=None):
+    """
+    Serves coverage requests on one shard of scenarios until a client sends 'shutdown'.
+
+    Parameters:
+        shard (np.ndarray, shape = (n_locations, n_shard_scenarios)): Detection columns of this
+            shard.
+        authkey (bytes): Shared key that clients must present, e.g. from `new_authkey`.
+        address (tuple): (host, port) to listen on; port 0 picks a free port.
+        weights (np.ndarray, shape = (n_shard_scenarios,), optional): Weights of the shard's
+            scenarios.
+        ready (multiprocessing.connection.Connection, optional): Receives the bound address.
+    """
+    if not authkey:
+        raise ValueError('A shard needs a non-empty authkey.')
+    weights = None if weights is None else np.asarray(weights, dtype=float)
+    with Listener(address, authkey=authkey) as listener:
+        if ready is not None:
+            ready.send(listener.address)
+            ready.close()
+        while True:
+            with listener.accept() as connection:
+                request = None
+                while True:
+                    try:
+                        request, args = connection.recv()
+                    except EOFError: # client disconnected
+                        break
+                    if request in ('close', 'shutdown'):
+                        break
+                    try:
+                        connection.send(('ok', handle_request(shard, weights, request, args)))
+                    except Exception as error: # report to the client instead of dying
+                        connection.send(('error', repr(error)))
+            if request == 'shutdown':
+                return
+
+
+def _serve_local_shard(path, columns, weights, authkey, ready):
+    shard = np.ascontiguousarray(np.load(path, mmap_mode='r')[:, columns[0]:columns[1]])
+    serve_shard(shard, authkey, weights=weights, ready=ready)
+
+
+class ShardedMatrix:
+    def __init__(self, addresses, authkey, processes=None):
+        """
+        Client of scenario shards, used in place of the detection matrix.
+
+        Parameters:
+            addresses (list): (host, port) of every shard worker, in scenario order.
+            authkey (bytes): Shared key of the workers; the key they were started with.
+            processes (list, optional): Local worker processes, shut down by `close`.
+        """
+        if not authkey:
+            raise ValueError('Connecting to shards needs their authkey.')
+        self.connections = [Client(tuple(address), authkey=authkey) for address in addresses]
+        self.processes = processes or []
+        infos = self._all('info')
+        n_rows = {info['shape'][0] for info in infos}
+        if len(n_rows) != 1:
+            raise ValueError(f'The shards have different numbers of locations: {sorted(n_rows)}.')
+        self.shard_cols = [info['shape'][1] for info in infos]
+        self.shape = (n_rows.pop(), sum(self.shard_cols))
+        self.total_weight = sum(info['total_weight'] for info in infos)
+        self.weighted = any(info['weighted'] for info in infos)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _all(self, request, *args):
+        # send to every shard first, so that they compute concurrently, then collect
+        for connection in self.connections:
+            connection.send((request, args))
+        # all of them, to stay in sync
+        replies = [connection.recv() for connection in self.connections]
+        for status, result in replies:
+            if status == 'error':
+                raise RuntimeError(f"Shard failed on '{request}': {result}")
+        return [result for _, result in replies]
+
+    def coverage(self, placements, min_detected_sensor):
+        """
+        Number (or total weight) of the scenarios covered by each placement, summed over the shards.
+        """
+        placements = placement_arrays(placements)
+        if len(placements[1]) and (placements[1].min() < 0 or placements[1].max() >= self.shape[0]):
+            raise ValueError(f'Placement indices must be between 0 and {self.shape[0] - 1}.')
+        return np.sum(self._all('coverage', placements, min_detected_sensor), axis=0)
+
+    def upper_bound(self, min_detected_sensor):
+        """
+        Coverage if every location had a sensor.
+        """
+        return sum(self._all('upper_bound', min_detected_sensor))
+
+    def gains(self, solution, min_detected_sensor):
+        """
+        Coverage gain of adding each location to `solution`, shape = (n_locations,).
+        """
+        solution = np.asarray(solution, dtype=np.int64)
+        return np.sum(self._all('gains', solution, min_detected_sensor), axis=0)
+
+    def close(self, shutdown=None):
+        """
+        Disconnects from the shards. With `shutdown` (default for local shards) the workers exit.
+        """
+        shutdown = bool(self.processes) if shutdown is None else shutdown
+        request = 'shutdown' if shutdown else 'close'
+        for connection in self.connections:
+            try:
+                connection.send((request, ()))
+            except OSError:
+                pass
+            connection.close()
+        self.connections = []
+        for process in self.processes:
+            process.join()
+        self.processes = []
+
+
+def start_local_shards(path, n_shards, weights=None, authkey=None):
+    """
+    Starts one worker process per scenario shard on this host.
+
+    Parameters:
+        path (str): .npy detection matrix, shape = (n_locations, n_scenarios). Each worker loads
+            only its columns.
+        n_shards (int): Number of shards.
+        weights (np.ndarray, shape = (n_scenarios,), optional): Scenario weights.
+        authkey (bytes, optional): Shared key of the workers. Defaults to a random key.
+
+    Returns:
+        matrix (ShardedMatrix): Connected client; `close` stops the workers.
+    """
+    authkey = new_authkey() if authkey is None else authkey
+    n_scenarios = np.load(path, mmap_mode='r').shape[1]
+    bounds = np.linspace(0, n_scenarios, n_shards + 1).astype(int)
+    context = multiprocessing.get_context('spawn')
+    processes, addresses = [], []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        receiver, sender = context.Pipe(duplex=False)
+        shard_weights = None if weights is None else np.asarray(weights, dtype=float)[start:stop]
+        process = context.Process(target=_serve_local_shard, daemon=True,
+                                  args=(path, (int(start), int(stop)), shard_weights, authkey,
+                                        sender))
+        process.start()
+        addresses.append(receiver.recv())
+        processes.append(process)
+    return ShardedMatrix(addresses, authkey=authkey, processes=processes)
+
+
+def greedy_placement(matrix, k, min_detected_sensor, weights=None):
+    """
+    Greedy placement: adds the location with the largest coverage gain `k` times.
+
+    Parameters:
+        matrix (np.ndarray or ShardedMatrix, shape = (n_locations, n_scenarios)): Detection matrix.
+        k (int): Number of sensors.
+        min_detected_sensor (int): Minimum number of sensors needed to detect a scenario.
+        weights (np.ndarray, optional): Scenario weights of a local matrix; a sharded matrix holds
+            its own.
+
+    Returns:
+        solution (np.ndarray): Row indices of the selected locations.
+        coverage: Number (or total weight) of covered scenarios.
+    """
+    if is_sharded(matrix):
+        check_sharded_weights(weights)
+    else:
+        matrix = np.asarray(matrix)
+    weights = None if weights is None else np.asarray(weights, dtype=float)
+    solution = []
+    for _ in range(k):
+        if is_sharded(matrix):
+            gains = matrix.gains(solution, min_detected_sensor).astype(float)
+        else:
+            gains = _shard_gains(matrix, solution, min_detected_sensor, weights).astype(float)
+        gains[solution] = -np.inf
+        solution.append(int(np.argmax(gains)))
+    coverage = covered_totals(matrix, [solution], min_detected_sensor, weights)[0]
+    return np.array(solution), coverage
@@ -1,31 +1,61 @@
-import sys
 from datetime import datetime
 import numpy as np
-import pandas as pd
 import time
-from FastGaussianPuff import GaussianPuff as GP
+from placement.concentration_store import ConcentrationWriter
+from placement.evaluate_detection import detect_scenario
+from placement.instrumentation import null_metrics
 
-################################# specify dir paths #################################
-input_data_dir = './demo/input_data/'
-output_data_dir = './demo/output_data/'
-save_data_dir = './demo/output_data/'
+################################# main function #################################
+def run_gp(df_emission_scenarios, grid_ranges, grid_nums, obs_dt, sim_dt, puff_dt, save_dir='./',
+           detection_params=None, save_concentrations=None, store_params=None, metrics=None,
+           verbose=False):
+    """
+    Simulates methane concentrations on the grid for every emission scenario.
 
-################################# load data #################################
-df_emission_scenarios = pd.read_csv(output_data_dir + 'emission_scenarios.csv')  # emission scenarios from step 1
-df_domain = pd.read_csv(input_data_dir + 'domain.csv') # domain boundaries of the site
-df_grid_locs = pd.read_csv(output_data_dir + 'grid_locations.csv') # grid locations from step 2
+    Parameters:
+        df_emission_scenarios (pd.DataFrame): Emission scenarios from step 1, one 'ChunkIndex' per
+            scenario.
+        grid_ranges (tuple): (x_min, y_min, z_min, x_max, y_max, z_max) of the simulation grid [m].
+        grid_nums (tuple): (nx, ny, nz) number of grids in x, y, z directions.
+        obs_dt, sim_dt, puff_dt (int) [seconds]: Gaussian puff time steps.
+        save_dir (str): Directory for the output files.
+        detection_params (dict, optional): Keyword arguments for `detect_scenario` (method,
+            amp_thresh, persistence_thresh, window_len, stride). If given, each scenario is reduced
+            to its detection column right after simulation and 'detection_grid_locations.npy' is
+            saved instead of the full concentration tensor.
+        save_concentrations (bool, optional): Also write 'ch4_sim_grid_locations.npy', streamed to
+            disk one scenario at a time. Defaults to True without `detection_params` and False with
+            it.
+        store_params (dict, optional): Keyword arguments for `ConcentrationWriter` (e.g. encoding,
+            block). If given, the concentrations are saved as the chunked, compressed store
+            'ch4_sim_grid_locations/' instead of the .npy file.
+        metrics (Metrics, optional): Records the simulation and detection time of every scenario.
+        verbose (bool, optional): Print every scenario as it starts. Default is False.
+
+    Returns:
+        detection (np.ndarray, shape = (n_grids, n_scenarios)) if `detection_params` is given,
+            otherwise None.
+    """
+    from FastGaussianPuff import GaussianPuff as GP # heavy dependency, only needed for simulation
+
+    if save_concentrations is None:
+        save_concentrations = detection_params is None
+    metrics = null_metrics if metrics is None else metrics
 
-################################# main function #################################
-def run_gp(df_emission_scenarios, grid_ranges, grid_nums, obs_dt, sim_dt, puff_dt, save_dir='./'):
     # Convert time column to datetime format
     df_emission_scenarios['TimeStamp.Mountain'] = df_emission_scenarios['TimeStamp.Mountain'].apply(
         lambda x: datetime.strptime(x, '%Y-%m-%d %H:%M:%S%z') if isinstance(x, str) else x)
     
     nx, ny, nz = grid_nums # number of grids in x, y, z directions
-    ch4_sim_all = [] # Initialize an empty list to store simulated ch4 concentrations
+    scenarios = df_emission_scenarios.groupby('ChunkIndex')
+    ch4_sim_all = None # memory-mapped output file, created once the number of time steps is known
+    detection_all = [] # Initialize an empty list to store detection columns
     
-    for i, scenario in df_emission_scenarios.groupby('ChunkIndex'):
-        print(f"Working on #{i} emission scenario.")
+    for n, (i, scenario) in enumerate(scenarios):
+        if verbose:
+            print(f"Working on #{i} emission scenario.")
+        metrics.emit('simulation.start', chunk_index=i, scenario=n, n_scenarios=scenarios.ngroups)
+        scenario_clock = time.perf_counter()
         times = scenario['TimeStamp.Mountain'].tolist()
         start_time = times[0]
         end_time = times[-1]
@@ -48,33 +78,52 @@ def run_gp(df_emission_scenarios, grid_ranges, grid_nums, obs_dt, sim_dt, puff_d
                        puff_duration=1080,
                        quiet=True, unsafe=False)
                     
-        grid_puff.simulate() # simulation results. shape of grid_puff.ch4_obs = (nt, nx, ny, nz)
+        with metrics.timer('simulation'):
+            grid_puff.simulate() # simulation results. shape of grid_puff.ch4_obs = (nt, nx, ny, nz)
     
         # Reshape the array to 2D shape (nt, nx*ny*nz)
         ch4_sim = grid_puff.ch4_obs.reshape(grid_puff.ch4_obs.shape[0], -1) # shape = (nt, nx*ny*nz)
-        ch4_sim_all.append(ch4_sim)
-    
-    ch4_sim_all = np.array(ch4_sim_all) # shape=(n_emissionscenarios, nt, nx*ny*nz)
-    np.save(save_dir + 'ch4_sim_grid_locations.npy', ch4_sim_all) 
 
+        # write the raw concentrations straight to disk instead of keeping them in memory
+        if save_concentrations:
+            if ch4_sim_all is None and store_params is not None:
+                ch4_sim_all = ConcentrationWriter(save_dir + 'ch4_sim_grid_locations',
+                                                  ch4_sim.shape[0], ch4_sim.shape[1],
+                                                  grid_nums=grid_nums, **store_params)
+            elif ch4_sim_all is None:
+                # shape = (n_emissionscenarios, nt, nx*ny*nz)
+                ch4_sim_all = np.lib.format.open_memmap(save_dir + 'ch4_sim_grid_locations.npy',
+                                                        mode='w+', dtype=ch4_sim.dtype,
+                                                        shape=(scenarios.ngroups,) + ch4_sim.shape)
+            if store_params is not None:
+                ch4_sim_all.write(ch4_sim)
+            else:
+                ch4_sim_all[n] = ch4_sim
 
-################################# run #################################
-## location variables
-x_min, x_max, y_min, y_max, z_min, z_max, dx, dy, dz = df_domain.iloc[0]
-nx = int((x_max - x_min) / dx) + 1
-ny = int((y_max - y_min) / dx) + 1
-nz = int((z_max - z_min) / dz) + 1
-grid_ranges = (x_min, y_min, z_min, x_max, y_max, z_max)
-grid_nums = (nx, ny, nz)
+        # reduce the scenario to one detection bit per grid location
+        if detection_params is not None:
+            with metrics.timer('detection'):
+                detection_all.append(detect_scenario(ch4_sim, **detection_params))
+            metrics.increment('detection.series', ch4_sim.shape[1])
 
-## Gaussian puff related variables
-obs_dt, sim_dt, puff_dt = 60, 1, 4 # [seconds]
+        metrics.increment('simulation.scenarios')
+        metrics.emit('simulation.scenario', chunk_index=i, scenario=n,
+                     n_scenarios=scenarios.ngroups, seconds=time.perf_counter() - scenario_clock)
 
-## run Gaussian puff on given data
-runtime_start = time.time()
-run_gp(df_emission_scenarios, grid_ranges, grid_nums, obs_dt, sim_dt, puff_dt, save_dir=save_data_dir)
-print('############################################')
-print(f'Entire simulation is done in {time.time() - runtime_start} seconds.')
+    if isinstance(ch4_sim_all, ConcentrationWriter):
+        ch4_sim_all.close()
+    elif ch4_sim_all is not None:
+        ch4_sim_all.flush()
+        del ch4_sim_all
 
+    if detection_params is not None:
+        detection = np.transpose(np.array(detection_all)) # shape = (n_grids, n_scenarios)
+        np.save(save_dir + 'detection_grid_locations.npy', detection)
+        return detection
 
 
+################################# run #################################
+if __name__ == '__main__':
+    import sys
+    from placement.__main__ import main
+    main(['simulate'] + sys.argv[1:])
@@ -0,0 +1,87 @@
+import numpy as np
+from placement.PORSS import PORSS
+
+# Warm restart of PORSS after the detection matrix changed, e.g. new scenario columns from new
+# wind data (appended with `run_detection(..., append=True)`) or candidate locations that were
+# removed or added. The archive of the previous run is carried over instead of starting again from
+# a single random row: its solutions are mapped to the new rows, sensors at removed locations are
+# dropped, and the coverage of the unchanged solutions is updated by evaluating only the new
+# columns, since the coverage of a placement is a sum over scenarios.
+
+
+def previous_solutions(previous):
+    """
+    (coverage, row ids) of the solutions of a previous run, given as a `PORSS` instance, the
+    DataFrame of `ResultsStore.pareto_front` or the list of `PORSS.pareto_front`.
+    """
+    if isinstance(previous, PORSS):
+        previous = previous.pareto_front()
+    if hasattr(previous, 'columns'): # DataFrame with 'coverage' and 'solution' columns
+        return [(coverage, np.asarray(solution, dtype=np.int64))
+                for coverage, solution in zip(previous['coverage'], previous['solution'])]
+    return [(coverage, np.asarray(solution, dtype=np.int64)) for _, coverage, solution in previous]
+
+
+def warm_start_porss(matrix, previous, k, min_detected_sensor, n_previous_scenarios, rows=None,
+                     weights=None, **porss_kwargs):
+    """
+    PORSS on a changed detection matrix, with its archive seeded from a previous run.
+
+    The scenarios of the previous run must be the first `n_previous_scenarios` columns of `matrix`,
+    with the same weights. Stored solutions whose locations are all still candidates keep their
+    coverage plus the coverage on the new columns; solutions that lost a location are evaluated
+    again on all columns. Dominated solutions are not added to the archive.
+
+    Parameters:
+        matrix (np.ndarray, shape = (n_locations, n_scenarios)): New detection matrix.
+        previous: Solutions of the previous run, see `previous_solutions`.
+        k (int): Number of sensors.
+        min_detected_sensor (int): Minimum number of sensors needed to detect a scenario.
+        n_previous_scenarios (int): Number of scenarios (columns) of the previous run.
+        rows (array-like, shape = (n_locations,), optional): Row of every location of `matrix` in
+            the previous matrix, or -1 for a new candidate location. Defaults to unchanged rows.
+        weights (np.ndarray, shape = (n_scenarios,), optional): Scenario weights of all columns.
+        **porss_kwargs: Other `PORSS` arguments, e.g. a small `n_iters` for a short incremental run.
+
+    Returns:
+        porss (PORSS): Seeded instance; `porss.main()` continues the optimization.
+    """
+    n_locations, n_scenarios = matrix.shape
+    if not 0 <= n_previous_scenarios <= n_scenarios:
+        raise ValueError('n_previous_scenarios must be between 0 and the number of scenarios '
+                         f'({n_scenarios}), got {n_previous_scenarios}.')
+    rows = np.arange(n_locations) if rows is None else np.asarray(rows, dtype=np.int64)
+    if rows.shape != (n_locations,):
+        raise ValueError(f'Expected the previous row of each of the {n_locations} locations, '
+                         f'got {rows.shape}.')
+
+    porss = PORSS(matrix, k, min_detected_sensor, weights=weights, **porss_kwargs)
+    solutions = previous_solutions(previous)
+    n_previous_rows = max([rows.max() + 1 if n_locations else 0] +
+                          [solution.max() + 1 for _, solution in solutions if len(solution)])
+    new_row = np.full(n_previous_rows, -1, dtype=np.int64) # row in `matrix` of every previous row
+    new_row[rows[rows >= 0]] = np.where(rows >= 0)[0]
+
+    # only plain coverage is a sum over scenarios; the robust objective and shards are recomputed
+    incremental = not porss.sharded and not porss.n_failures
+    new_columns = porss.matrix[:, n_previous_scenarios:] if incremental else None
+    new_weights = None if porss.weights is None else porss.weights[n_previous_scenarios:]
+    for coverage, solution in solutions:
+        mapped = new_row[solution]
+        solution_rows = mapped[mapped >= 0]
+        if len(solution_rows) == 0:
+            continue
+        q = np.zeros(n_locations)
+        q[solution_rows] = 1
+        if incremental and len(solution_rows) == len(solution):
+            covered = new_columns[solution_rows].sum(axis=0, dtype=np.int64) >= min_detected_sensor
+            new_coverage = np.sum(covered) if new_weights is None else np.sum(new_weights[covered])
+            fitness = [coverage + new_coverage, np.sum(q)]
+            porss.metrics.increment('warm_start.incremental')
+        else:
+            fitness = porss.objectives(q)
+            porss.metrics.increment('warm_start.recomputed')
+        porss.update_archive(q, fitness)
+
+    porss.best_solution, porss.best_opt_val = porss.find_best_solution()
+    return porss
@@ -0,0 +1,62 @@
+import json
+import os
+import tempfile
+import numpy as np
+import pytest
+from placement.benchmark import (
+    synthetic_detection,
+    greedy_coverage,
+    bench_porss,
+    bench_detection,
+    benchmark_cases,
+    run_benchmarks,
+    compare_reports
+)
+
+
+class TestSyntheticData:
+    def test_detection_density(self):
+        """Test shape, dtype and density of the synthetic detection matrix"""
+        matrix = synthetic_detection(25_000, 40, .1, seed=0)
+        assert matrix.shape == (25_000, 40)
+        assert matrix.dtype == np.int8
+        assert abs(matrix.mean() - .1) < .005
+
+    def test_greedy_coverage(self):
+        """Test greedy coverage on a hand-made matrix"""
+        matrix = np.array([[1, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
+        assert greedy_coverage(matrix, 1, 1) == 2
+        assert greedy_coverage(matrix, 3, 1) == 4
+
+
+class TestBenchmarks:
+    def test_bench_porss(self):
+        """Test the PORSS metrics on a small problem"""
+        result = bench_porss(200, 30, .1, n_evals=20)
+        assert result['porss_evals_per_sec'] > 0
+        assert result['reached_coverage'] >= result['target_coverage']
+        assert result['time_to_target_sec'] is not None
+        # the seed fixes the whole PORSS run, not only its initial row
+        again = bench_porss(200, 30, .1, n_evals=20)
+        assert again['reached_coverage'] == result['reached_coverage']
+
+    @pytest.mark.parametrize("method", ['overall', 'consecutive', 'movingWindow'])
+    def test_bench_detection(self, method):
+        """Test the detection throughput for every strategy"""
+        result = bench_detection(3, 20, 50, method)
+        assert result['detection_series_per_sec'] > 0
+
+    def test_run_and_compare(self):
+        """Test the JSON report and the comparison between two reports"""
+        cases = benchmark_cases(['small'], densities=[.1], methods=['overall'])
+        assert [kind for kind, _ in cases] == ['porss', 'detection']
+
+        with tempfile.TemporaryDirectory() as save_dir:
+            save_path = os.path.join(save_dir, 'bench.json')
+            report = run_benchmarks(cases[1:], save_path=save_path, verbose=False)
+            with open(save_path) as f:
+                assert json.load(f) == report
+        assert report['results'][0]['peak_rss_mb'] > 0
+
+        comparison = compare_reports(report, report)
+        assert comparison[0]['detection_series_per_sec'] == 1.
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from placement.concentration_store import (ConcentrationStore, ConcentrationWriter, grid_chunks,
+                                           load_concentrations, write_concentrations)
+from placement.evaluate_detection import run_detection
+
+
+class TestConcentrationStore(unittest.TestCase):
+    def setUp(self):
+        """Set up sparse plume-like concentrations on a (10, 8, 2) grid"""
+        self.test_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.ch4_sim = np.zeros((11, 30, 160))
+        hits = rng.random(self.ch4_sim.shape) < .1
+        self.ch4_sim[hits] = rng.exponential(2., hits.sum())
+        self.grid_nums = (10, 8, 2)
+
+    def test_grid_chunks(self):
+        """Test spatial and consecutive grid chunking"""
+        chunk = grid_chunks(160, self.grid_nums, block=(5, 4, 1))
+        self.assertEqual(chunk.max() + 1, 8)
+        self.assertEqual(chunk[0], chunk[2]) # (0, 0, 0) and (0, 1, 0) share a block
+        self.assertNotEqual(chunk[0], chunk[1]) # (0, 0, 1) is in the upper layer
+        np.testing.assert_array_equal(grid_chunks(10, grids_per_chunk=4),
+                                      [0, 0, 0, 0, 1, 1, 1, 1, 2, 2])
+        with self.assertRaises(ValueError):
+            grid_chunks(100, self.grid_nums)
+
+    def test_round_trip(self):
+        """Test the decoded values and the compression of every encoding"""
+        tolerances = {'float64': 0, 'float32': 1e-6, 'float16': 1e-2, 'uint16': 1e-3, 'uint8': .1}
+        for encoding, tolerance in tolerances.items():
+            store = write_concentrations(os.path.join(self.test_dir, encoding), self.ch4_sim,
+                                         grid_nums=self.grid_nums, block=(5, 4, 1),
+                                         scenarios_per_chunk=4, encoding=encoding)
+            self.assertEqual(store.shape, self.ch4_sim.shape)
+            np.testing.assert_allclose(store.read(), self.ch4_sim, rtol=tolerance, atol=tolerance)
+            self.assertLess(store.nbytes_on_disk(), self.ch4_sim.nbytes / 2)
+
+        with self.assertRaises(ValueError):
+            ConcentrationWriter(self.test_dir, 30, 160, encoding='int4')
+
+    def test_partial_read(self):
+        """Test that subsets only decode the chunks that contain them"""
+        store = write_concentrations(os.path.join(self.test_dir, 'store'), self.ch4_sim,
+                                     grid_nums=self.grid_nums, block=(5, 4, 1),
+                                     scenarios_per_chunk=4, compression=None)
+        grids, scenarios = np.array([0, 2, 8, 159, 3]), np.array([10, 0, 5])
+        store.chunks_read = 0
+        np.testing.assert_allclose(store.read(grids, scenarios),
+                                   self.ch4_sim[scenarios][:, :, grids], rtol=1e-6)
+        self.assertEqual(store.chunks_read, 4 * 3) # 4 grid chunks x 3 scenario chunks
+
+        store.chunks_read = 0
+        store.read(grids=[0, 2, 4])
+        self.assertEqual(store.chunks_read, 3) # one grid chunk, all scenario chunks
+        np.testing.assert_allclose(store[7], self.ch4_sim[7], rtol=1e-6)
+        with self.assertRaises(ValueError):
+            store.read(grids=[160])
+
+    def test_detection(self):
+        """Test that detection on the store matches detection on the array"""
+        write_concentrations(os.path.join(self.test_dir, 'ch4_sim_grid_locations'), self.ch4_sim,
+                             scenarios_per_chunk=4, grids_per_chunk=50)
+        store = load_concentrations(self.test_dir)
+        self.assertIsInstance(store, ConcentrationStore)
+        self.assertEqual(len(store), 11)
+        save_dir = self.test_dir + '/'
+        np.testing.assert_array_equal(run_detection(store, 'overall', 1., .2, save_dir=save_dir),
+                                      run_detection(self.ch4_sim, 'overall', 1., .2,
+                                                    save_dir=save_dir))
+
+        # without a store the .npy file is loaded
+        npy_dir = os.path.join(self.test_dir, 'npy')
+        os.makedirs(npy_dir)
+        np.save(os.path.join(npy_dir, 'ch4_sim_grid_locations.npy'), self.ch4_sim)
+        np.testing.assert_array_equal(load_concentrations(npy_dir), self.ch4_sim)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from placement.emission_scenarios import (
+    source_rate_distribution,
+    valid_chunk_starts,
+    sample_wind_chunks,
+    generate_emission_scenarios
+)
+
+
+@pytest.fixture
+def df_wind():
+    """Two days of 1-minute wind data with a gap, missing values and out-of-range speeds"""
+    rng = np.random.default_rng(0)
+    times = pd.date_range('2024-01-01 00:00', periods=2 * 24 * 60, freq='min', tz='-07:00')
+    times = times.delete(np.arange(500, 530))  # 30-minute gap in the record
+    df = pd.DataFrame({'TimeStamp.Mountain': times.strftime('%Y-%m-%d %H:%M:%S%z'),
+                       'WindSpeed.m/s': rng.uniform(1., 6., len(times)),
+                       'WindDirection.degree': rng.uniform(0., 360., len(times))})
+    df.loc[rng.choice(len(df), 200, replace=False), 'WindDirection.degree'] = np.nan
+    df.loc[rng.choice(len(df), 50, replace=False), 'WindSpeed.m/s'] = 25.
+    return df
+
+
+def is_valid_chunk(chunk, sample_len, missing_data_tol):
+    """Validity rules of the original rejection sampler"""
+    times = pd.to_datetime(chunk['TimeStamp.Mountain'], format='%Y-%m-%d %H:%M:%S%z')
+    if times.iloc[-1] - times.iloc[0] != pd.Timedelta(minutes=sample_len - 1):
+        return False
+    return (chunk['WindDirection.degree'].isna().sum() <= missing_data_tol and
+            chunk['WindSpeed.m/s'].isna().sum() <= missing_data_tol)
+
+
+class TestValidChunkStarts:
+    def test_matches_rejection_rules(self, df_wind):
+        """Test that the vectorized check agrees with checking every chunk separately"""
+        sample_len, missing_data_tol = 60, 5
+        df = df_wind[(df_wind['WindSpeed.m/s'] > .5) & (df_wind['WindSpeed.m/s'] < 20.)]
+        expected = [s for s in range(len(df) - sample_len)
+                    if is_valid_chunk(df.iloc[s:s + sample_len], sample_len, missing_data_tol)]
+        starts = valid_chunk_starts(df, sample_len, missing_data_tol)
+        assert np.array_equal(starts, expected)
+
+    def test_short_record(self, df_wind):
+        """Test a record shorter than one chunk"""
+        assert len(valid_chunk_starts(df_wind.iloc[:10], 60)) == 0
+
+
+class TestSampleWindChunks:
+    def test_chunks(self, df_wind):
+        """Test number, length and validity of the sampled chunks"""
+        df_samples = sample_wind_chunks(df_wind, 20, sample_len=30, seed=1)
+        assert len(df_samples) == 20 * 30
+        assert np.array_equal(df_samples['ChunkIndex'].unique(), np.arange(20))
+        for _, chunk in df_samples.groupby('ChunkIndex'):
+            times = pd.to_datetime(chunk['TimeStamp.Mountain'], format='%Y-%m-%d %H:%M:%S%z')
+            assert times.iloc[-1] - times.iloc[0] == pd.Timedelta(minutes=29)
+            assert chunk['WindSpeed.m/s'].between(.5, 20.).all()
+            assert chunk['WindDirection.degree'].iloc[1:].notna().all()
+
+    def test_distinct_and_reproducible(self, df_wind):
+        """Test sampling without replacement and reproducibility with a seed"""
+        df1 = sample_wind_chunks(df_wind, 50, seed=3)
+        df2 = sample_wind_chunks(df_wind, 50, seed=3)
+        pd.testing.assert_frame_equal(df1, df2)
+        first_times = df1.groupby('ChunkIndex')['TimeStamp.Mountain'].first()
+        assert first_times.is_unique
+
+    def test_too_many_samples(self, df_wind):
+        """Test that requesting more chunks than available fails"""
+        with pytest.raises(ValueError):
+            sample_wind_chunks(df_wind, 10000)
+
+
+class TestGenerateEmissionScenarios:
+    def test_source_rate_assignment(self, df_wind):
+        """Test number of chunks per (source, rate) combination"""
+        source_rate_dist = source_rate_distribution([[25., 25., 2.], [50., 75., 3.]],
+                                                    [.5, .5],
+                                                    [[[1., .5], [5., .5]], [[10., 1.]]])
+        assert [prob for _, _, prob in source_rate_dist] == [.25, .25, .5]
+
+        df_samples = sample_wind_chunks(df_wind, 10, sample_len=20, seed=0)
+        df_scenarios = generate_emission_scenarios(df_samples, source_rate_dist)
+        chunks = df_scenarios.groupby('ChunkIndex')
+        assert (chunks[['Source_x.m', 'EmissionRate.kg/h']].nunique() == 1).all().all()
+        rates = chunks['EmissionRate.kg/h'].first()
+        assert list(rates.value_counts().sort_index()) == [2, 2, 6]
+        assert (chunks['Source_z.m'].first()[rates == 10.] == 3.).all()
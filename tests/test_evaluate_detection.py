@@ -1,12 +1,17 @@
 import numpy as np
+import pandas as pd
 import pytest
+import sys
 import time
+import types
 from placement.evaluate_detection import (
     detection_overall,
     detection_consecutive,
     detection_movingWindow,
+    detect_scenario,
     run_detection
 )
+from placement.simulate_concentrations import run_gp
 
 # Test data fixtures
 @pytest.fixture
@@ -17,6 +22,10 @@ def sample_data():
 def large_test_data():
     return np.random.random((10, 24, 5)) * 2.0
 
+@pytest.fixture
+def save_dir(tmp_path):
+    return str(tmp_path) + '/'
+
 # Overall Detection Tests
 class TestOverallDetection:
     def test_basic_functionality(self, sample_data):
@@ -60,6 +69,9 @@ class TestConsecutiveDetection:
         assert detection_consecutive(data, 1.0, 0.4) == 1
         assert detection_consecutive(data, 1.0, 0) == 0
         assert detection_consecutive(data, 1.0, len(data)) == 0
+        # the run length has to equal the count, so a non-integer count never detects
+        assert detection_consecutive(np.ones(5), 1.0, 1.5) == 0
+        assert np.array_equal(detect_scenario(np.ones((5, 2)), 'consecutive', 1.0, 1.5), [0, 0])
 
 # Moving Window Detection Tests
 class TestMovingWindowDetection:
@@ -102,61 +114,163 @@ class TestMovingWindowDetection:
         data = np.array([1.2, 1.2, 1.2, 0.8, 0.8])
         assert detection_movingWindow(data[:3], 3, 1.0, 0.7) == 1
 
+# Vectorized Scenario Detection Tests
+class TestDetectScenario:
+    @pytest.mark.parametrize("persistence_thresh", [0, 0.2, 0.5, 1, 1.5, 2, 2.0, 3])
+    def test_matches_per_series_functions(self, large_test_data, persistence_thresh):
+        """Test that the vectorized detection agrees with the per-time-series functions"""
+        scenario = large_test_data[0]  # shape = (n_t, n_grids)
+        n_grids = scenario.shape[1]
+
+        expected = [detection_overall(scenario[:, g], 1.0, persistence_thresh)
+                    for g in range(n_grids)]
+        result = detect_scenario(scenario, 'overall', 1.0, persistence_thresh)
+        assert np.array_equal(result, expected)
+
+        expected = [detection_consecutive(scenario[:, g], 1.0, persistence_thresh)
+                    for g in range(n_grids)]
+        result = detect_scenario(scenario, 'consecutive', 1.0, persistence_thresh)
+        assert np.array_equal(result, expected)
+
+        for stride in [None, 1, 2]:
+            expected = [detection_movingWindow(scenario[:, g], 4, 1.0, persistence_thresh,
+                                               stride=stride)
+                        for g in range(n_grids)]
+            result = detect_scenario(scenario, 'movingWindow', 1.0, persistence_thresh,
+                                     window_len=4, stride=stride)
+            assert np.array_equal(result, expected)
+
+    def test_run_detection_columns(self, large_test_data, save_dir):
+        """Test that each detection column equals the scenario-wise reduction"""
+        detection = run_detection(large_test_data, 'consecutive', 1.0, 2, save_dir=save_dir)
+        for i, scenario in enumerate(large_test_data):
+            assert np.array_equal(detection[:, i], detect_scenario(scenario, 'consecutive', 1.0, 2))
+
+    def test_invalid_window(self, large_test_data):
+        """Test handling of missing or oversized moving windows"""
+        with pytest.raises(ValueError):
+            detect_scenario(large_test_data[0], 'movingWindow', 1.0, 2)
+        with pytest.raises(ValueError):
+            detect_scenario(large_test_data[0], 'movingWindow', 1.0, 2, window_len=100)
+
 # Integration and System Tests
 class TestIntegrationAndSystem:
-    def test_run_detection_integration(self, large_test_data):
+    def test_run_detection_integration(self, large_test_data, save_dir):
         """Test all detection methods with large dataset"""
         # Test overall method
-        result = run_detection(large_test_data, 'overall', 1.0, 2)
+        result = run_detection(large_test_data, 'overall', 1.0, 2, save_dir=save_dir)
         assert result.shape == (5, 10)
 
         # Test consecutive method
-        result = run_detection(large_test_data, 'consecutive', 1.0, 2)
+        result = run_detection(large_test_data, 'consecutive', 1.0, 2, save_dir=save_dir)
         assert result.shape == (5, 10)
 
         # Test moving window method
-        result = run_detection(large_test_data, 'movingWindow', 1.0, 2, window_len=3, stride=1)
+        result = run_detection(large_test_data, 'movingWindow', 1.0, 2, window_len=3, stride=1,
+                               save_dir=save_dir)
         assert result.shape == (5, 10)
 
-    def test_invalid_method(self, large_test_data):
+    def test_invalid_method(self, large_test_data, save_dir):
         """Test handling of invalid detection method"""
         with pytest.raises(ValueError):
-            run_detection(large_test_data, 'invalid_method', 1.0, 2)
+            run_detection(large_test_data, 'invalid_method', 1.0, 2, save_dir=save_dir)
 
     @pytest.mark.parametrize("test_data", [
         pytest.param(np.random.random((5, 10, 3)) * 1e-10, id="very_small_values"),
         pytest.param(np.random.random((5, 10, 3)) * 1e10, id="very_large_values"),
         pytest.param(np.random.random((5, 10, 3)) * np.array([1e-10, 1, 1e10]), id="mixed_scale")
     ])
-    def test_numerical_stability(self, test_data):
+    def test_numerical_stability(self, test_data, save_dir):
         """Test numerical stability with extreme values"""
-        result = run_detection(test_data, 'overall', 1.0, 2)
+        result = run_detection(test_data, 'overall', 1.0, 2, save_dir=save_dir)
         assert result.shape == (3, 5)
 
-    def test_performance(self, large_test_data):
+    def test_performance(self, large_test_data, save_dir):
         """Test performance and scalability"""
         methods = ['overall', 'consecutive', 'movingWindow']
         
         for method in methods:
             start_time = time.time()
             if method == 'movingWindow':
-                result = run_detection(large_test_data, method, 1.0, 2, window_len=3, stride=1)
+                result = run_detection(large_test_data, method, 1.0, 2, window_len=3, stride=1,
+                                       save_dir=save_dir)
             else:
-                result = run_detection(large_test_data, method, 1.0, 2)
+                result = run_detection(large_test_data, method, 1.0, 2, save_dir=save_dir)
             duration = time.time() - start_time
             
             # Basic performance assertion (adjust threshold as needed)
             assert duration < 1.0, f"{method} detection took too long: {duration:.2f}s"
 
-    def test_consistency(self, large_test_data):
+    def test_consistency(self, large_test_data, save_dir):
         """Test consistency of results across multiple runs"""
         results = []
         for _ in range(3):
-            result = run_detection(large_test_data, 'overall', 1.0, 2)
+            result = run_detection(large_test_data, 'overall', 1.0, 2, save_dir=save_dir)
             results.append(result)
 
         for i in range(1, len(results)):
             assert np.array_equal(results[0], results[i])
 
+# Fused Simulation and Detection Tests
+class FakeGaussianPuff:
+    """Stand-in for FastGaussianPuff.GaussianPuff with deterministic concentrations"""
+    def __init__(self, obs_dt, sim_dt, puff_dt, start_time, end_time, source_loc, emission_rate,
+                 ws, wd, nx, ny, nz, **kwargs):
+        self.ws, self.wd = np.asarray(ws), np.asarray(wd)
+        self.rate = emission_rate[0]
+        self.shape = (nx, ny, nz)
+
+    def simulate(self):
+        rng = np.random.default_rng(int(self.wd[0]))
+        self.ch4_obs = (rng.random((len(self.ws),) + self.shape)
+                        * self.rate * self.ws[:, None, None, None])
+
+
+class TestSimulateAndDetect:
+    @pytest.fixture
+    def fake_puff(self, monkeypatch):
+        module = types.ModuleType('FastGaussianPuff')
+        module.GaussianPuff = FakeGaussianPuff
+        monkeypatch.setitem(sys.modules, 'FastGaussianPuff', module)
+
+    @pytest.fixture
+    def emission_scenarios(self):
+        n_t = 6
+        return pd.DataFrame({
+            'ChunkIndex': np.repeat([1, 2, 3], n_t),
+            'TimeStamp.Mountain': [f'2024-01-01 00:{m:02d}:00-07:00' for m in range(3 * n_t)],
+            'WindSpeed.m/s': np.linspace(1., 3., 3 * n_t),
+            'WindDirection.degree': np.repeat([90, 180, 270], n_t),
+            'Source_x.m': 0., 'Source_y.m': 0., 'Source_z.m': 2.,
+            'EmissionRate.kg/h': np.repeat([0.5, 1., 2.], n_t),
+        })
+
+    @pytest.mark.parametrize("detection_params", [
+        {'method': 'overall', 'amp_thresh': 1.0, 'persistence_thresh': 2},
+        {'method': 'consecutive', 'amp_thresh': 1.0, 'persistence_thresh': 0.5},
+        {'method': 'movingWindow', 'amp_thresh': 1.0, 'persistence_thresh': 2, 'window_len': 3,
+         'stride': 2},
+    ])
+    def test_matches_separate_detection(self, fake_puff, emission_scenarios, tmp_path,
+                                        detection_params):
+        """Test that detecting while simulating matches detecting the saved concentrations"""
+        grid = ((-50, -50, 0, 50, 50, 10), (4, 3, 2))
+        fused_dir = str(tmp_path / 'fused') + '/'
+        separate_dir = str(tmp_path / 'separate') + '/'
+        (tmp_path / 'fused').mkdir()
+        (tmp_path / 'separate').mkdir()
+
+        detection = run_gp(emission_scenarios.copy(), *grid, 60, 1, 4, save_dir=fused_dir,
+                           detection_params=detection_params)
+        assert not (tmp_path / 'fused' / 'ch4_sim_grid_locations.npy').exists()
+
+        run_gp(emission_scenarios.copy(), *grid, 60, 1, 4, save_dir=separate_dir)
+        ch4_sim = np.load(separate_dir + 'ch4_sim_grid_locations.npy')
+        assert ch4_sim.shape == (3, 6, 24)
+        expected = run_detection(ch4_sim, save_dir=separate_dir, **detection_params)
+        assert detection.shape == (24, 3)
+        assert np.array_equal(detection, expected)
+        assert np.array_equal(np.load(fused_dir + 'detection_grid_locations.npy'), expected)
+
 if __name__ == "__main__":
     pytest.main(["-v"])
@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+import numpy as np
+from placement.instrumentation import Metrics, NullMetrics
+from placement.PORSS import PORSS
+from placement.evaluate_detection import run_detection
+
+
+class TestMetrics:
+    def test_counters_gauges_timers(self):
+        """Test recording of counters, gauges and timers"""
+        metrics = Metrics()
+        metrics.increment('a')
+        metrics.increment('a', 2)
+        metrics.gauge('size', 5)
+        with metrics.timer('t'):
+            pass
+        metrics.add_time('t', 1.)
+        summary = metrics.summary()
+        assert summary['counters'] == {'a': 3}
+        assert summary['gauges'] == {'size': 5}
+        assert summary['timers']['t']['count'] == 2
+        assert summary['timers']['t']['total_sec'] >= 1.
+
+    def test_callbacks_and_sink(self):
+        """Test that events reach the callbacks and the JSON-lines sink"""
+        received = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sink = os.path.join(tmp_dir, 'metrics.jsonl')
+            metrics = Metrics(sink=sink, callbacks=[received.append])
+            metrics.emit('first', value=1)
+            metrics.emit('second', value=np.float64(2.5))
+            metrics.close()
+            with open(sink) as f:
+                records = [json.loads(line) for line in f]
+        assert [r['event'] for r in received] == ['first', 'second']
+        assert [r['value'] for r in records] == [1, 2.5]
+
+    def test_null_metrics(self):
+        """Test that the null implementation records nothing"""
+        metrics = NullMetrics()
+        metrics.increment('a')
+        with metrics.timer('t'):
+            pass
+        assert metrics.emit('event') is None
+        assert metrics.summary()['counters'] == {}
+
+
+class TestStageInstrumentation:
+    def test_porss(self):
+        """Test PORSS counters, timers and progress events"""
+        np.random.seed(0)
+        matrix = np.random.choice([0, 1], size=(20, 30), p=[.7, .3])
+        events = []
+        metrics = Metrics(callbacks=[events.append])
+        porss = PORSS(matrix, 3, 1, n_iters=2500, patience=10, verbose=False, metrics=metrics)
+        porss.main()
+
+        summary = metrics.summary()
+        iterations = events[-1]['iteration']
+        assert summary['counters']['porss.evaluations'] == 2 * (iterations - 1)
+        assert summary['counters']['porss.archive_insertions'] >= 1
+        assert summary['gauges']['porss.archive_size'] >= 1
+        assert summary['timers']['porss.recombination']['count'] == iterations - 1
+        assert summary['timers']['porss.mutation']['count'] == iterations - 1
+        assert summary['timers']['porss.evaluation']['count'] == 2 * (iterations - 1)
+        assert [e['event'] for e in events][-1] == 'porss.done'
+        assert all(e['event'] == 'porss.progress' for e in events[:-1])
+
+    def test_run_detection(self):
+        """Test detection throughput metrics"""
+        metrics = Metrics()
+        with tempfile.TemporaryDirectory() as save_dir:
+            run_detection(np.random.random((4, 10, 6)) * 2, 'overall', 1., 2,
+                          save_dir=save_dir + '/', metrics=metrics)
+        summary = metrics.summary()
+        assert summary['counters']['detection.series'] == 24
+        assert summary['timers']['detection']['count'] == 1
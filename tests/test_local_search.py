@@ -0,0 +1,77 @@
+import itertools
+import unittest
+import numpy as np
+from placement.PORSS import PORSS
+from placement.local_search import swap_local_search
+from placement.optimization import run_porss
+from placement.results_store import ResultsStore
+
+
+class TestLocalSearch(unittest.TestCase):
+    def setUp(self):
+        """Set up a random detection matrix"""
+        self.rng = np.random.default_rng(1)
+        self.matrix = (self.rng.random((40, 60)) < .08).astype(np.int8)
+        self.weights = self.rng.random(60)
+
+    def coverage(self, solution, min_detected_sensor, weights=None):
+        covered = self.matrix[list(solution)].sum(axis=0) >= min_detected_sensor
+        return np.sum(covered) if weights is None else np.sum(weights[covered])
+
+    def test_one_swap_optimum(self):
+        """Test that the result is correct, not worse and has no improving 1-swap"""
+        for min_detected_sensor in [1, 2]:
+            for weights in [None, self.weights]:
+                initial = self.rng.choice(40, size=4, replace=False)
+                solution, coverage = swap_local_search(self.matrix, initial, min_detected_sensor,
+                                                       weights=weights)
+                self.assertEqual(len(solution), 4)
+                self.assertAlmostEqual(coverage,
+                                       self.coverage(solution, min_detected_sensor, weights))
+                self.assertGreaterEqual(coverage + 1e-9,
+                                        self.coverage(initial, min_detected_sensor, weights))
+                for position in range(4):
+                    for j in set(range(40)) - set(solution):
+                        swapped = list(solution)
+                        swapped[position] = j
+                        self.assertLessEqual(self.coverage(swapped, min_detected_sensor, weights),
+                                             coverage + 1e-9)
+
+    def test_two_swap(self):
+        """Test a placement that only a 2-swap improves"""
+        # scenarios 0-1 need both sensors 2 and 3; sensors 0 and 1 each detect one other scenario
+        matrix = np.array([[0, 0, 1, 0],
+                           [0, 0, 0, 1],
+                           [1, 1, 0, 0],
+                           [1, 1, 0, 0]])
+        solution, coverage = swap_local_search(matrix, [0, 1], 2, two_swap=False)
+        self.assertEqual(coverage, 0)
+        solution, coverage = swap_local_search(matrix, [0, 1], 2)
+        np.testing.assert_array_equal(solution, [2, 3])
+        self.assertEqual(coverage, 2)
+
+    def test_fill_and_optimum(self):
+        """Test the greedy fill-up and that small instances reach the optimum"""
+        optimum = max(self.coverage(s, 1) for s in itertools.combinations(range(40), 3))
+        solution, coverage = swap_local_search(self.matrix, [5], 1, budget=3)
+        self.assertEqual(len(solution), 3)
+        self.assertEqual(coverage, optimum)
+        with self.assertRaises(ValueError):
+            swap_local_search(self.matrix, [1, 2, 3], 1, budget=2)
+
+    def test_polish_porss(self):
+        """Test that polishing PORSS solutions never lowers their coverage"""
+        porss = PORSS(self.matrix, 3, 1, n_iters=200, seed=0, verbose=False)
+        porss_solution, porss_coverage = porss.main()
+        _, coverage = swap_local_search(self.matrix, porss_solution, 1, budget=3)
+        self.assertGreaterEqual(coverage, porss_coverage)
+
+        with ResultsStore(':memory:') as store:
+            run_porss(self.matrix, 3, 1, 2, store=store, seed=0, polish=True)
+            df_runs = store.runs()
+            for run_id, coverage in zip(df_runs['run_id'], df_runs['coverage']):
+                self.assertEqual(self.coverage(store.solution(run_id), 1), coverage)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,111 @@
+import unittest
+import numpy as np
+from placement.multiresolution import (
+    block_ids,
+    block_representatives,
+    aggregate_detection,
+    block_detection,
+    neighbour_blocks,
+    run_multiresolution
+)
+
+
+class TestMultiresolution(unittest.TestCase):
+    def setUp(self):
+        """Set up a smooth detection field on a fine grid"""
+        self.grid_nums = (12, 12, 2)
+        ix, iy, iz = np.unravel_index(np.arange(np.prod(self.grid_nums)), self.grid_nums)
+
+        # scenario j is detected within a radius around its own plume centre
+        rng = np.random.default_rng(0)
+        centres = rng.uniform(0, 12, size=(40, 2))
+        dist = np.hypot(ix[:, None] - centres[None, :, 0], iy[:, None] - centres[None, :, 1])
+        self.detection = (dist < 3.).astype(int)
+
+    def test_block_ids(self):
+        """Test block indices and the coarse grid size"""
+        cells = np.array([0, 1, 2 * 2, 12 * 2 * 5 + 2 * 7 + 1])
+        blocks, coarse_nums = block_ids(cells, self.grid_nums, (5, 5, 2))
+        self.assertEqual(coarse_nums, (3, 3, 1))
+        np.testing.assert_array_equal(blocks, [0, 0, 0, 4])
+
+    def test_block_representatives(self):
+        """Test one central representative per block"""
+        cells = np.arange(np.prod(self.grid_nums))
+        blocks, _ = block_ids(cells, self.grid_nums, (3, 3, 1))
+        unique_blocks, representatives = block_representatives(cells, blocks)
+        self.assertEqual(len(unique_blocks), 4 * 4 * 2)
+        rep_blocks, _ = block_ids(representatives, self.grid_nums, (3, 3, 1))
+        np.testing.assert_array_equal(rep_blocks, unique_blocks)
+        ix, iy, _ = np.unravel_index(representatives, self.grid_nums)
+        np.testing.assert_array_equal(ix % 3, 1)
+        np.testing.assert_array_equal(iy % 3, 1)
+
+    def test_aggregate_detection(self):
+        """Test 'any' and 'majority' aggregation"""
+        detection = np.array([[1, 0], [0, 0], [1, 1], [0, 1]])
+        blocks = np.array([3, 3, 7, 7])
+        unique_blocks, coarse = aggregate_detection(detection, blocks, how='any')
+        np.testing.assert_array_equal(unique_blocks, [3, 7])
+        np.testing.assert_array_equal(coarse, [[1, 0], [1, 1]])
+        _, coarse = aggregate_detection(detection, blocks, how='majority')
+        np.testing.assert_array_equal(coarse, [[1, 0], [1, 1]])
+        with self.assertRaises(ValueError):
+            aggregate_detection(detection, blocks, how='max')
+
+    def test_block_detection(self):
+        """Test that aggregating one block at a time matches aggregating the full matrix"""
+        requested = []
+
+        def detection_fn(cells):
+            requested.append(len(cells))
+            return self.detection[cells]
+
+        rng = np.random.default_rng(1)
+        cells = rng.permutation(np.prod(self.grid_nums))[:200]
+        blocks, _ = block_ids(cells, self.grid_nums, (3, 3, 2))
+        for how in ['any', 'majority']:
+            unique_blocks, coarse = block_detection(detection_fn, cells, blocks, how=how)
+            expected_blocks, expected = aggregate_detection(self.detection[cells], blocks, how=how)
+            np.testing.assert_array_equal(unique_blocks, expected_blocks)
+            np.testing.assert_array_equal(coarse, expected)
+        self.assertEqual(len(requested), 2 * len(unique_blocks))
+        self.assertEqual(sum(requested), 2 * len(cells))
+
+    def test_neighbour_blocks(self):
+        """Test the halo of blocks at the grid corner"""
+        neighbours = neighbour_blocks(np.array([0]), (3, 3, 1), halo=1)
+        np.testing.assert_array_equal(neighbours, [0, 1, 3, 4])
+
+    def test_run_multiresolution(self):
+        """Test that the refined search only evaluates a part of the fine grid"""
+        requested = []
+
+        def detection_fn(cells):
+            requested.append(len(cells))
+            return self.detection[cells]
+
+        solution, coverage = run_multiresolution(detection_fn, self.grid_nums, (3, 3, 2),
+                                                 budget=3, min_detected_sensor=1, halo=0,
+                                                 n_iters=3000, seed=0)
+        self.assertLessEqual(len(solution), 3)
+        covered = np.sum(np.sum(self.detection[solution], axis=0) >= 1)
+        self.assertEqual(coverage, covered)
+        self.assertEqual(requested[:16], [3 * 3 * 2] * 16)  # one block at a time
+        self.assertEqual(len(requested), 16 + 1)
+        self.assertLessEqual(requested[-1], 3 * 3 * 3 * 2)  # cells of the selected blocks only
+
+        requested.clear()
+        solution, coverage = run_multiresolution(detection_fn, self.grid_nums, (3, 3, 2),
+                                                 budget=3, min_detected_sensor=1, halo=0,
+                                                 coarse='representative', n_iters=3000, seed=0)
+        self.assertEqual(coverage, np.sum(np.sum(self.detection[solution], axis=0) >= 1))
+        self.assertEqual(requested[0], 16)  # one representative per block
+        self.assertLessEqual(requested[1], 3 * 3 * 3 * 2)
+        with self.assertRaises(ValueError):
+            run_multiresolution(detection_fn, self.grid_nums, (3, 3, 2), budget=3,
+                                min_detected_sensor=1, coarse='max')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
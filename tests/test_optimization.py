@@ -176,6 +176,45 @@ class TestPORSSOptimization(unittest.TestCase):
 
         self.assertEqual(porss.population_size, initial_size + 1)
 
+    def test_weighted_objectives(self):
+        """Test objectives and upper bound with scenario weights"""
+        weights = np.array([1., 2., 3., 4.])
+        porss = PORSS(self.small_matrix, k=2, min_detected_sensor=1, weights=weights)
+        self.assertEqual(porss.objectives(np.array([1, 0, 0, 0]))[0], 4.)
+        self.assertEqual(porss.objectives(np.array([0, 1, 0, 0]))[0], 9.)
+        self.assertEqual(porss.opt_val_ub, 10.)
+
+        # unit weights give the unweighted coverage
+        porss_unit = PORSS(self.large_matrix, k=3, min_detected_sensor=1, weights=np.ones(30))
+        porss_plain = PORSS(self.large_matrix, k=3, min_detected_sensor=1)
+        solution = np.zeros(20)
+        solution[[0, 5, 7]] = 1
+        self.assertEqual(porss_unit.objectives(solution)[0], porss_plain.objectives(solution)[0])
+
+    def test_weighted_main(self):
+        """Test that weighted PORSS finds the placement covering the heaviest scenarios"""
+        weights = np.array([1., 1., 1., 10.])
+        porss = PORSS(self.small_matrix, k=1, min_detected_sensor=1, weights=weights,
+                      n_iters=2000, seed=0, verbose=False)
+        solution, coverage = porss.main()
+        self.assertIn(solution[0], [1, 3])
+        self.assertEqual(coverage, 12.)
+
+    def test_dataframe_matrix(self):
+        """Test that a DataFrame detection matrix is solved like the array"""
+        import pandas as pd
+        porss_frame = PORSS(pd.DataFrame(self.large_matrix), k=3, min_detected_sensor=1,
+                            n_iters=500, seed=0, verbose=False)
+        self.assertFalse(porss_frame.sharded)
+        porss_array = PORSS(self.large_matrix, k=3, min_detected_sensor=1, n_iters=500, seed=0,
+                            verbose=False)
+        np.random.seed(0)
+        solution_frame, coverage_frame = porss_frame.main()
+        np.random.seed(0)
+        solution_array, coverage_array = porss_array.main()
+        np.testing.assert_array_equal(solution_frame, solution_array)
+        self.assertEqual(coverage_frame, coverage_array)
+
     def tearDown(self):
         """Clean up temporary files after tests"""
         import shutil
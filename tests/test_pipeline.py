@@ -0,0 +1,252 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from placement.__main__ import main
+from placement.pipeline import (Stage, build_stages, run_config, stage_key, stage_optimization,
+                                stage_scenarios, topological_order)
+from placement.results_store import ResultsStore
+from placement.scenario_reduction import reduction_error
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def stage_noop(params, inputs, dep_dirs, out_dir):
+    pass
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        """Set up a small site with a precomputed detection matrix"""
+        self.test_dir = tempfile.mkdtemp()
+        pd.DataFrame({'x_min.m': [0.], 'x_max.m': [10.], 'y_min.m': [0.], 'y_max.m': [10.],
+                      'z_min.m': [1.], 'z_max.m': [1.], 'dx.m': [1.], 'dy.m': [1.], 'dz.m': [1.]}
+                     ).to_csv(os.path.join(self.test_dir, 'domain.csv'), index=False)
+        pd.DataFrame({'EquipName': ['A'] * 4, 'VertexName': list('abcd'),
+                      'Vertex_x.m': [4, 4, 6, 6], 'Vertex_y.m': [4, 6, 6, 4]}
+                     ).to_csv(os.path.join(self.test_dir, 'equipment_vertices.csv'), index=False)
+        rng = np.random.default_rng(0)
+        np.save(os.path.join(self.test_dir, 'detection.npy'),
+                rng.choice([0, 1], size=(121, 20), p=[.8, .2]))
+
+        self.config = {'work_dir': 'work',
+                       'inputs': {'domain': 'domain.csv',
+                                  'equipment_vertices': 'equipment_vertices.csv',
+                                  'detection': 'detection.npy'},
+                       'optimization': {'budget': 2, 'min_detected_sensor': 1, 'n_trials': 2,
+                                        'candidates': ['valid', 'fenceline']}}
+        self.config_path = os.path.join(self.test_dir, 'config.json')
+        self.write_config()
+
+    def write_config(self):
+        with open(self.config_path, 'w') as f:
+            json.dump(self.config, f)
+
+    def test_build_stages(self):
+        """Test the stage graph for the different pipeline entry points"""
+        stages = build_stages(self.config, self.test_dir)
+        self.assertEqual([s.name for s in stages],
+                         ['locations', 'optimization_valid', 'optimization_fenceline'])
+
+        config = dict(self.config, inputs={'domain': 'domain.csv',
+                                           'equipment_vertices': 'equipment_vertices.csv',
+                                           'emission_scenarios': 'emission_scenarios.csv'},
+                      simulation={'obs_dt': 60, 'sim_dt': 1, 'puff_dt': 4},
+                      detection={'method': 'overall', 'amp_thresh': 1, 'persistence_thresh': .2})
+        names = {s.name: s.deps for s in build_stages(config, self.test_dir)}
+        self.assertEqual(names['concentrations'], ['scenarios'])
+        self.assertEqual(names['detection'], ['concentrations'])
+        self.assertEqual(names['optimization_valid'], ['detection', 'locations', 'scenarios'])
+
+        config['detection'] = dict(config['detection'], fused=True)
+        names = {s.name: s.deps for s in build_stages(config, self.test_dir)}
+        self.assertNotIn('concentrations', names)
+        self.assertEqual(names['detection'], ['scenarios'])
+
+        # a pilot of the scenario reduction is simulated for the optimization stages
+        config['scenarios'] = {'reduction': {'fraction': .2, 'n_pilot': 10}}
+        names = {s.name: s.deps for s in build_stages(config, self.test_dir)}
+        self.assertEqual(names['pilot_detection'], ['scenarios'])
+        self.assertIn('pilot_detection', names['optimization_valid'])
+
+    def test_topological_order(self):
+        """Test dependency order, unknown dependencies and cycles"""
+        stages = [Stage('c', stage_noop, deps=['b']), Stage('b', stage_noop, deps=['a']),
+                  Stage('a', stage_noop)]
+        self.assertEqual([s.name for s in topological_order(stages)], ['a', 'b', 'c'])
+        with self.assertRaises(ValueError):
+            topological_order([Stage('a', stage_noop, deps=['missing'])])
+        with self.assertRaises(ValueError):
+            topological_order([Stage('a', stage_noop, deps=['b']),
+                               Stage('b', stage_noop, deps=['a'])])
+
+    def test_stage_key(self):
+        """Test that keys change with parameters, inputs and upstream keys"""
+        stage = Stage('a', stage_noop, params={'x': 1},
+                      inputs={'domain': os.path.join(self.test_dir, 'domain.csv')})
+        key = stage_key(stage, {})
+        self.assertEqual(key, stage_key(stage, {}))
+        changed = Stage('a', stage_noop, params={'x': 2}, inputs=stage.inputs)
+        self.assertNotEqual(key, stage_key(changed, {}))
+
+        with open(os.path.join(self.test_dir, 'domain.csv'), 'a') as f:
+            f.write('\n')
+        self.assertNotEqual(key, stage_key(stage, {}))
+
+        child = Stage('b', stage_noop, deps=['a'])
+        self.assertNotEqual(stage_key(child, {'a': '0'}), stage_key(child, {'a': '1'}))
+
+    def test_run_and_cache(self):
+        """Test that outputs are written once and only changed stages rerun"""
+        results = run_config(self.config_path, max_workers=2)
+        self.assertFalse(any(r['cached'] for r in results.values()))
+        for candidates in ['valid', 'fenceline']:
+            result_dir = results[f'optimization_{candidates}']['dir']
+            with ResultsStore(os.path.join(result_dir, 'results.sqlite')) as store:
+                df_runs = store.runs(label=candidates)
+                self.assertEqual(len(df_runs), 2)
+                self.assertEqual(len(store.solution(df_runs['run_id'][0])), 2)
+
+        # nothing changed: everything is skipped
+        results = run_config(self.config_path)
+        self.assertTrue(all(r['cached'] for r in results.values()))
+        main(['run', self.config_path])
+
+        # a changed optimization parameter only reruns the optimization stages
+        self.config['optimization']['budget'] = 3
+        self.write_config()
+        results = run_config(self.config_path)
+        self.assertTrue(results['locations']['cached'])
+        self.assertFalse(results['optimization_valid']['cached'])
+        self.assertFalse(results['optimization_fenceline']['cached'])
+
+        results = run_config(self.config_path, force=True)
+        self.assertFalse(any(r['cached'] for r in results.values()))
+
+    def test_metrics_sink(self):
+        """Test that the configured metrics file gets the events of every stage"""
+        self.config['metrics'] = 'metrics.jsonl'
+        self.write_config()
+        run_config(self.config_path)
+        with open(os.path.join(self.test_dir, 'metrics.jsonl')) as f:
+            records = [json.loads(line) for line in f]
+        stage_events = [(r['stage'], r['status']) for r in records
+                        if r['event'] == 'pipeline.stage']
+        for name in ['locations', 'optimization_valid', 'optimization_fenceline']:
+            self.assertIn((name, 'start'), stage_events)
+            self.assertIn((name, 'done'), stage_events)
+        self.assertIn('porss.trial', [r['event'] for r in records])
+
+    def test_cli_steps(self):
+        """Test the detect and optimize commands on synthetic concentrations"""
+        rng = np.random.default_rng(0)
+        np.save(os.path.join(self.test_dir, 'ch4_sim_grid_locations.npy'),
+                rng.exponential(.5, size=(6, 30, 20)))
+        for candidates, rows in [('valid', [0, 3, 5, 8, 13]), ('fenceline', [1, 2, 19])]:
+            pd.DataFrame({'loc_index': rows}).to_csv(
+                os.path.join(self.test_dir, f'{candidates}_sensor_locations.csv'), index=False)
+
+        metrics_path = os.path.join(self.test_dir, 'metrics.jsonl')
+        main(['detect', '--data-dir', self.test_dir, '--metrics', metrics_path])
+        detection = np.load(os.path.join(self.test_dir, 'detection_grid_locations.npy'))
+        self.assertEqual(detection.shape, (20, 6))
+        fenceline = np.load(os.path.join(self.test_dir, 'detection_fenceline_locations.npy'))
+        np.testing.assert_array_equal(fenceline, detection[[1, 2, 19]])
+
+        main(['optimize', '--data-dir', self.test_dir, '--results-dir', self.test_dir,
+              '--budget', '2', '--trials', '1', '--metrics', metrics_path])
+        with open(metrics_path) as f:
+            records = [json.loads(line) for line in f]
+        summaries = [r for r in records if r['event'] == 'summary']
+        self.assertEqual([r['command'] for r in summaries], ['detect', 'optimize'])
+        self.assertEqual(summaries[0]['counters']['detection.series'], 6 * 20)
+        self.assertEqual([r['event'] for r in records].count('porss.trial'), 2)
+        with ResultsStore(os.path.join(self.test_dir, 'results.sqlite')) as store:
+            for candidates in ['valid', 'fenceline']:
+                self.assertEqual(len(store.runs(label=candidates)), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'results_valid_locations')))
+
+        # pickles only on request
+        main(['optimize', '--data-dir', self.test_dir, '--results-dir', self.test_dir,
+              '--budget', '2', '--trials', '1', '--pickles'])
+        for candidates in ['valid', 'fenceline']:
+            results_dir = os.path.join(self.test_dir, f'results_{candidates}_locations')
+            result_files = os.listdir(results_dir)
+            self.assertEqual(len(result_files), 1)
+
+    def test_demo_config(self):
+        """Test that the demo configuration's inputs exist and its scenarios stage runs"""
+        demo_dir = os.path.join(repo_dir, 'demo')
+        with open(os.path.join(demo_dir, 'pipeline_config.json')) as f:
+            config = json.load(f)
+        inputs = {name: os.path.join(demo_dir, path) for name, path in config['inputs'].items()}
+        for path in inputs.values():
+            self.assertTrue(os.path.exists(path), path)
+        stage_scenarios(config['scenarios'], inputs, {}, os.path.join(self.test_dir, ''))
+        df_emission_scenarios = pd.read_csv(os.path.join(self.test_dir, 'emission_scenarios.csv'))
+        self.assertEqual(df_emission_scenarios['ChunkIndex'].nunique(),
+                         config['scenarios']['n_samples'])
+
+    def test_reduction_pilot(self):
+        """Test that a reduced run saves the chunk assignment and reports the reduction error"""
+        demo_dir = os.path.join(repo_dir, 'demo')
+        with open(os.path.join(demo_dir, 'pipeline_config.json')) as f:
+            config = json.load(f)
+        inputs = {name: os.path.join(demo_dir, path) for name, path in config['inputs'].items()}
+        params = dict(config['scenarios'], n_samples=40,
+                      reduction={'fraction': .25, 'seed': 0, 'n_pilot': 10})
+        dep_dirs = {name: os.path.join(self.test_dir, name, '')
+                    for name in ['scenarios', 'locations', 'detection', 'pilot_detection']}
+        for path in dep_dirs.values():
+            os.makedirs(path)
+        stage_scenarios(params, inputs, {}, dep_dirs['scenarios'])
+        assignment = pd.read_csv(dep_dirs['scenarios'] + 'scenario_assignment.csv',
+                                 index_col='ChunkIndex')['Representative']
+        self.assertEqual(len(assignment), 40)
+        df_pilot = pd.read_csv(dep_dirs['scenarios'] + 'pilot_emission_scenarios.csv')
+        self.assertEqual(df_pilot['ChunkIndex'].nunique(), 10)
+
+        # synthetic detection matrices of the representatives and of the pilot chunks
+        rng = np.random.default_rng(0)
+        n_representatives = assignment.nunique()
+        rows = np.arange(0, 16, 2)
+        np.save(dep_dirs['locations'] + 'valid_location_indices.npy', rows)
+        detection = (rng.random((16, n_representatives)) < .2).astype(np.int8)
+        pilot_detection = (rng.random((16, 10)) < .2).astype(np.int8)
+        np.save(dep_dirs['detection'] + 'detection_grid_locations.npy', detection)
+        np.save(dep_dirs['pilot_detection'] + 'detection_grid_locations.npy', pilot_detection)
+
+        out_dir = os.path.join(self.test_dir, 'optimization', '')
+        os.makedirs(out_dir)
+        stage_optimization({'budget': 2, 'min_detected_sensor': 1, 'n_trials': 2,
+                            'candidates': 'valid'}, {}, dep_dirs, out_dir)
+        df_errors = pd.read_csv(out_dir + 'reduction_error.csv')
+        self.assertEqual(len(df_errors), 2)
+        with ResultsStore(out_dir + 'results.sqlite') as store:
+            solutions = [store.solution(run_id) for run_id in df_errors['run_id']]
+        expected = reduction_error(pilot_detection[rows], assignment, solutions, 1,
+                                   chunks=np.unique(df_pilot['ChunkIndex']),
+                                   rep_detection=detection[rows])
+        np.testing.assert_allclose(df_errors['reduction_error'], expected)
+
+    def test_import_side_effects(self):
+        """Test that importing the library modules loads no data and no heavy dependencies"""
+        code = ('import sys; import placement.simulate_concentrations, '
+                'placement.evaluate_detection, placement.optimization; '
+                'print("pandas" in sys.modules, "FastGaussianPuff" in sys.modules)')
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                cwd=self.test_dir, env=dict(os.environ, PYTHONPATH=repo_dir))
+        self.assertEqual(output.stdout.split(), ['False', 'False'], output.stderr)
+        self.assertEqual(os.listdir(self.test_dir).count('detection_grid_locations.npy'), 0)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from placement.PORSS import PORSS
+from placement.optimization import run_porss
+from placement.results_store import ResultsStore
+
+
+class TestResultsStore(unittest.TestCase):
+    def setUp(self):
+        """Set up a store in a temporary directory and a random detection matrix"""
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, 'results.sqlite')
+        rng = np.random.default_rng(0)
+        self.matrix = rng.choice([0, 1], size=(30, 40), p=[.8, .2])
+
+    def test_add_and_query(self):
+        """Test that runs, solutions and Pareto fronts round-trip"""
+        with ResultsStore(self.path) as store:
+            run_id = store.add_run(np.array([3, 7]), 30, 2, 1, runtime=1.5, seed=4,
+                                   params={'n_iters': 10},
+                                   pareto_front=[(1, 20., [3]), (2, 30., [3, 7])], label='valid',
+                                   n_scenarios=40)
+            store.add_run(np.array([1, 2]), 25, 2, 1, label='valid', n_scenarios=40)
+            store.add_run(np.array([1, 2, 5]), 35, 3, 1, label='valid', n_scenarios=40)
+            store.add_run(np.array([9, 8]), 39, 2, 1, label='fenceline', n_scenarios=40)
+
+        # reopen: the results persist
+        with ResultsStore(self.path) as store:
+            df_runs = store.runs(label='valid')
+            self.assertEqual(len(df_runs), 3)
+            self.assertEqual(df_runs['seed'][0], 4)
+            self.assertAlmostEqual(df_runs['coverage_fraction'][0], .75)
+            np.testing.assert_array_equal(store.solution(run_id), [3, 7])
+            self.assertEqual(len(store.runs(budget=2)), 3)
+
+            df_front = store.pareto_front(run_id)
+            self.assertEqual(list(df_front['n_sensors']), [1, 2])
+            np.testing.assert_array_equal(df_front['solution'][1], [3, 7])
+
+            df_best = store.best_by_budget(label='valid')
+            self.assertEqual(list(df_best['budget']), [2, 3])
+            self.assertEqual(list(df_best['coverage']), [30., 35.])
+            np.testing.assert_array_equal(df_best['solution'][0], [3, 7])
+            self.assertEqual(store.best_by_budget()['coverage'][0], 39.)
+
+            df_distribution = store.coverage_distribution(label='valid')
+            self.assertEqual(df_distribution.loc[2, 'count'], 2)
+            self.assertAlmostEqual(df_distribution.loc[2, 'max'], .75)
+
+            with self.assertRaises(ValueError):
+                store.solution(100)
+
+    def test_best_by_budget_fraction(self):
+        """Test that the best run covers the largest fraction, not the most scenarios"""
+        with ResultsStore(self.path) as store:
+            store.add_run(np.array([1, 2]), 30, 2, 1, n_scenarios=60)
+            run_id = store.add_run(np.array([4, 5]), 25, 2, 1, n_scenarios=40)
+            store.add_run(np.array([6, 7]), 50, 2, 1)
+            weighted_id = store.add_run(np.array([1, 2, 3]), 8., 3, 1, n_scenarios=40,
+                                        total_weight=10.)
+            store.add_run(np.array([4, 5, 6]), 20, 3, 1, n_scenarios=40)
+
+            df_best = store.best_by_budget()
+            self.assertEqual(list(df_best['run_id']), [run_id, weighted_id])
+            self.assertAlmostEqual(df_best['coverage_fraction'][0], .625)
+            self.assertAlmostEqual(df_best['coverage_fraction'][1], .8)
+
+    def test_porss_pareto_front(self):
+        """Test that the archived front is non-dominated and contains the best solution"""
+        porss = PORSS(self.matrix, 3, 1, n_iters=3000, seed=0, verbose=False)
+        solution, coverage = porss.main()
+        front = porss.pareto_front()
+        sizes = [n for n, _, _ in front]
+        self.assertEqual(sizes, sorted(set(sizes)))
+        for n, value, rows in front:
+            self.assertEqual(len(rows), n)
+            self.assertEqual(porss.coverage(self.matrix[rows].sum(axis=0)), value)
+        self.assertIn(coverage, [value for n, value, _ in front if n <= 3])
+
+    def test_run_porss_with_store(self):
+        """Test that run_porss writes every trial to the store instead of pickle files"""
+        with ResultsStore(self.path) as store:
+            run_porss(self.matrix, 2, 1, 3, save_dir=self.test_dir + '/', store=store, label='test',
+                      seed=10)
+            df_runs = store.runs()
+            self.assertEqual(list(df_runs['seed']), [10, 11, 12])
+            self.assertEqual(list(df_runs['trial']), [0, 1, 2])
+            for run_id, coverage in zip(df_runs['run_id'], df_runs['coverage']):
+                rows = store.solution(run_id)
+                self.assertLessEqual(len(rows), 2)
+                self.assertEqual(np.sum(self.matrix[rows].sum(axis=0) >= 1), coverage)
+                self.assertGreater(len(store.pareto_front(run_id)), 0)
+        self.assertFalse(any(f.endswith('.pkl') for f in os.listdir(self.test_dir)))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
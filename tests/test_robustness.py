@@ -0,0 +1,68 @@
+import itertools
+import unittest
+import numpy as np
+from placement.PORSS import PORSS
+from placement.optimization import run_porss
+from placement.robustness import robust_coverage, score_robust
+
+
+class TestRobustness(unittest.TestCase):
+    def setUp(self):
+        """Set up a random detection matrix and placements of different sizes"""
+        self.rng = np.random.default_rng(0)
+        self.matrix = (self.rng.random((30, 120)) < .15).astype(np.int8)
+        self.weights = self.rng.random(120)
+        self.placements = [self.rng.choice(30, size=k, replace=False) for k in [1, 2, 3, 4, 6] * 3]
+
+    def naive(self, solution, min_detected_sensor, weights, n_failures, failure_mode):
+        # recompute the coverage for every set of failed sensors
+        values = []
+        for failed in itertools.combinations(list(solution), n_failures):
+            rest = [s for s in solution if s not in failed]
+            covered = self.matrix[rest].sum(axis=0) >= min_detected_sensor
+            values.append(np.sum(covered) if weights is None else np.sum(weights[covered]))
+        if not values:
+            return 0
+        return min(values) if failure_mode == 'worst' else np.mean(values)
+
+    def test_against_naive(self):
+        """Test robust_coverage and score_robust against recomputing every failure set"""
+        for min_detected_sensor, n_failures, failure_mode, weights in itertools.product(
+                [1, 2], [1, 2], ['worst', 'expected'], [None, self.weights]):
+            args = (min_detected_sensor, weights, n_failures, failure_mode)
+            expected = np.array([self.naive(p, *args) for p in self.placements])
+            values = [robust_coverage(self.matrix, p, *args) for p in self.placements]
+            np.testing.assert_allclose(values, expected, atol=1e-9)
+            total = 120 if weights is None else np.sum(weights)
+            scores = score_robust(self.matrix, self.placements, *args, chunk_size=4)
+            np.testing.assert_allclose(scores, expected / total, atol=1e-9)
+
+    def test_invalid_mode(self):
+        """Test that an unknown failure mode raises a ValueError"""
+        with self.assertRaises(ValueError):
+            score_robust(self.matrix, self.placements, failure_mode='best')
+        with self.assertRaises(ValueError):
+            robust_coverage(self.matrix, [0, 1], 1, failure_mode='best')
+
+    def test_porss_objective(self):
+        """Test that PORSS with failures returns its robust value and beats the plain solution"""
+        porss = PORSS(self.matrix, 4, 1, n_iters=3000, seed=0, verbose=False, n_failures=1)
+        solution, value = porss.main()
+        self.assertLessEqual(len(solution), 4)
+        self.assertEqual(value, self.naive(list(solution), 1, None, 1, 'worst'))
+        plain_solution, _ = PORSS(self.matrix, 4, 1, n_iters=3000, seed=0, verbose=False).main()
+        self.assertGreaterEqual(value, self.naive(list(plain_solution), 1, None, 1, 'worst'))
+
+        porss = PORSS(self.matrix, 4, 1, n_iters=500, seed=0, verbose=False, n_failures=1,
+                      failure_mode='expected', weights=self.weights)
+        solution, value = porss.main()
+        self.assertAlmostEqual(value, self.naive(list(solution), 1, self.weights, 1, 'expected'))
+
+    def test_run_porss_polish(self):
+        """Test that polishing is rejected together with failures"""
+        with self.assertRaises(ValueError):
+            run_porss(self.matrix, 4, 1, 1, polish=True, n_failures=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
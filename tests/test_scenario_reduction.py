@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+from placement.scenario_reduction import (
+    chunk_features,
+    reduce_scenarios,
+    scenario_weights,
+    weighted_coverage,
+    pilot_chunks,
+    reduction_error
+)
+
+
+def make_scenarios(n_chunks, chunk_len=12, seed=0):
+    """Emission scenario table with two source/rate combinations and a few distinct wind regimes"""
+    rng = np.random.default_rng(seed)
+    regimes = [(2.0, 90.), (5.0, 270.), (3.0, 0.)]
+    rows = []
+    for chunk in range(n_chunks):
+        ws, wd = regimes[chunk % len(regimes)]
+        source = (25., 25., 2., 1.) if chunk < n_chunks // 2 else (75., 25., 2., 5.)
+        for _ in range(chunk_len):
+            rows.append([chunk, ws + rng.normal(0, .05), wd + rng.normal(0, 1.), *source])
+    return pd.DataFrame(rows, columns=['ChunkIndex', 'WindSpeed.m/s', 'WindDirection.degree',
+                                       'Source_x.m', 'Source_y.m', 'Source_z.m',
+                                       'EmissionRate.kg/h'])
+
+
+@pytest.fixture
+def df_scenarios():
+    return make_scenarios(30)
+
+
+class TestChunkFeatures:
+    def test_shape(self, df_scenarios):
+        """Test one feature row per chunk with (u, v) per segment"""
+        chunk_ids, features = chunk_features(df_scenarios, n_segments=4)
+        assert np.array_equal(chunk_ids, np.arange(30))
+        assert features.shape == (30, 8)
+
+    def test_wind_components(self):
+        """Test that the features are the wind vector components"""
+        df = make_scenarios(1, chunk_len=4)
+        df['WindSpeed.m/s'] = 2.0
+        df['WindDirection.degree'] = 90.
+        _, features = chunk_features(df, n_segments=2)
+        np.testing.assert_allclose(features[0], [2., 2., 0., 0.], atol=1e-12)
+
+
+class TestReduceScenarios:
+    def test_weights_sum_to_chunks(self, df_scenarios):
+        """Test that the representatives carry the weight of all original chunks"""
+        df_reduced, assignment = reduce_scenarios(df_scenarios, fraction=.2, seed=0)
+        weights = scenario_weights(df_reduced)
+        assert weights.sum() == 30
+        assert len(weights) == df_reduced['ChunkIndex'].nunique()
+        assert len(weights) < 30
+        assert set(assignment.unique()) == set(df_reduced['ChunkIndex'])
+
+    def test_sources_are_kept_separate(self, df_scenarios):
+        """Test that chunks are only represented by chunks of the same source and rate"""
+        _, assignment = reduce_scenarios(df_scenarios, fraction=.2, seed=0)
+        for chunk, rep in assignment.items():
+            assert (chunk < 15) == (rep < 15)
+
+    def test_near_duplicates_are_merged(self, df_scenarios):
+        """Test that one representative per wind regime and source is enough"""
+        df_reduced, assignment = reduce_scenarios(df_scenarios, fraction=.2, seed=0)
+        assert df_reduced['ChunkIndex'].nunique() == 6
+        for chunk, rep in assignment.items():
+            assert chunk % 3 == rep % 3
+
+    def test_unweighted_scenarios(self, df_scenarios):
+        """Test default weights of a table without reduction"""
+        assert np.array_equal(scenario_weights(df_scenarios), np.ones(30))
+
+
+class TestWeightedCoverage:
+    def test_weighted_coverage(self):
+        """Test weighted coverage against a hand computed value"""
+        matrix = np.array([[1, 0, 0], [0, 1, 0]])
+        weights = np.array([1., 2., 3.])
+        assert weighted_coverage(matrix, [0], 1) == pytest.approx(1 / 3)
+        assert weighted_coverage(matrix, [0], 1, weights) == pytest.approx(1 / 6)
+        assert weighted_coverage(matrix, [0, 1], 1, weights) == pytest.approx(.5)
+
+    def test_reduction_error(self, df_scenarios):
+        """Test that representative columns reproduce the coverage of duplicated scenarios"""
+        _, assignment = reduce_scenarios(df_scenarios, fraction=.2, seed=0)
+        rng = np.random.default_rng(1)
+        # detection only depends on the wind regime, as for exact duplicates
+        detection = rng.integers(0, 2, size=(10, 3))[:, np.arange(30) % 3]
+        errors = reduction_error(detection, assignment, [[0], [1, 2], [3, 4, 5]], 1)
+        np.testing.assert_allclose(errors, 0., atol=1e-12)
+
+    def test_reduction_error_pilot(self, df_scenarios):
+        """Test the error on all chunks and its estimate from a pilot subset"""
+        _, assignment = reduce_scenarios(df_scenarios, fraction=.2, seed=0)
+        rng = np.random.default_rng(2)
+        detection = rng.integers(0, 2, size=(10, 30))
+        solutions = [[0], [1, 2], [3, 4, 5]]
+        representatives = np.unique(assignment.to_numpy())
+        weights = assignment.value_counts().sort_index().to_numpy(dtype=float)
+        exact = [abs(weighted_coverage(detection, s, 1) -
+                     weighted_coverage(detection[:, representatives], s, 1, weights))
+                 for s in solutions]
+        np.testing.assert_allclose(reduction_error(detection, assignment, solutions, 1), exact)
+
+        # a pilot subset with the detection of the reduced run
+        chunks = pilot_chunks(assignment, 12, seed=0)
+        assert len(chunks) == 12 and np.all(np.diff(chunks) > 0)
+        rep_detection = detection[:, representatives]
+        errors = reduction_error(detection[:, chunks], assignment, solutions, 1, chunks=chunks,
+                                 rep_detection=rep_detection)
+        reps = assignment.loc[chunks].to_numpy()
+        expected = [abs(np.mean(detection[s][:, reps].sum(axis=0) >= 1) -
+                        np.mean(detection[s][:, chunks].sum(axis=0) >= 1)) for s in solutions]
+        np.testing.assert_allclose(errors, expected)
+        np.testing.assert_allclose(reduction_error(detection, assignment, solutions, 1,
+                                                   chunks=pilot_chunks(assignment, 100)), exact)
+        with pytest.raises(ValueError):
+            reduction_error(detection[:, chunks], assignment, solutions, 1)
+        with pytest.raises(ValueError):
+            reduction_error(detection[:, chunks], assignment, solutions, 1, chunks=chunks[:5],
+                            rep_detection=rep_detection)
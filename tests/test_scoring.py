@@ -0,0 +1,78 @@
+import unittest
+import numpy as np
+from placement.scenario_reduction import weighted_coverage
+from placement.scoring import (PlacementArrays, bootstrap_coverage, detected_counts,
+                               placement_arrays, score_placements)
+
+
+class TestScoring(unittest.TestCase):
+    def setUp(self):
+        """Set up a random detection matrix and placements of different sizes"""
+        rng = np.random.default_rng(0)
+        self.detection = rng.choice([0, 1], size=(50, 200), p=[.9, .1]).astype(np.int8)
+        self.weights = rng.random(200)
+        self.placements = [rng.choice(50, size=k, replace=False)
+                           for k in rng.integers(1, 6, size=300)]
+
+    def test_placement_arrays(self):
+        """Test the CSR form of ragged and rectangular placements"""
+        indptr, indices = placement_arrays([[1, 2], [], [3]])
+        np.testing.assert_array_equal(indptr, [0, 2, 2, 3])
+        np.testing.assert_array_equal(indices, [1, 2, 3])
+        indptr, indices = placement_arrays(np.array([[1, 2], [3, 4]]))
+        np.testing.assert_array_equal(indptr, [0, 2, 4])
+        np.testing.assert_array_equal(indices, [1, 2, 3, 4])
+        # a tuple of two placements is not mistaken for the CSR form
+        indptr, indices = placement_arrays((np.array([1, 2]), np.array([3])))
+        np.testing.assert_array_equal(indptr, [0, 2, 3])
+        np.testing.assert_array_equal(indices, [1, 2, 3])
+        csr = PlacementArrays(np.array([0, 1, 3]), np.array([5, 6, 7]))
+        self.assertIs(placement_arrays(csr), csr)
+        np.testing.assert_allclose(score_placements(self.detection, csr),
+                                   score_placements(self.detection, [[5], [6, 7]]))
+        for invalid in [np.array([1, 2]), {1, 2}]:
+            with self.assertRaises(ValueError):
+                placement_arrays(invalid)
+
+    def test_detected_counts(self):
+        """Test the counts against row sums, including an empty placement"""
+        placements = self.placements[:20] + [[]]
+        counts = detected_counts(self.detection, placements, chunk_size=7)
+        for placement, row in zip(placements, counts):
+            rows = self.detection[np.asarray(placement, dtype=int)]
+            np.testing.assert_array_equal(row, rows.sum(axis=0))
+        with self.assertRaises(ValueError):
+            detected_counts(self.detection, [[50]])
+
+    def test_score_placements(self):
+        """Test that batch scores match the coverage of single placements"""
+        for min_detected_sensor in [1, 2]:
+            for weights in [None, self.weights]:
+                scores = score_placements(self.detection, self.placements, min_detected_sensor,
+                                          weights, chunk_size=64)
+                expected = [weighted_coverage(self.detection, p, min_detected_sensor, weights)
+                            for p in self.placements]
+                np.testing.assert_allclose(scores, expected)
+        self.assertEqual(len(score_placements(self.detection, [])), 0)
+
+    def test_bootstrap_coverage(self):
+        """Test that the intervals contain the estimate and narrow with more scenarios"""
+        coverage, lower, upper = bootstrap_coverage(self.detection, self.placements,
+                                                    n_bootstrap=500, seed=0)
+        np.testing.assert_allclose(coverage, score_placements(self.detection, self.placements))
+        self.assertTrue(np.all(lower <= coverage + 1e-12))
+        self.assertTrue(np.all(coverage <= upper + 1e-12))
+
+        # reproducible with a seed
+        _, lower_again, _ = bootstrap_coverage(self.detection, self.placements, n_bootstrap=500,
+                                               seed=0)
+        np.testing.assert_array_equal(lower, lower_again)
+
+        wide = np.tile(self.detection, (1, 10))
+        _, lower_wide, upper_wide = bootstrap_coverage(wide, self.placements, n_bootstrap=500,
+                                                       seed=0)
+        self.assertLess(np.mean(upper_wide - lower_wide), np.mean(upper - lower))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
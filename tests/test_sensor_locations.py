@@ -0,0 +1,91 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import pytest
+from placement.sensor_locations import (
+    domain_grid,
+    generate_grid,
+    equipment_polygons,
+    points_in_polygon,
+    equipment_mask,
+    fenceline_mask,
+    specify_sensor_locations
+)
+
+demo_dir = os.path.join(os.path.dirname(__file__), '..', 'demo')
+
+
+@pytest.fixture
+def df_domain():
+    return pd.DataFrame({'x_min.m': [0.], 'x_max.m': [10.], 'y_min.m': [0.], 'y_max.m': [20.],
+                         'z_min.m': [1.], 'z_max.m': [2.], 'dx.m': [1.], 'dy.m': [2.],
+                         'dz.m': [.5]})
+
+
+@pytest.fixture
+def df_equip_vertices():
+    return pd.DataFrame({'EquipName': ['A'] * 4 + ['B'] * 3,
+                         'VertexName': list('abcd') + list('abc'),
+                         'Vertex_x.m': [2, 2, 4, 4, 6, 8, 8],
+                         'Vertex_y.m': [2, 6, 6, 2, 10, 10, 14]})
+
+
+class TestGrid:
+    def test_domain_grid(self, df_domain):
+        """Test grid ranges and number of grids per direction"""
+        grid_ranges, grid_nums = domain_grid(df_domain)
+        assert grid_ranges == (0., 0., 1., 10., 20., 2.)
+        assert grid_nums == (11, 11, 3)
+
+    def test_grid_order(self, df_domain):
+        """Test that locations follow the np.meshgrid order with matching grid ids"""
+        df_grid_locs = generate_grid(df_domain)
+        assert len(df_grid_locs) == 11 * 11 * 3
+        X, Y, Z = np.meshgrid(np.linspace(0, 10, 11), np.linspace(0, 20, 11), np.linspace(1, 2, 3))
+        np.testing.assert_array_equal(df_grid_locs['x'], X.ravel())
+        np.testing.assert_array_equal(df_grid_locs['y'], Y.ravel())
+        np.testing.assert_array_equal(df_grid_locs['z'], Z.ravel())
+        assert df_grid_locs['grid_id'][4] == '1-0-1'
+
+
+class TestPolygons:
+    def test_points_in_polygon(self):
+        """Test interior, exterior and edge points of a triangle"""
+        triangle = np.array([[0., 0.], [4., 0.], [0., 4.]])
+        points = np.array([[1., 1.], [3., 3.], [-1., 1.], [2., 1.]])
+        np.testing.assert_array_equal(points_in_polygon(points, triangle),
+                                      [True, False, False, True])
+
+    def test_equipment_mask(self, df_domain, df_equip_vertices):
+        """Test that only points inside equipment polygons are occupied"""
+        points = np.array([[3., 4.], [7.5, 11.], [5., 5.], [9., 12.]])
+        occupied = equipment_mask(points, equipment_polygons(df_equip_vertices))
+        np.testing.assert_array_equal(occupied, [True, True, False, False])
+
+    def test_fenceline_mask(self, df_domain):
+        """Test the fence line buffer"""
+        points = np.array([[0., 0.], [2., 10.], [3., 3.], [5., 10.], [8., 10.], [5., 18.]])
+        np.testing.assert_array_equal(fenceline_mask(points, df_domain, 2, 2),
+                                      [True, True, False, False, True, True])
+
+
+class TestSpecifySensorLocations:
+    def test_matches_demo_outputs(self):
+        """Test that the demo site reproduces the step 2 notebook outputs"""
+        df_domain = pd.read_csv(os.path.join(demo_dir, 'input_data', 'domain.csv'))
+        df_equip_vertices = pd.read_csv(os.path.join(demo_dir, 'input_data',
+                                                     'equipment_vertices.csv'))
+        with tempfile.TemporaryDirectory() as save_dir:
+            df_grid_locs, valid_indices, fenceline_indices = specify_sensor_locations(
+                df_domain, df_equip_vertices, save_dir=save_dir + '/')
+
+            for filename in ['grid_locations.csv', 'valid_sensor_locations.csv',
+                             'fenceline_sensor_locations.csv']:
+                expected = pd.read_csv(os.path.join(demo_dir, 'output_data', filename))
+                pd.testing.assert_frame_equal(pd.read_csv(os.path.join(save_dir, filename)),
+                                              expected)
+
+            for name, indices in [('valid', valid_indices), ('fenceline', fenceline_indices)]:
+                saved = np.load(os.path.join(save_dir, f'{name}_location_indices.npy'))
+                np.testing.assert_array_equal(saved, indices)
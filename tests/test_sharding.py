@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from placement.PORSS import PORSS
+from placement.optimization import run_porss
+from placement.robustness import score_robust
+from placement.scoring import bootstrap_coverage, covered_totals, score_placements
+from placement.__main__ import main
+from placement.sharding import (ShardedMatrix, greedy_placement, handle_request, is_loopback,
+                                 serve_shard, start_local_shards)
+
+
+class TestSharding(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Start three local shards of a random detection matrix"""
+        cls.test_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        cls.matrix = (rng.random((60, 100)) < .06).astype(np.int8)
+        cls.weights = rng.random(100)
+        np.save(os.path.join(cls.test_dir, 'detection.npy'), cls.matrix)
+        cls.sharded = start_local_shards(os.path.join(cls.test_dir, 'detection.npy'), 3)
+        cls.placements = [rng.choice(60, size=k, replace=False) for k in [1, 2, 3, 4, 5] * 10]
+
+    def test_shape(self):
+        """Test that the shards cover all scenarios"""
+        self.assertEqual(self.sharded.shape, (60, 100))
+        self.assertEqual(sum(self.sharded.shard_cols), 100)
+        self.assertEqual(self.sharded.total_weight, 100)
+
+    def test_scoring(self):
+        """Test that sharded scores match the local matrix"""
+        for min_detected_sensor in [1, 2]:
+            np.testing.assert_allclose(
+                score_placements(self.sharded, self.placements, min_detected_sensor),
+                score_placements(self.matrix, self.placements, min_detected_sensor))
+        with self.assertRaises(ValueError):
+            self.sharded.coverage([[60]], 1)
+
+    def test_porss_and_greedy(self):
+        """Test that PORSS and greedy give the same results on the sharded matrix"""
+        porss_local = PORSS(self.matrix, 3, 1, n_iters=300, seed=0, verbose=False)
+        porss_sharded = PORSS(self.sharded, 3, 1, n_iters=300, seed=0, verbose=False)
+        self.assertEqual(porss_sharded.opt_val_ub, porss_local.opt_val_ub)
+        solution = np.zeros(60)
+        solution[[1, 7, 30]] = 1
+        self.assertEqual(porss_sharded.objectives(solution), porss_local.objectives(solution))
+        _, coverage = porss_sharded.main()
+        self.assertIsInstance(coverage, int)
+
+        greedy_sharded = greedy_placement(self.sharded, 4, 1)
+        greedy_local = greedy_placement(self.matrix, 4, 1)
+        np.testing.assert_array_equal(greedy_sharded[0], greedy_local[0])
+        self.assertEqual(greedy_sharded[1], greedy_local[1])
+        # a DataFrame is a local matrix, not a shard client
+        greedy_frame = greedy_placement(pd.DataFrame(self.matrix), 4, 1)
+        np.testing.assert_array_equal(greedy_frame[0], greedy_local[0])
+
+        with self.assertRaises(ValueError):
+            PORSS(self.sharded, 3, 1, weights=np.ones(100))
+
+    def test_weighted_shards(self):
+        """Test that shard weights give the weighted coverage"""
+        path = os.path.join(self.test_dir, 'detection.npy')
+        with start_local_shards(path, 2, weights=self.weights) as sharded:
+            self.assertAlmostEqual(sharded.total_weight, np.sum(self.weights))
+            np.testing.assert_allclose(score_placements(sharded, self.placements),
+                                       score_placements(self.matrix, self.placements,
+                                                        weights=self.weights))
+            np.testing.assert_allclose(sharded.gains([3], 1),
+                                       greedy_gains(self.matrix, [3], self.weights))
+            run_porss(sharded, 2, 1, 1, save_dir=self.test_dir + '/')
+            # the weights are held by the shards
+            with self.assertRaises(ValueError):
+                score_placements(sharded, self.placements, weights=self.weights)
+            with self.assertRaises(ValueError):
+                covered_totals(sharded, self.placements, weights=self.weights)
+            with self.assertRaises(ValueError):
+                greedy_placement(sharded, 2, 1, weights=self.weights)
+
+    def test_polish_sharded(self):
+        """Test that polishing on a sharded matrix is rejected before running PORSS"""
+        with self.assertRaises(ValueError):
+            run_porss(self.sharded, 2, 1, 1, polish=True, save_dir=self.test_dir + '/')
+
+    def test_local_only_scores(self):
+        """Test that bootstrap and robust scores reject a sharded matrix with a clear error"""
+        with self.assertRaisesRegex(ValueError, 'sharded matrix'):
+            bootstrap_coverage(self.sharded, self.placements, n_bootstrap=10)
+        with self.assertRaisesRegex(ValueError, 'sharded matrix'):
+            score_robust(self.sharded, self.placements)
+
+    def test_errors(self):
+        """Test that shard errors are reported to the client"""
+        with self.assertRaises(ValueError):
+            handle_request(self.matrix, None, 'unknown', ())
+        with self.assertRaises(RuntimeError):
+            self.sharded._all('unknown')
+        self.assertEqual(self.sharded.shape, (60, 100)) # the shards keep serving
+
+    def test_authkey(self):
+        """Test that shards and clients need a key and non-loopback shards need an explicit one"""
+        with self.assertRaises(ValueError):
+            ShardedMatrix([('localhost', 6000)], b'')
+        with self.assertRaises(ValueError):
+            serve_shard(self.matrix, None)
+        self.assertTrue(all(is_loopback(host) for host in ['localhost', '127.0.0.1', '::1']))
+        self.assertFalse(is_loopback('0.0.0.0') or is_loopback('host-a'))
+        with self.assertRaises(SystemExit):
+            main(['shard', os.path.join(self.test_dir, 'detection.npy'), '--host', '0.0.0.0'])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sharded.close()
+        shutil.rmtree(cls.test_dir)
+
+
+def greedy_gains(matrix, solution, weights):
+    uncovered = matrix[solution].sum(axis=0) == 0
+    return matrix[:, uncovered] @ weights[uncovered]
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
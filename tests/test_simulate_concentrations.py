@@ -191,6 +191,31 @@ class TestSimulateConcentrations(unittest.TestCase):
         n_chunks = len(multi_chunk_df['ChunkIndex'].unique())
         self.assertEqual(result.shape[0], n_chunks)
 
+    def test_fused_detection(self):
+        """Test that the fused mode matches detection on the saved concentrations."""
+        from placement.evaluate_detection import run_detection
+
+        detection_params = {'method': 'overall', 'amp_thresh': 1e-3, 'persistence_thresh': .2}
+        detection = run_gp(
+            self.df_emission_scenarios.copy(),
+            self.grid_ranges,
+            self.grid_nums,
+            self.obs_dt,
+            self.sim_dt,
+            self.puff_dt,
+            save_dir=self.test_dir + '/',
+            detection_params=detection_params,
+            save_concentrations=True
+        )
+
+        n_scenarios = len(self.df_emission_scenarios['ChunkIndex'].unique())
+        n_grid_points = self.grid_nums[0] * self.grid_nums[1] * self.grid_nums[2]
+        self.assertEqual(detection.shape, (n_grid_points, n_scenarios))
+
+        ch4_sim_all = np.load(os.path.join(self.test_dir, 'ch4_sim_grid_locations.npy'))
+        expected = run_detection(ch4_sim_all, save_dir=self.test_dir + '/', **detection_params)
+        np.testing.assert_array_equal(detection, expected)
+
     def tearDown(self):
         """Clean up test fixtures after each test method."""
         try:
@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from placement.PORSS import PORSS
+from placement.concentration_store import write_concentrations
+from placement.evaluate_detection import run_detection
+from placement.instrumentation import Metrics
+from placement.results_store import ResultsStore
+from placement.warm_start import previous_solutions, warm_start_porss
+
+
+class TestWarmStart(unittest.TestCase):
+    def setUp(self):
+        """Set up a detection matrix with appended scenario columns and a previous PORSS run"""
+        self.test_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.matrix = (rng.random((30, 80)) < .1).astype(np.int8)
+        self.weights = rng.random(80)
+        self.n_previous = 50
+        self.previous = PORSS(self.matrix[:, :self.n_previous], 4, 1, n_iters=2000, seed=0,
+                              verbose=False)
+        self.previous.main()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def assert_archive(self, porss):
+        # stored fitness equals a full evaluation and no archived solution dominates another
+        fitness = porss.fitness_log[1:]
+        for value, solution in zip(fitness, porss.population[1:]):
+            np.testing.assert_allclose(porss.objectives(solution), value)
+        for i, (value, size) in enumerate(fitness):
+            dominated = ((fitness[:, 0] >= value) & (fitness[:, 1] < size)) | \
+                        ((fitness[:, 0] > value) & (fitness[:, 1] <= size))
+            self.assertFalse(np.any(np.delete(dominated, i)))
+
+    def test_new_columns(self):
+        """Test that the archive is carried over with the coverage of the new columns added"""
+        for weights in [None, self.weights]:
+            previous = PORSS(self.matrix[:, :self.n_previous], 4, 1, n_iters=2000, seed=0,
+                             verbose=False,
+                             weights=None if weights is None else weights[:self.n_previous])
+            previous.main()
+            metrics = Metrics()
+            porss = warm_start_porss(self.matrix, previous, 4, 1, self.n_previous, weights=weights,
+                                     n_iters=1000, seed=0, verbose=False, metrics=metrics)
+            n_previous_front = len(previous.pareto_front())
+            self.assertEqual(metrics.summary()['counters']['warm_start.incremental'],
+                             n_previous_front)
+            self.assert_archive(porss)
+            self.assertGreater(porss.population_size, 1)
+            solution, value = porss.main()
+            self.assertLessEqual(len(solution), 4)
+            solution_value = porss.objectives(np.isin(np.arange(30), solution))[0]
+            self.assertGreaterEqual(value, solution_value - 1e-9)
+
+    def test_dropped_rows(self):
+        """Test that removed locations are dropped from the stored solutions and rows remapped"""
+        front = self.previous.pareto_front()
+        removed = front[-1][2][0] # a location of the largest stored solution
+        rows = np.delete(np.arange(30), removed)
+        matrix = self.matrix[rows]
+        metrics = Metrics()
+        porss = warm_start_porss(matrix, front, 4, 1, self.n_previous, rows=rows, n_iters=100,
+                                 seed=0, verbose=False, metrics=metrics)
+        self.assertGreater(metrics.summary()['counters']['warm_start.recomputed'], 0)
+        self.assert_archive(porss)
+        # the largest stored solution without the removed location is in the archive or dominated
+        shrunk = np.isin(rows, front[-1][2]).astype(float)
+        value, size = porss.objectives(shrunk)
+        fitness = porss.fitness_log[1:]
+        self.assertTrue(np.any((fitness[:, 0] >= value) & (fitness[:, 1] <= size)))
+
+        # a new candidate location (-1) is not part of any stored solution
+        rows = np.append(np.arange(30), -1)
+        matrix = np.vstack((self.matrix, np.ones((1, 80), dtype=np.int8)))
+        porss = warm_start_porss(matrix, front, 4, 1, self.n_previous, rows=rows, n_iters=100,
+                                 verbose=False)
+        self.assertFalse(np.any(porss.population[1:, -1]))
+        self.assert_archive(porss)
+
+    def test_results_store_front(self):
+        """Test warm starting from a Pareto front in the results store"""
+        with ResultsStore(os.path.join(self.test_dir, 'results.sqlite')) as store:
+            run_id = store.add_run(*self.previous.find_best_solution(), 4, 1,
+                                   pareto_front=self.previous.pareto_front())
+            df_front = store.pareto_front(run_id)
+        self.assertEqual([coverage for coverage, _ in previous_solutions(df_front)],
+                         [coverage for _, coverage, _ in self.previous.pareto_front()])
+        porss = warm_start_porss(self.matrix, df_front, 4, 1, self.n_previous, n_iters=100,
+                                 verbose=False)
+        self.assert_archive(porss)
+
+    def test_invalid(self):
+        """Test that mismatching deltas raise a ValueError"""
+        with self.assertRaises(ValueError):
+            warm_start_porss(self.matrix, self.previous, 4, 1, 100, verbose=False)
+        with self.assertRaises(ValueError):
+            warm_start_porss(self.matrix, self.previous, 4, 1, 50, rows=np.arange(10),
+                             verbose=False)
+
+    def test_append_detection(self):
+        """Test that appending scenarios matches a full run and only evaluates new scenarios"""
+        rng = np.random.default_rng(1)
+        ch4_sim = rng.random((6, 10, 5)) * 2
+        save_dir = self.test_dir + '/'
+        run_detection(ch4_sim[:4], 'overall', 1., 4, save_dir=save_dir, append=True)
+        metrics = Metrics()
+        detection = run_detection(ch4_sim, 'overall', 1., 4, save_dir=save_dir, metrics=metrics,
+                                  append=True)
+        self.assertEqual(metrics.summary()['counters']['detection.series'], 2 * 5)
+        full_dir = os.path.join(self.test_dir, 'full') + '/'
+        os.makedirs(full_dir)
+        np.testing.assert_array_equal(detection,
+                                      run_detection(ch4_sim, 'overall', 1., 4, save_dir=full_dir))
+        # the append bookkeeping is only written by runs with append
+        self.assertFalse(os.path.exists(full_dir + 'detection_grid_locations.json'))
+        np.testing.assert_array_equal(np.load(save_dir + 'detection_grid_locations.npy'), detection)
+
+        # nothing new to evaluate
+        np.testing.assert_array_equal(run_detection(ch4_sim, 'overall', 1., 4, save_dir=save_dir,
+                                                    append=True),
+                                      detection)
+        with self.assertRaises(ValueError):
+            run_detection(ch4_sim[:3], 'overall', 1., 4, save_dir=save_dir, append=True)
+
+        # a different detection rule or different leading scenarios are not mixed in
+        with self.assertRaises(ValueError):
+            run_detection(ch4_sim, 'overall', 1.5, 4, save_dir=save_dir, append=True)
+        with self.assertRaises(ValueError):
+            run_detection(ch4_sim, 'consecutive', 1., 4, save_dir=save_dir, append=True)
+        changed = ch4_sim.copy()
+        changed[-1] += 1
+        with self.assertRaises(ValueError):
+            run_detection(changed, 'overall', 1., 4, save_dir=save_dir, append=True)
+        os.remove(save_dir + 'detection_grid_locations.json')
+        with self.assertRaises(ValueError):
+            run_detection(ch4_sim, 'overall', 1., 4, save_dir=save_dir, append=True)
+
+    def test_append_detection_store(self):
+        """Test that appending from a chunked store decodes every chunk of the new scenarios once"""
+        rng = np.random.default_rng(2)
+        ch4_sim = rng.random((10, 8, 6)) * 2
+        save_dir = self.test_dir + '/'
+        store = write_concentrations(os.path.join(self.test_dir, 'store'), ch4_sim,
+                                     grids_per_chunk=3, scenarios_per_chunk=4, encoding='float64')
+        run_detection(ch4_sim[:5], 'overall', 1., 3, save_dir=save_dir, append=True)
+        detection = run_detection(store, 'overall', 1., 3, save_dir=save_dir, append=True)
+        np.testing.assert_array_equal(detection, run_detection(ch4_sim, 'overall', 1., 3,
+                                                               save_dir=save_dir + 'full_'))
+        # scenarios 5-9 are in scenario chunks 1 and 2, two grid chunks each; plus the fingerprints
+        # of scenarios 0 and 4 before and of 0 and 9 after the detection
+        self.assertEqual(store.chunks_read, 2 * 2 + 4 * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()